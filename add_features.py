@@ -1,11 +1,20 @@
 """
-Feature engineering with UCI points, team tier, and form metrics
+Feature engineering with UCI points, team tier and strength, and form metrics
 This fixes the high-bias model by adding features that vary per rider
 """
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import re
+import config
+import affinity
+import feature_spec
+import field
+import race_times
+import results_db
+import seasons
+import teams
+from names import normalize_name
+from rider_snapshot import build_snapshot
 
 DATA_DIR = Path("data")
 CLEAN_DIR = DATA_DIR / "clean"
@@ -22,24 +31,14 @@ results = pd.read_csv(results_path, parse_dates=["race_date"])
 print(f"Total observations: {len(results)}")
 print(f"Unique riders: {results['rider_name'].nunique()}")
 
-# Normalize rider names for consistent tracking
-def normalize_name(s):
-    if pd.isna(s):
-        return None
-    s = str(s).strip().lower()
-    s = (
-        s.replace("é", "e").replace("è", "e").replace("ë", "e")
-         .replace("ó", "o").replace("ò", "o").replace("ö", "o")
-         .replace("á", "a").replace("à", "a").replace("ä", "a")
-         .replace("ü", "u").replace("ï", "i")
-    )
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-results["rider_name_norm"] = results["rider_name"].apply(normalize_name)
-
-# Sort by rider and date for time-based features
-results = results.sort_values(["rider_name_norm", "race_date"])
+# Normalize rider names for consistent tracking (names.normalize_name, once per distinct name)
+norm_lookup = {name: normalize_name(name) for name in results["rider_name"].dropna().unique()}
+results["rider_name_norm"] = results["rider_name"].map(norm_lookup)
+
+# Sort by rider and date for time-based features (race and category break same-day ties)
+results = results.sort_values(
+    ["rider_name_norm", *feature_spec.HISTORY_ORDER], kind="stable", na_position=feature_spec.UNDATED_POSITION
+)
 
 print("\n" + "=" * 60)
 print("ADDING NEW FEATURES")
@@ -64,26 +63,13 @@ results["points_tier"] = pd.cut(
 print(f"  ✓ UCI points range: {results['Carried Points'].min():.0f} - {results['Carried Points'].max():.0f}")
 print(f"  ✓ Points tiers: {results['points_tier'].value_counts().to_dict()}")
 
-# 2. TEAM TIER FEATURES
-print("\n2. Team tier features...")
-
-# Top teams in cyclocross
-TOP_TEAMS = [
-    "ALPECIN", "DECEUNINCK", "BALOISE", "TREK", "LIONS",
-    "PAUWELS", "SAUZEN", "CRELAN", "CORENDON",
-    "VISMA", "LEASE", "BIKE", "INTERMARCHE", "CIRCUS"
-]
-
-def categorize_team(team_name):
-    if pd.isna(team_name):
-        return "no_team"
-    team_upper = str(team_name).upper()
-    if any(top in team_upper for top in TOP_TEAMS):
-        return "top_team"
-    return "other_team"
-
-results["team_tier"] = results["Team Name"].apply(categorize_team)
+# 2. TEAM FEATURES: canonical team (config.TEAM_REGISTRY), tier and strength before each race day
+print("\n2. Team features...")
+results = teams.add_team_columns(results)
 print(f"  ✓ Team tiers: {results['team_tier'].value_counts().to_dict()}")
+print(f"  ✓ {results['Team Name'].nunique()} team names -> {results['team_id'].nunique()} teams")
+print(f"  ✓ Team strength: {results['team_strength'].notna().sum()} rows, "
+      f"median {results['team_strength'].median():.1%}")
 
 # 3. CATEGORY FEATURES
 print("\n3. Category features...")
@@ -92,89 +78,53 @@ results["is_women"] = results["Category Name"].str.contains("Women", case=False,
 print(f"  ✓ Elite races: {results['is_elite'].sum()}")
 print(f"  ✓ Women's races: {results['is_women'].sum()}")
 
-# 4. FORM FEATURES (time-based)
-print("\n4. Form features (historical performance)...")
-
-# Races completed so far
-results["races_so_far"] = results.groupby("rider_name_norm").cumcount()
-
-# Shift place for historical features (avoid lookahead bias)
-place_shifted = results.groupby("rider_name_norm")["Place"].shift(1)
-
-# Last 3 races average
-results["avg_place_last3"] = (
-    place_shifted.groupby(results["rider_name_norm"])
-    .rolling(3, min_periods=1).mean().reset_index(level=0, drop=True)
-)
-
-# Best place in last 5 races
-results["best_place_last5"] = (
-    place_shifted.groupby(results["rider_name_norm"])
-    .rolling(5, min_periods=1).min().reset_index(level=0, drop=True)
-)
-
-# Last race place
-results["last_place"] = place_shifted
-
-# Days since last race
-results["days_since_last_race"] = (
-    results.groupby("rider_name_norm")["race_date"].diff().dt.days
-)
-
-# Last points (carried and scored)
-results["last_carried_points"] = results.groupby("rider_name_norm")["Carried Points"].shift(1)
-results["last_scored_points"] = results.groupby("rider_name_norm")["Scored Points"].shift(1)
+# 4. RACE TIMES: seconds, status (finished / lapped / DNF / DNS / DSQ) and gap to the winner
+print("\n4. Race time features...")
+results = race_times.add_time_columns(results)
+status_counts = results["time_status"].map(race_times.STATUS_NAMES).value_counts().to_dict()
+print(f"  ✓ Time status: {status_counts}")
+print(f"  ✓ Gap to winner: {results['gap_pct'].notna().sum()} rows, median {results['gap_pct'].median():.1f}%")
+
+# 5. FORM + 6. WIN RATE FEATURES (time-based): the history features of config.FEATURE_SPEC,
+# one season at a time. Each season is built from its own partition plus the previous
+# season's career_summary.csv, and only when one of them changed, see seasons.py
+print("\n5. Form features (historical performance, gaps to the winner)...")
+print("\n6. Win rate features...")
+
+season_parts = []
+for season, (season_rows, rebuilt) in seasons.build_all(seasons.season_of(results["race_date"])).items():
+    season_parts.append(season_rows)
+    print(f"  ✓ Season {season}: {len(season_rows)} results ({'rebuilt' if rebuilt else 'unchanged, loaded'})")
+results = results.merge(pd.concat(season_parts), on=seasons.ROW_KEY, how="left", validate="one_to_one")
+n_missing = results["races_so_far"].isna().sum()
+if n_missing:
+    raise SystemExit(f"✗ {n_missing} results are missing from the season partitions; run rebuild_data.py first")
 
 print(f"  ✓ Average races per rider: {results['races_so_far'].mean():.1f}")
 print(f"  ✓ Riders with history: {(results['races_so_far'] > 0).sum()} / {len(results)}")
-
-# 5. WIN RATE FEATURES
-print("\n5. Win rate features...")
-
-# Top-3 finishes (podium)
-results["top3_finish"] = (results["Place"] <= 3).astype(int)
-top3_shifted = results.groupby("rider_name_norm")["top3_finish"].shift(1)
-results["top3_rate_career"] = (
-    top3_shifted.groupby(results["rider_name_norm"])
-    .expanding().mean().reset_index(level=0, drop=True)
-)
-
-# Top-10 finishes (points scoring)
-results["top10_finish"] = (results["Place"] <= 10).astype(int)
-top10_shifted = results.groupby("rider_name_norm")["top10_finish"].shift(1)
-results["top10_rate_career"] = (
-    top10_shifted.groupby(results["rider_name_norm"])
-    .expanding().mean().reset_index(level=0, drop=True)
-)
-
 print(f"  ✓ Top-3 finishes: {results['top3_finish'].sum()}")
 print(f"  ✓ Top-10 finishes: {results['top10_finish'].sum()}")
-
-# 6. SERIES PERFORMANCE
-print("\n6. Series-specific features...")
-results["series_appearances"] = results.groupby(["rider_name_norm", "series_name"]).cumcount()
+print(f"  ✓ Rows with a previous gap to the winner: {results['last_gap_pct'].notna().sum()}")
+
+# 7. SERIES + VENUE PERFORMANCE (course specialists: sand at Koksijde, mud at Namur)
+print("\n7. Series and venue affinity features...")
+results = affinity.add_prior_features(results)
+print(f"  ✓ Rows with a prior visit to the venue: {(results['venue_appearances'] > 0).sum()}")
+
+# 8. FIELD-RELATIVE FEATURES (same function prediction applies to the startlist)
+print("\n8. Field-relative features...")
+race_fields = pd.factorize(results["race_id"].fillna("") + "|" + results["Category Name"].fillna(""))[0]
+for name, values in field.field_features(
+    race_fields, results["uci_points_normalized"], results["avg_place_last3"], results["top10_rate_career"]
+).items():
+    results[name] = values
+print(f"  ✓ {race_fields.max() + 1} race fields, median size {int(np.median(np.bincount(race_fields)))}")
 
 print("\n" + "=" * 60)
 print("FEATURE SUMMARY")
 print("=" * 60)
 
-new_features = [
-    "uci_points_normalized",
-    "points_tier",
-    "team_tier",
-    "is_elite",
-    "is_women",
-    "races_so_far",
-    "avg_place_last3",
-    "best_place_last5",
-    "last_place",
-    "days_since_last_race",
-    "last_carried_points",
-    "last_scored_points",
-    "top3_rate_career",
-    "top10_rate_career",
-    "series_appearances"
-]
+new_features = config.NUMERIC_FEATURES + config.CATEGORICAL_FEATURES
 
 print(f"\nNew features added: {len(new_features)}")
 for feat in new_features:
@@ -205,6 +155,19 @@ output_path = CLEAN_DIR / "results_with_features.csv"
 results.to_csv(output_path, index=False)
 
 print(f"\n✓ Saved to: {output_path}")
+
+# Latest state per rider for fast prediction lookups (predict_fast.py)
+snapshot = build_snapshot(results)
+snapshot.to_csv(config.RIDER_SNAPSHOT, index=False)
+print(f"✓ Rider snapshot: {len(snapshot)} riders -> {config.RIDER_SNAPSHOT}")
+
+# Indexed copy of the full history for rider / race / series queries (results_db.py)
+results_db.build(results)
+print(f"✓ Results database: {len(results)} rows -> {config.RESULTS_DB}")
+
+# Rider x venue / series aggregates for prediction lookups (only races not yet in the table)
+affinity_table, n_new_races = affinity.refresh_table(results)
+print(f"✓ Affinity table: {n_new_races} new races, {len(affinity_table)} rows -> {config.AFFINITY_TABLE}")
 print(f"\nTotal columns: {len(results.columns)}")
 print(f"Total rows: {len(results)}")
 
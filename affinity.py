@@ -0,0 +1,185 @@
+"""
+Venue and series affinity: how a rider has done at this course / in this series before
+add_features.py computes the prior-to-date versions for training (vectorized groupbys);
+the aggregate table (one row per rider x venue and rider x series) is updated
+incrementally with newly added races and gives prediction an O(1) lookup.
+Loading and lookup are stdlib-only.
+"""
+import csv
+import json
+import math
+import re
+import unicodedata
+
+import config
+from names import normalize_name, name_variants
+
+# Affinity kind -> results column it is keyed on
+AFFINITY_KEYS = {
+    "venue": "race_location",
+    "series": "series_name",
+}
+
+TABLE_COLUMNS = ["rider_name_norm", "kind", "key", "appearances", "place_sum", "place_count", "best_place", "last_date"]
+
+AFFINITY_FEATURES = [
+    "venue_appearances",
+    "venue_avg_place",
+    "venue_best_place",
+    "series_appearances",
+    "series_avg_place",
+    "series_best_place",
+]
+
+
+def slug(value):
+    """Venue/series key: "Tielt (Meulebeke), BEL" and "Tielt-Meulebeke-BEL" -> "tielt-meulebeke-bel" """
+    if value is None or value != value:
+        return None
+    value = unicodedata.normalize("NFKD", str(value))  # "X²O" -> "X2O"
+    value = "".join(char for char in value if unicodedata.category(char) != "Mn")
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-") or None
+
+
+def add_prior_features(results, rider_col="rider_name_norm"):
+    """Prior-to-date venue/series appearances, mean and best place (results sorted by rider, date)"""
+    import numpy as np
+
+    place = results["Place"]
+    has_place = place.notna()
+    for kind, column in AFFINITY_KEYS.items():
+        keys = results[column].map({value: slug(value) for value in results[column].dropna().unique()})
+        groups = [results[rider_col], keys]
+
+        # Cumulative totals minus the current row = everything strictly before it
+        prior_sum = place.fillna(0).groupby(groups).cumsum() - place.fillna(0)
+        prior_count = has_place.astype(int).groupby(groups).cumsum() - has_place.astype(int)
+        prior_best = place.fillna(np.inf).groupby(groups).shift(1).groupby(groups).cummin()
+
+        results[f"{kind}_appearances"] = results.groupby(groups).cumcount()
+        results[f"{kind}_avg_place"] = (prior_sum / prior_count).where(prior_count > 0)
+        results[f"{kind}_best_place"] = prior_best.replace(np.inf, np.nan)
+    return results
+
+
+def aggregate(results):
+    """Affinity table rows for a set of results"""
+    import pandas as pd
+
+    rider_norm = results["rider_name"].map({name: normalize_name(name) for name in results["rider_name"].dropna().unique()})
+    frames = []
+    for kind, column in AFFINITY_KEYS.items():
+        rows = pd.DataFrame({
+            "rider_name_norm": rider_norm,
+            "kind": kind,
+            "key": results[column].map({value: slug(value) for value in results[column].dropna().unique()}),
+            "Place": results["Place"],
+            "race_date": results["race_date"],
+        }).dropna(subset=["rider_name_norm", "key"])
+        frames.append(
+            rows.groupby(["rider_name_norm", "kind", "key"]).agg(
+                appearances=("Place", "size"),
+                place_sum=("Place", "sum"),
+                place_count=("Place", "count"),
+                best_place=("Place", "min"),
+                last_date=("race_date", "max"),
+            ).reset_index()
+        )
+    return pd.concat(frames, ignore_index=True)[TABLE_COLUMNS]
+
+
+def update_table(table, new_results):
+    """Fold newly added race results into an existing affinity table"""
+    import pandas as pd
+
+    if len(new_results) == 0:
+        return table
+    combined = pd.concat([table, aggregate(new_results)], ignore_index=True)
+    return combined.groupby(["rider_name_norm", "kind", "key"], as_index=False).agg(
+        appearances=("appearances", "sum"),
+        place_sum=("place_sum", "sum"),
+        place_count=("place_count", "sum"),
+        best_place=("best_place", "min"),
+        last_date=("last_date", "max"),
+    )[TABLE_COLUMNS]
+
+
+def load_table(path=None):
+    """(table DataFrame, processed race_ids); empty if never built"""
+    import pandas as pd
+
+    path = path or config.AFFINITY_TABLE
+    if not path.exists() or not config.AFFINITY_RACES.exists():
+        return pd.DataFrame(columns=TABLE_COLUMNS), set()
+    with open(config.AFFINITY_RACES, "r") as f:
+        race_ids = set(json.load(f))
+    return pd.read_csv(path, parse_dates=["last_date"]), race_ids
+
+
+def save_table(table, race_ids, path=None):
+    path = path or config.AFFINITY_TABLE
+    table.to_csv(path, index=False)
+    with open(config.AFFINITY_RACES, "w") as f:
+        json.dump(sorted(race_ids), f)
+
+
+def refresh_table(results, rebuild=False):
+    """Update the saved table with races it has not seen yet (or rebuild it from scratch)
+
+    Rebuilds when a race in the table is gone from results (renamed race_id or removed file).
+    """
+    table, race_ids = load_table()
+    if rebuild or race_ids - set(results["race_id"].dropna()):
+        table, race_ids = table.iloc[0:0], set()
+    new_results = results[~results["race_id"].isin(race_ids)]
+    table = update_table(table, new_results)
+    save_table(table, race_ids | set(new_results["race_id"].dropna()))
+    return table, new_results["race_id"].nunique()
+
+
+def load_lookup(path=None):
+    """Affinity table as {(rider_name_norm, kind, key): row dict}; empty if never built"""
+    path = path or config.AFFINITY_TABLE
+    lookup = {}
+    if not path.exists():
+        return lookup
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            lookup[(row["rider_name_norm"], row["kind"], row["key"])] = {
+                "appearances": int(float(row["appearances"])),
+                "place_count": int(float(row["place_count"])),
+                "place_sum": float(row["place_sum"] or 0),
+                "best_place": float(row["best_place"]) if row["best_place"] else math.nan,
+            }
+    return lookup
+
+
+def features_for(lookup, rider_name, venue=None, series=None):
+    """Affinity features for a rider at a venue / in a series (unknown -> 0 appearances, NaN places)"""
+    norm_name = normalize_name(rider_name)
+    features = {}
+    for kind, value in [("venue", venue), ("series", series)]:
+        key = slug(value)
+        row = None
+        if norm_name and key:
+            row = next(
+                (lookup[(v, kind, key)] for v in name_variants(norm_name) if (v, kind, key) in lookup), None
+            )
+        features[f"{kind}_appearances"] = row["appearances"] if row else 0
+        features[f"{kind}_avg_place"] = row["place_sum"] / row["place_count"] if row and row["place_count"] else math.nan
+        features[f"{kind}_best_place"] = row["best_place"] if row else math.nan
+    return features
+
+
+if __name__ == "__main__":
+    import argparse
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Update the venue/series affinity table")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild from the full history")
+    args = parser.parse_args()
+
+    results = pd.read_csv(config.RESULTS_ALL, parse_dates=["race_date"])
+    results["Place"] = pd.to_numeric(results["Place"], errors="coerce")
+    table, n_new = refresh_table(results, rebuild=args.rebuild)
+    print(f"✓ Affinity table: {n_new} new races, {len(table)} rider x venue/series rows -> {config.AFFINITY_TABLE}")
@@ -5,14 +5,21 @@ Simple interface for testing race predictions
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
-import json
 from pathlib import Path
 import sys
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 import config
+import explanations
+import feature_spec
+import field
+import model_registry
+import results_db
+import shared_store
+import teams
+import uncertainty
+from preprocessing import FeaturePreprocessor
 
 st.set_page_config(
     page_title="VeloPredict: Cyclocross Predictions",
@@ -20,28 +27,44 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load model and metadata
-@st.cache_resource
-def load_models():
-    """Load trained models and metadata"""
-    top10_model = joblib.load(config.TOP10_MODEL)
-    top3_model = joblib.load(config.TOP3_MODEL)
-
-    with open(config.MODEL_METADATA, 'r') as f:
-        metadata = json.load(f)
-
-    return top10_model, top3_model, metadata
-
-# Load historical data
-@st.cache_data
-def load_data():
-    """Load historical race data"""
-    df = pd.read_csv(config.RESULTS_WITH_FEATURES, parse_dates=["race_date"])
-    return df
+# Published store: forests and history memory-mapped, shared by every server worker.
+# Keyed by store id, so publishing a new one swaps workers over on their next rerun.
+@st.cache_resource(max_entries=2)
+def attach_store(store_id):
+    """Attach to a published shared store"""
+    return shared_store.attach(store_id)
+
+# Other registry versions are loaded privately by the worker that asks for them
+@st.cache_resource(max_entries=2)
+def load_unshared(version):
+    """Compact forests, metadata and results database for an unpublished version"""
+    return shared_store.load_unshared(version)
+
+def load_store(version):
+    published = shared_store.current_id()
+    if published and (version is None or published.startswith(f"{version}-")):
+        return attach_store(published)
+    return load_unshared(version)
+
+# Model version picker (registered versions, newest first; published version by default)
+available_versions = [m["version"] for m in model_registry.list_versions()]
+published = shared_store.current_id()
+current = published.split("-")[0] if published else model_registry.current_version()
+if available_versions:
+    selected_version = st.sidebar.selectbox(
+        "Model version",
+        available_versions,
+        index=available_versions.index(current) if current in available_versions else 0
+    )
+else:
+    selected_version = None
 
 try:
-    model_top10, model_top3, metadata = load_models()
-    historical_data = load_data()
+    store = load_store(selected_version)
+    metadata = store["metadata"]
+    forests = store["forests"]
+    preprocessor = FeaturePreprocessor.from_metadata(metadata)
+    historical_data = store["db"]
     model_loaded = True
 except Exception as e:
     model_loaded = False
@@ -70,6 +93,8 @@ with st.sidebar:
     st.markdown(f"**Trained on:** {metadata['train_size']} races")
     st.markdown(f"**Test set:** {metadata['test_size']} races")
     st.markdown(f"**Last updated:** {metadata['training_date'][:10]}")
+    st.markdown(f"**Model version:** `{metadata['version']}`")
+    st.markdown(f"**Shared store:** `{store['store_id'] or 'not published (worker-local)'}`")
 
 # Main content
 tab1, tab2, tab3 = st.tabs(["🔮 Predict Race", "📈 Model Insights", "📚 About"])
@@ -81,18 +106,7 @@ with tab1:
     st.markdown("### Select Riders to Evaluate")
 
     # Get unique riders who have raced recently
-    recent_riders = (
-        historical_data[historical_data["race_date"] > "2024-11-01"]
-        .groupby("rider_name")
-        .agg({
-            "Place": "mean",
-            "uci_points_normalized": "last",
-            "team_tier": "last",
-            "top10_rate_career": "last"
-        })
-        .sort_values("uci_points_normalized", ascending=False)
-        .head(50)
-    )
+    recent_riders = pd.DataFrame(results_db.recent_riders(historical_data, "2024-11-01", limit=50)).set_index("rider_name")
 
     # Display rider selector
     selected_riders = st.multiselect(
@@ -102,36 +116,51 @@ with tab1:
     )
 
     if selected_riders:
-        # Get latest features for selected riders
-        predictions = []
-
-        for rider in selected_riders:
-            rider_data = historical_data[historical_data["rider_name"] == rider].iloc[-1]
+        # Latest row per selected rider with its next-race history features, scored in one batch
+        histories = [pd.DataFrame(results_db.rider_history(historical_data, rider)) for rider in selected_riders]
+        next_race = feature_spec.as_of(
+            pd.concat(histories, ignore_index=True),
+            riders=np.repeat(selected_riders, [len(history) for history in histories]),
+        )
+        latest_rows = pd.DataFrame([history.iloc[0] for history in histories], index=selected_riders)
+        latest_rows[config.HISTORY_FEATURES] = next_race.loc[selected_riders, config.HISTORY_FEATURES].to_numpy()
+        # The team's current strength, as in the snapshot (each row holds the strength before its race day)
+        latest_rows["team_strength"] = [
+            teams.smoothed_strength(*results_db.team_record(historical_data, team_id)) if team_id else strength
+            for team_id, strength in zip(latest_rows["team_id"], latest_rows["team_strength"])
+        ]
+        # The selected riders form the field
+        latest_rows = latest_rows.assign(**field.field_features(
+            np.zeros(len(latest_rows), dtype=np.int64), latest_rows["uci_points_normalized"],
+            latest_rows["avg_place_last3"], latest_rows["top10_rate_career"]
+        ))
+
+        X = preprocessor.transform(latest_rows)
+        # One traversal per forest gives the probabilities and their per-feature breakdown
+        explained = explanations.explain({name: forests[name] for name in model_registry.GLOBAL_MODELS}, X)
+        bias10, contributions = explained["top10_classifier"]
+        bias3, contributions3 = explained["top3_classifier"]
+        top10_probs = bias10 + contributions.sum(axis=1)
+        top3_probs = bias3 + contributions3.sum(axis=1)
+        likely_threshold = 0.6
+        spread = uncertainty.rider_uncertainty(forests["top10_classifier"], X, likely_threshold)
 
-            # Prepare features
-            X = pd.DataFrame([rider_data[config.NUMERIC_FEATURES + config.CATEGORICAL_FEATURES]])
-            X = pd.get_dummies(X, columns=config.CATEGORICAL_FEATURES, drop_first=True)
-
-            # Align with training features
-            for feat in metadata['features']:
-                if feat not in X.columns:
-                    X[feat] = 0
-            X = X[metadata['features']]
-
-            # Fill NaN
-            X = X.fillna(config.FILL_VALUES)
+        predictions = []
 
-            # Predict
-            top10_prob = model_top10.predict_proba(X)[0][1]
-            top3_prob = model_top3.predict_proba(X)[0][1]
+        for i, (rider, top10_prob, top3_prob, rider_contributions) in enumerate(zip(
+            selected_riders, top10_probs, top3_probs, contributions
+        )):
+            rider_data = latest_rows.loc[rider]
 
             predictions.append({
                 "Rider": rider,
                 "Top-10 Probability": top10_prob,
                 "Top-3 Probability": top3_prob,
+                **uncertainty.rows(spread, i),
                 "UCI Points": rider_data["Carried Points"],
                 "Team": rider_data["Team Name"],
-                "Recent Form (avg last 3)": rider_data["avg_place_last3"]
+                "Recent Form (avg last 3)": rider_data["avg_place_last3"],
+                "Top-10 Drivers": explanations.top_drivers(rider_contributions, preprocessor.feature_names)
             })
 
         # Display predictions
@@ -154,22 +183,36 @@ with tab1:
         ).format({
             "Top-10 Probability": "{:.1%}",
             "Top-3 Probability": "{:.1%}",
+            "Top-10 Low": "{:.1%}",
+            "Top-10 High": "{:.1%}",
+            "Tree Vote Spread": "{:.2f}",
             "UCI Points": "{:.0f}",
             "Recent Form (avg last 3)": "{:.1f}"
         })
 
         st.dataframe(styled_df, use_container_width=True, height=400)
 
+        # Why: each feature's push on the Top-10 probability for one rider
+        with st.expander("🔍 Why this prediction?"):
+            explained_rider = st.selectbox("Rider", df_pred["Rider"].tolist())
+            rider_index = selected_riders.index(explained_rider)
+            st.bar_chart(
+                pd.Series(contributions[rider_index], index=preprocessor.feature_names, name="Contribution")
+                .sort_values()
+            )
+
         # Summary stats
         st.markdown("### 📊 Quick Stats")
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
 
-        likely_top10 = (df_pred["Top-10 Probability"] > 0.6).sum()
+        likely_top10 = (df_pred["Top-10 Probability"] > likely_threshold).sum()
         likely_podium = (df_pred["Top-3 Probability"] > 0.5).sum()
 
         col1.metric("Likely Top-10", f"{likely_top10} riders")
-        col2.metric("Likely Podium", f"{likely_podium} riders")
-        col3.metric("Avg Top-10 Probability", f"{df_pred['Top-10 Probability'].mean():.1%}")
+        col2.metric("Borderline Top-10", f"{df_pred['Borderline'].sum()} riders",
+                    help=f"{config.UNCERTAINTY_LEVEL:.0%} tree interval spans {likely_threshold:.0%}")
+        col3.metric("Likely Podium", f"{likely_podium} riders")
+        col4.metric("Avg Top-10 Probability", f"{df_pred['Top-10 Probability'].mean():.1%}")
 
     else:
         st.info("Select riders above to see predictions")
@@ -178,25 +221,31 @@ with tab2:
     st.header("Model Insights")
 
     st.markdown("### 🎯 Feature Importance")
-    st.markdown("What the model considers most important:")
+    st.markdown("Average absolute push on the Top-10 probability, over the latest race of the top 50 riders:")
+
+    # Tree-path contributions for the current model, in one batch
+    insight_rows = pd.DataFrame([results_db.latest_state(historical_data, rider) for rider in recent_riders.index])
+    _, insight_contributions = explanations.explain(
+        {"top10_classifier": forests["top10_classifier"]}, preprocessor.transform(insight_rows)
+    )["top10_classifier"]
+    importance = (
+        pd.Series(np.abs(insight_contributions).mean(axis=0), index=preprocessor.feature_names)
+        .sort_values(ascending=False)
+    )
 
-    # Feature importance from metadata would go here
-    st.markdown("""
-    **Top 5 Most Important Features:**
-    1. **Top-10 Career Rate** (19.4%) - Historical success in scoring positions
-    2. **Best Place (Last 5)** (16.0%) - Recent peak performance
-    3. **Average Place (Last 3)** (13.9%) - Current form trajectory
-    4. **UCI Points** (11.3%) - Rider pedigree and ranking
-    5. **Last Place** (10.9%) - Momentum from most recent race
-    """)
+    st.bar_chart(importance)
+    st.markdown("**Top 5 Most Important Features:**\n" + "\n".join(
+        f"{i}. **{name}** ({value:.1%})" for i, (name, value) in enumerate(importance.head(5).items(), 1)
+    ))
 
     st.markdown("### 📈 Performance by Category")
 
     # Show accuracy by category
-    category_stats = historical_data.groupby("Category Name").agg({
-        "Place": "count",
-        "is_top10": "sum"
-    }).rename(columns={"Place": "Total Races", "is_top10": "Top-10 Finishes"})
+    category_stats = (
+        pd.DataFrame(results_db.category_stats(historical_data))
+        .set_index("Category Name")
+        .rename(columns={"results": "Total Races", "top10_finishes": "Top-10 Finishes"})
+    )
 
     category_stats["Top-10 Rate"] = (
         category_stats["Top-10 Finishes"] / category_stats["Total Races"]
@@ -0,0 +1,101 @@
+"""
+Per-category and per-target model training in a process pool
+Every (target, category) model is an independent task. Workers open the cached
+feature matrix (X.npy) memory-mapped read-only, so all processes share one copy
+through the page cache and only the row indices travel to each worker. The global
+Top-10 / Top-3 models are tasks too, so specialised models add fit time in parallel
+instead of in sequence.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import config
+from model_registry import category_label, category_model_name
+
+TARGETS = {
+    "top10_classifier": "is_top10",
+    "top3_classifier": "is_top3",
+}
+
+
+def category_labels(category_names):
+    """Canonical category per row ("Men Under 23" -> "Men U23"; unmapped -> "")"""
+    labels = {name: category_label(name) or "" for name in set(category_names)}
+    return np.array([labels[name] for name in category_names], dtype=str)
+
+
+def make_tasks(matrix, train_indices, test_indices, per_category=False, min_rows=None):
+    """Fit tasks for the global models plus every category with enough training rows"""
+    min_rows = config.CATEGORY_MODEL_MIN_ROWS if min_rows is None else min_rows
+    groups = [(None, np.ones(len(matrix["category"]), dtype=bool))]
+    if per_category:
+        groups += [(category, matrix["category"] == category)
+                   for category in sorted(set(matrix["category"]) - {""})]
+
+    tasks = []
+    for category, in_group in groups:
+        train_rows = train_indices[in_group[train_indices]]
+        test_rows = test_indices[in_group[test_indices]]
+        for name, target in TARGETS.items():
+            y_train = matrix[target][train_rows]
+            # A category model needs enough rows and both classes to learn from
+            if category and (len(train_rows) < min_rows or len(set(y_train)) < 2):
+                continue
+            tasks.append({
+                "name": category_model_name(name, category),
+                "target": name,
+                "category": category,
+                "train_rows": train_rows,
+                "test_rows": test_rows,
+                "y_train": y_train,
+                "y_test": matrix[target][test_rows],
+            })
+    return tasks
+
+
+def evaluate(model, X_test, y_test):
+    """Accuracy / AUC on a test subset (None when there is nothing to score)"""
+    from sklearn.metrics import accuracy_score, roc_auc_score
+
+    if len(y_test) == 0:
+        return {"test_size": 0, "accuracy": None, "auc": None}
+    proba = model.predict_proba(X_test)[:, 1]
+    return {
+        "test_size": int(len(y_test)),
+        "accuracy": float(accuracy_score(y_test, model.predict(X_test))),
+        "auc": float(roc_auc_score(y_test, proba)) if len(set(y_test)) == 2 else None,
+    }
+
+
+def fit_task(x_path, task, model_params):
+    """Worker: fit one model on its rows of the shared matrix; returns (name, model, metrics)"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    X = np.load(x_path, mmap_mode="r")
+    start = time.perf_counter()
+    model = RandomForestClassifier(**model_params)
+    model.fit(X[task["train_rows"]], task["y_train"])
+    fit_seconds = time.perf_counter() - start
+
+    metrics = evaluate(model, X[task["test_rows"]], task["y_test"])
+    metrics.update(train_size=int(len(task["train_rows"])), fit_seconds=round(fit_seconds, 2))
+    return task["name"], model, metrics
+
+
+def fit_parallel(x_path, tasks, model_params=None, max_workers=None):
+    """Fit every task in a process pool; returns ({name: model}, {name: metrics})"""
+    max_workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+    # Parallelism comes from the pool: one core per forest
+    model_params = dict(model_params or config.MODEL_PARAMS, n_jobs=1)
+
+    models, metrics = {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fit_task, str(x_path), task, model_params) for task in tasks]
+        for future in futures:
+            name, model, task_metrics = future.result()
+            models[name] = model
+            metrics[name] = task_metrics
+    return models, metrics
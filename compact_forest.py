@@ -0,0 +1,147 @@
+"""
+Compact random forest artifacts
+Flattens fitted sklearn forests into plain NumPy node arrays so predictions can be made
+without importing sklearn/joblib (fast cold start), and vectorizes traversal over all
+riders x trees at once.
+
+Usage: python compact_forest.py [--version VERSION]   # export for an existing version
+"""
+import numpy as np
+
+COMPACT_FILENAME = "compact_forests.npz"
+
+
+def export_forest(model):
+    """Flatten a fitted RandomForestClassifier into concatenated node arrays"""
+    left, right, feature, threshold, proba, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+
+        # Child indices shifted into the concatenated array (-1 marks a leaf)
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(tree.feature)
+        threshold.append(tree.threshold)
+
+        # Positive-class fraction at every node (same normalization as predict_proba)
+        value = tree.value[:, 0, :]
+        proba.append(value[:, -1] / value.sum(axis=1))
+
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return {
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "proba": np.concatenate(proba).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "max_depth": np.int64(max_depth),
+    }
+
+
+def save_compact(path, models):
+    """Save {name: fitted forest} as one uncompressed .npz (fast to load)"""
+    arrays = {}
+    for name, model in models.items():
+        for key, value in export_forest(model).items():
+            arrays[f"{name}.{key}"] = value
+    np.savez(path, **arrays)
+
+
+def load_compact(path):
+    """Load {name: forest arrays} saved by save_compact"""
+    forests = {}
+    with np.load(path) as data:
+        for key in data.files:
+            name, field = key.rsplit(".", 1)
+            forests.setdefault(name, {})[field] = data[key]
+    return forests
+
+
+def apply_forest(forest, X):
+    """Leaf node index reached by every row in every tree: (n_rows, n_trees)"""
+    X = np.asarray(X, dtype=np.float32)
+    left, right = forest["left"], forest["right"]
+    feature, threshold = forest["feature"], forest["threshold"]
+
+    node = np.tile(forest["roots"], (len(X), 1))
+    rows = np.arange(len(X))[:, None]
+
+    for _ in range(int(forest["max_depth"])):
+        next_left = left[node]
+        is_leaf = next_left == -1
+        if is_leaf.all():
+            break
+        go_left = X[rows, feature[node]] <= threshold[node]
+        node = np.where(is_leaf, node, np.where(go_left, next_left, right[node]))
+
+    return node
+
+
+def predict_proba(forest, X):
+    """Positive-class probability per row (matches sklearn's predict_proba[:, 1])"""
+    return forest["proba"][apply_forest(forest, X)].mean(axis=1)
+
+
+def feature_contributions(forest, X):
+    """Tree-path (Saabas) decomposition of predict_proba: (bias, (n_rows, n_features) contributions)
+
+    Every split on a row's path moves the node probability by proba[child] - proba[node];
+    that change is credited to the split feature. All rows x trees advance one level per
+    step, so bias + contributions.sum(axis=1) == predict_proba(forest, X).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    n_rows, n_features = X.shape
+    left, right = forest["left"], forest["right"]
+    feature, threshold, proba = forest["feature"], forest["threshold"], forest["proba"]
+    n_trees = len(forest["roots"])
+
+    node = np.tile(forest["roots"], (n_rows, 1))
+    rows = np.arange(n_rows)[:, None]
+    flat_rows = np.repeat(np.arange(n_rows), n_trees) * n_features
+    totals = np.zeros(n_rows * n_features)
+
+    for _ in range(int(forest["max_depth"])):
+        next_left = left[node]
+        is_leaf = next_left == -1
+        if is_leaf.all():
+            break
+        split_feature = feature[node]
+        go_left = X[rows, split_feature] <= threshold[node]
+        child = np.where(is_leaf, node, np.where(go_left, next_left, right[node]))
+        delta = proba[child] - proba[node]  # 0 for rows already at a leaf
+        totals += np.bincount(
+            flat_rows + np.where(is_leaf, 0, split_feature).ravel(),
+            weights=delta.ravel(),
+            minlength=n_rows * n_features,
+        )
+        node = child
+
+    bias = float(proba[forest["roots"]].mean())
+    return bias, totals.reshape(n_rows, n_features) / n_trees
+
+
+if __name__ == "__main__":
+    import argparse
+    import model_registry
+
+    parser = argparse.ArgumentParser(description="Export compact forest artifacts for a model version")
+    parser.add_argument("--version", help="Model registry version (default: CURRENT)")
+    args = parser.parse_args()
+
+    import joblib
+
+    version = model_registry.resolve_version(args.version)
+    metadata = model_registry.load_metadata(version)
+    out_dir = model_registry.version_dir(version)
+    out_path = out_dir / COMPACT_FILENAME
+    names = metadata.get("models", model_registry.GLOBAL_MODELS)  # includes any per-category models
+    save_compact(out_path, {name: joblib.load(out_dir / f"{name}.joblib") for name in names})
+    print(f"✓ Saved compact forests to {out_path}")
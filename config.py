@@ -16,40 +16,63 @@ APP_DIR = PROJECT_ROOT / "app"
 # Data files
 RESULTS_ALL = CLEAN_DIR / "results_all.csv"
 RESULTS_WITH_FEATURES = CLEAN_DIR / "results_with_features.csv"
+FEATURE_CACHE_DIR = CLEAN_DIR / "feature_cache"
+RIDER_SNAPSHOT = CLEAN_DIR / "rider_snapshot.csv"
+RANKING_INDEX = CLEAN_DIR / "ranking_index.npz"
+STARTLISTS_ALL = CLEAN_DIR / "startlists_all.csv"
+QUARANTINE_FILE = CLEAN_DIR / "quarantine.csv"
+RESULTS_DB = CLEAN_DIR / "results.sqlite"
+PREDICTION_LOG_DIR = CLEAN_DIR / "prediction_log"
+STARTLISTS_ENRICHED = CLEAN_DIR / "startlists_enriched.csv"
+AFFINITY_TABLE = CLEAN_DIR / "affinity_table.csv"
+AFFINITY_RACES = CLEAN_DIR / "affinity_races.json"
+SEASONS_DIR = CLEAN_DIR / "seasons"
+DRIFT_DIR = CLEAN_DIR / "drift"
+NUMBERS_CACHE_DIR = CLEAN_DIR / "numbers_cache"  # .numbers race files converted to CSV, by file hash
 
 # Model files
 TOP10_MODEL = MODELS_DIR / "top10_classifier.joblib"
 TOP3_MODEL = MODELS_DIR / "top3_classifier.joblib"
 MODEL_METADATA = MODELS_DIR / "model_metadata.json"
 
-# Feature configuration
-NUMERIC_FEATURES = [
-    "uci_points_normalized",
-    "races_so_far",
-    "avg_place_last3",
-    "best_place_last5",
-    "last_place",
-    "days_since_last_race",
-    "last_carried_points",
-    "last_scored_points",
-    "top3_rate_career",
-    "top10_rate_career",
-    "series_appearances",
-    "is_elite",
-    "is_women"
-]
+# Model registry (content-addressed versions, see model_registry.py)
+REGISTRY_DIR = MODELS_DIR / "registry"
+REGISTRY_CURRENT = REGISTRY_DIR / "CURRENT"
+
+# Shared serving store (memory-mapped by every app worker, see shared_store.py)
+SHARED_STORE_DIR = MODELS_DIR / "shared_store"
+SHARED_STORE_KEEP = 2  # Published stores kept on disk (workers may still be attached to the previous one)
+SHARED_STORE_MMAP_BYTES = 256 * 1024 * 1024  # SQLite mmap window for the results database
 
+# Feature configuration (numeric features: FEATURE_SPEC below)
 CATEGORICAL_FEATURES = [
     "points_tier",
     "team_tier"
 ]
 
-# Top teams in cyclocross (for team_tier feature)
-TOP_TEAMS = [
-    "ALPECIN", "DECEUNINCK", "BALOISE", "TREK", "LIONS",
-    "PAUWELS", "SAUZEN", "CRELAN", "CORENDON",
-    "VISMA", "LEASE", "BIKE", "INTERMARCHE", "CIRCUS"
-]
+# Fixed vocabularies for one-hot encoding (first level is the reference category)
+CATEGORICAL_LEVELS = {
+    "points_tier": ["low", "mid", "high"],
+    "team_tier": ["no_team", "other_team", "top_team"]
+}
+
+# Team registry (teams.py): canonical team ID -> sponsor words across renames (whole words of
+# the upper-case ASCII team name) and whether it is a top team (team_tier feature).
+# Teams not listed get an ID from their normalized name and are "other_team".
+TEAM_REGISTRY = {
+    "crelan_corendon": {"aliases": ["CRELAN", "CORENDON", "ALPECIN", "DECEUNINCK"], "top": True},
+    "baloise_lions": {"aliases": ["BALOISE", "LIONS"], "top": True},
+    "pauwels_sauzen": {"aliases": ["PAUWELS SAUZEN", "PAUWELS", "SAUZEN"], "top": True},
+    "visma_lease_a_bike": {"aliases": ["VISMA", "LEASE A BIKE", "JUMBO"], "top": True},
+    "intermarche_circus": {"aliases": ["INTERMARCHE", "CIRCUS", "WANTY"], "top": True},
+    "deschacht_hens": {"aliases": ["DESCHACHT", "HENS"], "top": False},
+    "ridley_racing": {"aliases": ["RIDLEY RACING"], "top": False},
+    "heizomat": {"aliases": ["HEIZOMAT"], "top": False},
+    "proximus_cyclis": {"aliases": ["PROXIMUS", "CYCLIS"], "top": False},
+    "nagel_cx": {"aliases": ["NAGEL CX"], "top": False},
+}
+TEAM_STRENGTH_PRIOR = 0.2  # Top-10 rate of a team without results (about the rate of all results)
+TEAM_STRENGTH_SMOOTHING = 10  # Pseudo-results pulling a team's Top-10 rate towards the prior
 
 # Model hyperparameters
 MODEL_PARAMS = {
@@ -64,29 +87,95 @@ MODEL_PARAMS = {
 # Training configuration
 TRAIN_TEST_SPLIT = 0.8  # 80% train, 20% test
 MEDIAN_PLACE_DEFAULT = 25  # For missing historical data
+GAP_PCT_DEFAULT = 15  # Gap to the winner (% of the winner's time) for riders without a timed finish
+CATEGORY_MODEL_MIN_ROWS = 500  # Training rows a category needs for its own models (--per-category)
+
+# Incremental updates (update_model.py)
+UPDATE_NEW_TREES = 50  # Trees added per model per update
+UPDATE_MAX_AUC_DROP = 0.02  # Largest Top-10 AUC loss vs the last full retrain before an update is rejected
+
+# Forest pruning (prune_forest.py)
+PRUNE_TOLERANCE = 0.005  # Largest Top-10 / Top-3 AUC and accuracy loss a pruned forest may have
+PRUNE_VALIDATION_FRACTION = 0.2  # Latest share of the training window held out of a refit to choose the pruned size on
+PRUNE_MIN_TREES = 50  # Fewest trees a pruned forest keeps (uncertainty.py resamples the trees)
+
+# Feature drift monitor (drift.py)
+DRIFT_BINS = 10  # Quantile bins per feature histogram
+DRIFT_PSI_THRESHOLD = 0.25  # PSI above which a startlist feature is reported as drifted
+
+# Per-rider uncertainty from the Top-10 forest's trees (uncertainty.py)
+UNCERTAINTY_BOOTSTRAPS = 200  # Tree resamples per startlist
+UNCERTAINTY_LEVEL = 0.90  # Interval coverage; a Top-10 call is borderline if the interval spans the threshold
+
+# Model features, one line each. History features are computed from a rider's previous
+# races by feature_spec.py (training rows and prediction lookups); "external" ones come
+# from add_features.py, affinity.py and field.py. fill: value for missing data.
+FEATURE_SPEC = [
+    {"name": "uci_points_normalized", "agg": "external", "fill": 0},
+    {"name": "races_so_far", "agg": "count", "fill": 0},
+    {"name": "avg_place_last3", "source": "Place", "window": 3, "agg": "mean", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "best_place_last5", "source": "Place", "window": 5, "agg": "min", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "last_place", "source": "Place", "agg": "last", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "days_since_last_race", "source": "race_date", "agg": "days_since", "fill": 14},
+    {"name": "last_carried_points", "source": "Carried Points", "agg": "last", "fill": 0},
+    {"name": "last_scored_points", "source": "Scored Points", "agg": "last", "fill": 0},
+    {"name": "top3_rate_career", "source": "top3_finish", "agg": "rate", "fill": 0},
+    {"name": "top10_rate_career", "source": "top10_finish", "agg": "rate", "fill": 0},
+    {"name": "last_gap_pct", "source": "gap_pct", "agg": "last", "fill": GAP_PCT_DEFAULT},
+    {"name": "avg_gap_pct_last3", "source": "gap_pct", "window": 3, "agg": "mean", "fill": GAP_PCT_DEFAULT},
+    {"name": "dnf_rate_career", "source": "is_dnf", "agg": "rate", "fill": 0},
+    {"name": "series_appearances", "agg": "external", "fill": 0},
+    {"name": "series_avg_place", "agg": "external", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "series_best_place", "agg": "external", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "venue_appearances", "agg": "external", "fill": 0},
+    {"name": "venue_avg_place", "agg": "external", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "venue_best_place", "agg": "external", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "field_points_rank", "agg": "external", "fill": MEDIAN_PLACE_DEFAULT},
+    {"name": "field_form_pct", "agg": "external", "fill": 0.5},
+    {"name": "field_stronger_riders", "agg": "external", "fill": 0},
+    {"name": "team_strength", "agg": "external", "fill": 0},
+    {"name": "is_elite", "agg": "external", "fill": 0},
+    {"name": "is_women", "agg": "external", "fill": 0},
+]
+
+NUMERIC_FEATURES = [spec["name"] for spec in FEATURE_SPEC]
+HISTORY_FEATURES = [spec["name"] for spec in FEATURE_SPEC if spec["agg"] != "external"]
 
 # NaN fill values for features
-FILL_VALUES = {
-    "uci_points_normalized": 0,
-    "races_so_far": 0,
-    "avg_place_last3": MEDIAN_PLACE_DEFAULT,
-    "best_place_last5": MEDIAN_PLACE_DEFAULT,
-    "last_place": MEDIAN_PLACE_DEFAULT,
-    "days_since_last_race": 14,
-    "last_carried_points": 0,
-    "last_scored_points": 0,
-    "top3_rate_career": 0,
-    "top10_rate_career": 0,
-    "series_appearances": 0,
-    "is_elite": 0,
-    "is_women": 0
-}
+FILL_VALUES = {spec["name"]: spec["fill"] for spec in FEATURE_SPEC}
+
+# Seasons (cyclocross seasons span the new year: August 2024 - July 2025 is "2024-25")
+SEASON_START_MONTH = 8
 
 # Categories
 ELITE_CATEGORIES = ["Men Elite", "Women Elite"]
 U23_CATEGORIES = ["Men U23", "Women U23"]
 JUNIOR_CATEGORIES = ["Men Junior", "Women Junior"]
 
+# Raw category labels (startlist headers, notebook 05 mapping) -> category_full
+CATEGORY_FULL_MAP = {
+    "men elite": "Men Elite",
+    "elite men": "Men Elite",
+    "me": "Men Elite",
+    "women elite": "Women Elite",
+    "elite women": "Women Elite",
+    "we": "Women Elite",
+    "men u23": "Men U23",
+    "men under 23": "Men U23",
+    "u23": "Men U23",
+    "mu": "Men U23",
+    "mu23": "Men U23",
+    "women u23": "Women U23",
+    "women under 23": "Women U23",
+    "wu": "Women U23",
+    "wu23": "Women U23",
+    "men junior": "Men Junior",
+    "junior": "Men Junior",
+    "mj": "Men Junior",
+    "women junior": "Women Junior",
+    "wj": "Women Junior"
+}
+
 # Business metrics
 TARGET_TOP10_ACCURACY = 0.80  # 80% accuracy goal
 TARGET_TOP3_ACCURACY = 0.70  # 70% podium accuracy goal
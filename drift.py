@@ -0,0 +1,182 @@
+"""
+Feature drift between training and serving
+train_model_v2.py stores a fixed-bin histogram of every model input (bin edges from
+the training quantiles) with the model version. Each prediction run bins its startlist
+the same way, adds the counts to a per-version serving sketch (data/clean/drift/
+<version>.json, constant size however many riders are scored) and reports the
+population stability index (PSI) of the startlist and of all serving so far.
+"""
+import csv
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+import config
+import model_registry
+
+DRIFT_SUFFIX = "_drift.csv"
+REPORT_COLUMNS = ["feature", "psi_startlist", "psi_serving", "startlist_mean", "training_mean", "drifted"]
+
+# Startlists of one event are predicted in threads (split_startlist.predict_categories)
+_SKETCH_LOCK = threading.Lock()
+
+
+def training_histograms(X, feature_names, categories=None, n_bins=None):
+    """{feature: {"edges", "counts", "mean", "by_category"}} for the encoded training matrix
+
+    categories: canonical category per row ("Men Elite"); a startlist is compared with
+    its own category's rows so the category indicator features do not count as drift.
+    """
+    n_bins = n_bins or config.DRIFT_BINS
+    X = np.asarray(X, dtype=np.float64)
+    categories = np.full(len(X), "") if categories is None else np.asarray(categories)
+    labels = [label for label in np.unique(categories) if label]
+    quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+    histograms = {}
+    for j, name in enumerate(feature_names):
+        edges = np.unique(np.quantile(X[:, j], quantiles)) if len(X) else np.zeros(0)
+        histograms[name] = {
+            "edges": edges.tolist(),
+            "counts": _bin_counts(X[:, j], edges).tolist(),
+            "mean": float(X[:, j].mean()) if len(X) else math.nan,
+            "by_category": {
+                label: {
+                    "counts": _bin_counts(X[categories == label, j], edges).tolist(),
+                    "mean": float(X[categories == label, j].mean()),
+                }
+                for label in labels
+            },
+        }
+    return histograms
+
+
+def _bin_counts(values, edges):
+    # len(edges) + 1 bins: below the first edge, between edges, at or above the last
+    return np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+
+
+def psi(expected, actual, eps=1e-4):
+    """Population stability index of two bin-count vectors (0 = same distribution)"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    if expected.sum() == 0 or actual.sum() == 0:
+        return math.nan
+    p = np.clip(expected / expected.sum(), eps, None)
+    q = np.clip(actual / actual.sum(), eps, None)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def sketch_path(version, drift_dir=None):
+    return Path(drift_dir or config.DRIFT_DIR) / f"{version}.json"
+
+
+def load_sketch(version, drift_dir=None):
+    """Serving counts for a model version: {"counts": {category: {feature: bins}}, "rows", "runs"}"""
+    path = sketch_path(version, drift_dir)
+    if path.exists():
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"version": version, "rows": 0, "runs": 0, "counts": {}}
+
+
+def _expected(trained, category):
+    """Training counts and mean for a category (all rows if the category was not trained on)"""
+    return trained.get("by_category", {}).get(category, trained)
+
+
+def update(metadata, X, feature_names, category=None, record=True, drift_dir=None):
+    """Per-feature drift report for a startlist (None without training histograms)
+
+    record: also fold the startlist into the version's serving sketch
+    """
+    histograms = metadata.get("feature_histograms")
+    if not histograms:
+        return None
+
+    X = np.asarray(X, dtype=np.float64)
+    label = model_registry.category_label(category) or ""
+    path = sketch_path(metadata["version"], drift_dir)
+    if record:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    report = []
+    with _SKETCH_LOCK:
+        sketch = load_sketch(metadata["version"], drift_dir)
+        serving_counts = sketch["counts"].setdefault(label, {})
+        for j, name in enumerate(feature_names):
+            if name not in histograms:
+                continue
+            trained = histograms[name]
+            expected = _expected(trained, label)
+            counts = _bin_counts(X[:, j], np.asarray(trained["edges"]))
+            serving = np.asarray(serving_counts.get(name, np.zeros(len(counts), dtype=np.int64))) + counts
+            serving_counts[name] = serving.tolist()
+
+            psi_startlist = psi(expected["counts"], counts)
+            report.append({
+                "feature": name,
+                "psi_startlist": psi_startlist,
+                "psi_serving": psi(expected["counts"], serving),
+                "startlist_mean": float(X[:, j].mean()) if len(X) else math.nan,
+                "training_mean": expected["mean"],
+                "drifted": psi_startlist > config.DRIFT_PSI_THRESHOLD,
+            })
+        if record:
+            sketch["rows"] += len(X)
+            sketch["runs"] += 1
+            sketch["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(sketch, f)
+            os.replace(tmp_path, path)
+
+    return sorted(report, key=lambda r: -r["psi_startlist"])
+
+
+def drift_path(predictions_path):
+    path = Path(predictions_path)
+    return path.with_name(path.stem + DRIFT_SUFFIX)
+
+
+def save_report(path, report):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(report)
+    return path
+
+
+def summary(report, top=5):
+    """One line naming the most drifted features"""
+    drifted = [r for r in report if r["drifted"]]
+    if not drifted:
+        return f"no feature drift (max PSI {report[0]['psi_startlist']:.2f})" if report else "no features"
+    more = f" and {len(drifted) - top} more" if len(drifted) > top else ""
+    return "drift in " + ", ".join(f"{r['feature']} (PSI {r['psi_startlist']:.2f})" for r in drifted[:top]) + more
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serving drift for a model version (all predictions so far)")
+    parser.add_argument("--version", help="Model registry version (default: CURRENT)")
+    args = parser.parse_args()
+
+    version = model_registry.resolve_version(args.version)
+    histograms = model_registry.load_metadata(version).get("feature_histograms", {})
+    sketch = load_sketch(version)
+    print(f"✓ Model {version}: {sketch['rows']} riders scored in {sketch['runs']} runs")
+    for label, counts in sorted(sketch["counts"].items()):
+        print(f"\n{label or 'Unknown category'}:")
+        rows = sorted(
+            ((psi(_expected(histograms[name], label)["counts"], bins), name) for name, bins in counts.items()),
+            reverse=True,
+        )
+        for value, name in rows:
+            flag = "⚠️ " if value > config.DRIFT_PSI_THRESHOLD else "  "
+            print(f"  {flag}{name:25s} PSI {value:6.3f}")
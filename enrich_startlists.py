@@ -0,0 +1,159 @@
+"""
+Startlist enrichment: join startlist riders to their latest feature state
+Replaces the notebook 03 merge against the full results history with one keyed,
+many-to-one merge against the rider snapshot (one row per rider). Riders are matched
+by UCI ID when the state carries one, otherwise by an order-independent normalized
+name + gender key, so "AERTS Toon" matches "Toon Aerts" (name only when the
+startlist category does not say Men/Women).
+
+Usage: python enrich_startlists.py [--startlists data/clean/startlists_all.csv] [--output ...]
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+import field
+import rider_snapshot
+from names import name_key, normalize_name
+
+ID_COLUMN = "UCI ID"
+NAME_COLUMNS = ["rider_name", "Naam", "Name"]
+CATEGORY_FLAGS = ["is_elite", "is_women"]
+
+
+def load_state(path=None):
+    """Latest feature state per rider (the rider snapshot written by add_features.py)"""
+    path = Path(path or config.RIDER_SNAPSHOT)
+    if not path.exists():
+        raise FileNotFoundError(f"No rider snapshot at {path}. Run: python add_features.py")
+    return pd.read_csv(path, parse_dates=["race_date"])
+
+
+def _name_keys(names, is_women=None):
+    keys = {name: name_key(name) for name in names.dropna().unique()}
+    if is_women is None:
+        return "name:" + names.map(keys)
+    return "name:" + names.map(keys) + "|" + is_women.astype(int).astype(str)
+
+
+def _id_keys(ids):
+    ids = pd.to_numeric(ids, errors="coerce").astype("Int64").astype("string")
+    return "id:" + ids
+
+
+def build_state_table(state):
+    """Next-race features per rider, indexed under every key the rider can be matched by"""
+    state = state.sort_values("race_date", kind="stable", na_position="first")
+
+    features = pd.DataFrame(rider_snapshot.features_from_latest(state, category=""), index=state.index)
+    features = features.drop(columns=CATEGORY_FLAGS)
+    features["matched_rider_name"] = state["rider_name"]
+    features["last_race_date"] = state["race_date"]
+    features["_state_is_women"] = state["is_women"]
+
+    tables = [
+        features.assign(merge_key=_name_keys(state["rider_name"])),
+        features.assign(merge_key=_name_keys(state["rider_name"], state["is_women"])),
+    ]
+    if ID_COLUMN in state.columns:
+        has_id = state[ID_COLUMN].notna()
+        tables.insert(0, features[has_id].assign(merge_key=_id_keys(state.loc[has_id, ID_COLUMN])))
+
+    # Latest rider wins if two riders share a key
+    table = pd.concat(tables, ignore_index=True).dropna(subset=["merge_key"])
+    return table.drop_duplicates("merge_key", keep="last")
+
+
+def enrich_startlist(startlist, state):
+    """Startlist rows + next-race features, match_type in {"id", "name", "none"}"""
+    startlist = startlist.copy()
+    name_col = next((col for col in NAME_COLUMNS if col in startlist.columns), None)
+    if name_col is None:
+        raise ValueError(f"Startlist has no rider name column (expected one of {NAME_COLUMNS})")
+
+    category = startlist.get("category_full", pd.Series("", index=startlist.index)).fillna("").astype(str)
+    gender_known = category.str.contains(r"\b(?:Men|Women)\b").to_numpy()
+    startlist["is_elite"] = category.str.contains("Elite").astype(int)
+    startlist["is_women"] = category.str.contains("Women").astype(int)
+    startlist["rider_name_norm"] = startlist[name_col].map(normalize_name)
+
+    table = build_state_table(state)
+    known_keys = pd.Index(table["merge_key"])
+
+    name_keys = pd.Series(
+        np.where(gender_known, _name_keys(startlist[name_col], startlist["is_women"]), _name_keys(startlist[name_col])),
+        index=startlist.index,
+    )
+    id_keys = _id_keys(startlist[ID_COLUMN]) if ID_COLUMN in startlist.columns else pd.Series(pd.NA, index=startlist.index)
+    id_match = id_keys.isin(known_keys).to_numpy()
+    name_match = name_keys.isin(known_keys).to_numpy()
+
+    startlist["merge_key"] = np.where(id_match, id_keys, name_keys)
+    startlist["match_type"] = np.select([id_match, name_match], ["id", "name"], "none")
+
+    # Re-enrichment: drop stale feature columns instead of producing _x/_y pairs
+    startlist = startlist.drop(columns=[c for c in table.columns if c in startlist.columns and c != "merge_key"])
+    enriched = startlist.merge(table, on="merge_key", how="left", validate="many_to_one").drop(columns="merge_key")
+
+    # Unknown category: take the gender of the matched rider
+    take_gender = ~gender_known & enriched["_state_is_women"].notna().to_numpy()
+    enriched.loc[take_gender, "is_women"] = enriched.loc[take_gender, "_state_is_women"].astype(int)
+    enriched = enriched.drop(columns="_state_is_women")
+
+    # Days since last race from the actual race date when the startlist has one
+    if "race_date" in enriched.columns:
+        race_date = pd.to_datetime(enriched["race_date"], errors="coerce")
+        days = (race_date - enriched["last_race_date"]).dt.days
+        enriched["days_since_last_race"] = days.where(days.notna(), enriched["days_since_last_race"])
+
+    # Unmatched riders get the same defaults as prediction
+    defaults = rider_snapshot.new_rider_features(category="")
+    unmatched = enriched["match_type"] == "none"
+    for col, value in defaults.items():
+        if col not in CATEGORY_FLAGS:
+            enriched.loc[unmatched, col] = value
+
+    # Field-relative features over each startlist (race + category), as in prediction
+    group_cols = [c for c in ["race_id", "category_full"] if c in enriched.columns]
+    fields = pd.factorize(enriched[group_cols].fillna("").astype(str).agg("|".join, axis=1))[0] if group_cols else np.zeros(len(enriched), dtype=np.int64)
+    for name, values in field.field_features(
+        fields, enriched["uci_points_normalized"], enriched["avg_place_last3"], enriched["top10_rate_career"]
+    ).items():
+        enriched[name] = values
+
+    return enriched
+
+
+def match_report(enriched):
+    """Match rates per race + category"""
+    group_cols = [c for c in ["race_id", "category_full"] if c in enriched.columns]
+    groups = [enriched[c].fillna("unknown") for c in group_cols] or [pd.Series("all", index=enriched.index)]
+    rates = pd.crosstab(groups, enriched["match_type"]).reindex(columns=["id", "name", "none"], fill_value=0)
+    rates.insert(0, "riders", rates.sum(axis=1))
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enrich startlists with each rider's latest feature state")
+    parser.add_argument("--startlists", default=str(config.STARTLISTS_ALL), help="Startlist CSV")
+    parser.add_argument("--snapshot", help="Rider snapshot CSV (default: data/clean/rider_snapshot.csv)")
+    parser.add_argument("--output", default=str(config.STARTLISTS_ENRICHED), help="Output path")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("STARTLIST ENRICHMENT")
+    print("=" * 60)
+
+    startlists = pd.read_csv(args.startlists)
+    enriched = enrich_startlist(startlists, load_state(args.snapshot))
+
+    print(match_report(enriched).to_string())
+    counts = enriched["match_type"].value_counts()
+    print(f"\n✓ Matched {counts.get('id', 0) + counts.get('name', 0)}/{len(enriched)} riders "
+          f"({counts.get('id', 0)} by ID, {counts.get('name', 0)} by name, {counts.get('none', 0)} new)")
+
+    enriched.to_csv(args.output, index=False)
+    print(f"✓ Saved to: {args.output}")
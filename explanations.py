@@ -0,0 +1,61 @@
+"""
+Per-rider prediction explanations from tree-path feature contributions
+(compact_forest.feature_contributions). Contributions for a startlist are cached next
+to its predictions file as <predictions>_contributions.csv: one row per rider and model,
+with the model's bias (average training rate) and each feature's share of the gap
+between the bias and the rider's probability.
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+
+import model_registry
+from compact_forest import COMPACT_FILENAME, export_forest, feature_contributions, load_compact
+
+CONTRIBUTIONS_SUFFIX = "_contributions.csv"
+TARGET_LABELS = {
+    "top10_classifier": "Top-10",
+    "top3_classifier": "Top-3",
+}
+
+
+def contributions_path(predictions_path):
+    path = Path(predictions_path)
+    return path.with_name(path.stem + CONTRIBUTIONS_SUFFIX)
+
+
+def load_forests(model_top10, model_top3, metadata, category=None):
+    """Compact Top-10 / Top-3 node arrays for a version and race category
+
+    Saved with the version, else exported from the fitted models (which must be the
+    category's, see model_registry.load_category).
+    """
+    compact_path = model_registry.version_dir(metadata["version"]) / COMPACT_FILENAME
+    if compact_path.exists():
+        forests = load_compact(compact_path)
+        return {target: forests[name] for target, name in model_registry.category_models(metadata, category).items()}
+    return {"top10_classifier": export_forest(model_top10), "top3_classifier": export_forest(model_top3)}
+
+
+def explain(forests, X):
+    """{model name: (bias, contributions)} for every forest, one batch each"""
+    return {name: feature_contributions(forest, X) for name, forest in forests.items()}
+
+
+def top_drivers(contributions, feature_names, k=3):
+    """ "feature +x.x%" for the k largest absolute contributions of one rider"""
+    order = np.argsort(-np.abs(contributions))[:k]
+    return ", ".join(f"{feature_names[j]} {contributions[j]:+.1%}" for j in order if contributions[j] != 0)
+
+
+def save_contributions(path, riders, feature_names, explained):
+    """Write {model name: (bias, contributions)} for a startlist as one CSV"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Rider", "Target", "bias"] + list(feature_names))
+        for name, (bias, contributions) in explained.items():
+            target = TARGET_LABELS.get(name, name)
+            for rider, row in zip(riders, contributions):
+                writer.writerow([rider, target, bias] + [float(value) for value in row])
+    return path
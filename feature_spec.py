@@ -0,0 +1,153 @@
+"""
+Compiler for the declarative rider-history features (config.FEATURE_SPEC)
+Each history feature is one line of the spec: source column, window, aggregation,
+shift and fill value. compute() evaluates every spec over a rider-sorted history in
+one NumPy pass (one lag per source and distance, shared by all specs that need it;
+no groupby), and as_of() runs the same pass on a virtual next race per rider, so
+training rows and prediction lookups come out of the same code.
+
+Aggregations:
+  mean / min / last  over the source in the `window` races ending `shift` races back
+  days_since         days between the race and the rider's previous race
+  count              previous races (carried-over totals from earlier seasons via `prior`)
+  rate               share of previous races where the source is 1 (NaN before the first race)
+"""
+import numpy as np
+import pandas as pd
+
+import config
+
+SPEC_DEFAULTS = {"source": None, "window": 1, "shift": 1}
+
+# Source columns derived from the result itself
+DERIVED_SOURCES = {
+    "top3_finish": lambda history: (history["Place"] <= 3).astype(int),
+    "top10_finish": lambda history: (history["Place"] <= 10).astype(int),
+}
+
+# Days to a rider's next race when no race date is given (assume weekly racing)
+ASSUMED_DAYS_TO_NEXT_RACE = 7
+
+# Order of a rider's results: by date, then race and category so same-day results
+# always come out in the same order, whatever order the history was read in
+HISTORY_ORDER = ["race_date", "race_id", "Category Name"]
+# Undated results count as a rider's oldest (never the latest) in every history sort,
+# as in seasons.season_order, the results_db ORDER BYs (NULLs last when newest first) and teams
+UNDATED_POSITION = "first"
+
+HISTORY_SPECS = [dict(SPEC_DEFAULTS, **spec) for spec in config.FEATURE_SPEC if spec["agg"] != "external"]
+WINDOW_SPECS = [spec for spec in HISTORY_SPECS if spec["agg"] in ("mean", "min", "last", "days_since")]
+CAREER_SPECS = [spec for spec in HISTORY_SPECS if spec["agg"] in ("count", "rate")]
+
+# Columns a history needs, and how many previous races the windows reach back
+WINDOW_SOURCES = list(dict.fromkeys(spec["source"] for spec in WINDOW_SPECS))
+CAREER_SOURCES = list(dict.fromkeys(spec["source"] for spec in CAREER_SPECS if spec["source"]))
+MAX_LOOKBACK = max(spec["window"] + spec["shift"] - 1 for spec in WINDOW_SPECS)
+
+
+def add_sources(history):
+    """History with the derived source columns (top-3 / top-10 finish flags)"""
+    return history.assign(**{name: derive(history) for name, derive in DERIVED_SOURCES.items()})
+
+
+def _group_positions(riders):
+    """Position of each row within its rider's run (rows sorted by rider)"""
+    riders = np.asarray(riders)
+    position = np.arange(len(riders))
+    new_rider = np.r_[True, riders[1:] != riders[:-1]] if len(riders) else np.zeros(0, dtype=bool)
+    start = np.maximum.accumulate(np.where(new_rider, position, 0)) if len(riders) else position
+    return start, position - start
+
+
+def _in_group_cumsum(values, start):
+    """Running total per rider, including the current row"""
+    total = np.cumsum(values)
+    return total - (total - values)[start]
+
+
+def compute(history, riders=None, counted=None, prior=None, specs=None):
+    """{feature: array} for every row of a history sorted by rider, then date
+
+    riders: rider key per row (default: rider_name_norm)
+    counted: 1 for real results, 0 for stand-in rows that only feed the windows
+    prior: DataFrame of per-row career totals carried in ("races" + CAREER_SOURCES)
+    """
+    specs = HISTORY_SPECS if specs is None else specs
+    riders = history["rider_name_norm"].to_numpy() if riders is None else np.asarray(riders)
+    n_rows = len(history)
+    start, offset = _group_positions(riders)
+    counted = np.ones(n_rows) if counted is None else np.asarray(counted, dtype=np.float64)
+
+    lags = {}
+
+    def lag(source, k):
+        # Source value k races back for the same rider (NaN past the rider's first race)
+        if (source, k) not in lags:
+            values = history[source].to_numpy()
+            shifted = np.roll(values, k)
+            lags[source, k] = np.where(offset >= k, shifted, np.datetime64("NaT") if values.dtype.kind == "M" else np.nan)
+        return lags[source, k]
+
+    def prior_total(name):
+        return np.zeros(n_rows) if prior is None else prior[name].to_numpy(dtype=np.float64)
+
+    races = prior_total("races") + _in_group_cumsum(counted, start) - counted
+    features = {}
+    for spec in specs:
+        agg, source = spec["agg"], spec["source"]
+        if agg == "days_since":
+            dates = history[source].to_numpy(dtype="datetime64[ns]")
+            features[spec["name"]] = (dates - lag(source, spec["shift"])) / np.timedelta64(1, "D")
+        elif agg == "count":
+            features[spec["name"]] = races.astype(np.int64)
+        elif agg == "rate":
+            hits = np.nan_to_num(history[source].to_numpy(dtype=np.float64)) * counted
+            before = prior_total(source) + _in_group_cumsum(hits, start) - hits
+            features[spec["name"]] = np.divide(before, races, out=np.full(n_rows, np.nan), where=races > 0)
+        else:
+            window = np.stack([
+                lag(source, k).astype(np.float64) for k in range(spec["shift"], spec["shift"] + spec["window"])
+            ])
+            if agg == "last":
+                features[spec["name"]] = window[0]
+            elif agg == "min":
+                features[spec["name"]] = np.fmin.reduce(window, axis=0)
+            else:  # mean of the available values (NaN if none)
+                present = ~np.isnan(window)
+                n_present = present.sum(axis=0)
+                features[spec["name"]] = np.divide(
+                    np.where(present, window, 0).sum(axis=0), n_present, out=np.full(n_rows, np.nan), where=n_present > 0
+                )
+    return features
+
+
+def as_of(history, riders=None, race_date=None):
+    """History features of each rider's next race: DataFrame indexed by rider
+
+    Only results before race_date are used; without a race date the next race is
+    assumed ASSUMED_DAYS_TO_NEXT_RACE days after the rider's latest dated result.
+    """
+    history = add_sources(history).assign(race_date=pd.to_datetime(history["race_date"]))
+    history = history.assign(
+        _rider=history["rider_name_norm"] if riders is None else np.asarray(riders), _next=False
+    )
+    if race_date is not None:
+        history = history[history["race_date"] < pd.Timestamp(race_date)]
+    # By rider, then HISTORY_ORDER (undated results first, as the oldest)
+    history = history.sort_values(["_rider", *HISTORY_ORDER], kind="stable", na_position=UNDATED_POSITION)
+
+    next_race = history.groupby("_rider", sort=False)["race_date"].max().reset_index().assign(_next=True)
+    next_race["race_date"] = (
+        pd.Timestamp(race_date) if race_date is not None
+        else next_race["race_date"] + pd.Timedelta(days=ASSUMED_DAYS_TO_NEXT_RACE)
+    )
+    combined = pd.concat([history, next_race], ignore_index=True)
+    combined = combined.iloc[np.argsort(combined["_rider"].to_numpy(), kind="stable")]
+    is_next = combined["_next"].to_numpy(dtype=bool)
+
+    # The virtual race is not a result: it sees the windows and totals but adds nothing
+    features = compute(combined, riders=combined["_rider"].to_numpy(), counted=~is_next)
+    return pd.DataFrame(
+        {name: values[is_next] for name, values in features.items()},
+        index=pd.Index(combined["_rider"].to_numpy()[is_next], name="rider"),
+    )
@@ -0,0 +1,87 @@
+"""
+Field-relative features: where a rider stands in the field they are racing against
+One NumPy function computes them for any number of fields at once: add_features.py
+passes every historical race (race_id x category) as a group, prediction passes the
+startlist as a single group, so training and serving share the exact same code.
+"""
+import numpy as np
+
+import config
+
+FIELD_FEATURES = [
+    "field_points_rank",
+    "field_form_pct",
+    "field_stronger_riders",
+]
+
+
+def better_counts(groups, values):
+    """Rows in the same group with a strictly larger value, per row (ties count as equal)
+
+    groups: int group code per row, values: float per row (no NaN). One lexsort over all
+    groups, then the first position of each (group, value) run minus its group start.
+    """
+    groups = np.asarray(groups)
+    values = np.asarray(values, dtype=np.float64)
+    n_rows = len(values)
+    if n_rows == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    order = np.lexsort((-values, groups))  # by group, then value descending
+    g, v = groups[order], values[order]
+    position = np.arange(n_rows)
+    group_start = np.r_[True, g[1:] != g[:-1]]
+    run_start = group_start | np.r_[True, v[1:] != v[:-1]]
+
+    first_in_group = np.maximum.accumulate(np.where(group_start, position, 0))
+    first_in_run = np.maximum.accumulate(np.where(run_start, position, 0))
+
+    counts = np.empty(n_rows, dtype=np.int64)
+    counts[order] = first_in_run - first_in_group
+    return counts
+
+
+def field_features(groups, uci_points, recent_form, career_top10_rate):
+    """{feature: array} for riders grouped into fields
+
+    field_points_rank: 1 = most UCI points in the field (ties share the best rank)
+    field_form_pct: share of the rest of the field with a worse recent average place
+    (1.0 = best form; 0.5 for a rider alone in the field)
+    field_stronger_riders: riders in the field with a higher career Top-10 rate
+    Missing values are filled the same way as the model inputs (config.FILL_VALUES).
+    """
+    groups = np.asarray(groups)
+    fill = config.FILL_VALUES
+
+    def filled(values, feature):
+        values = np.asarray(values, dtype=np.float64)
+        return np.where(np.isnan(values), fill[feature], values)
+
+    points = filled(uci_points, "uci_points_normalized")
+    form = filled(recent_form, "avg_place_last3")
+    career = filled(career_top10_rate, "top10_rate_career")
+
+    field_size = np.bincount(groups)[groups]
+    worse_form = better_counts(groups, form)  # higher average place = worse form
+    others = field_size - 1
+    return {
+        "field_points_rank": better_counts(groups, points) + 1,
+        "field_form_pct": np.divide(worse_form, others, out=np.full(len(form), 0.5), where=others > 0),
+        "field_stronger_riders": better_counts(groups, career),
+    }
+
+
+def add_field_features(riders):
+    """Add the field features to a startlist's feature dicts (the startlist is one field)"""
+    if not riders:
+        return riders
+    column = lambda name: [rider.get(name, np.nan) for rider in riders]
+    features = field_features(
+        np.zeros(len(riders), dtype=np.int64),
+        column("uci_points_normalized"),
+        column("avg_place_last3"),
+        column("top10_rate_career"),
+    )
+    for i, rider in enumerate(riders):
+        rider.update({name: values[i].item() for name, values in features.items()})
+    return riders
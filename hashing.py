@@ -0,0 +1,22 @@
+"""
+Content hashing helpers
+Used to key model versions and cached artifacts by the data they were built from
+"""
+import hashlib
+import json
+from pathlib import Path
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents (read in chunks so large CSVs stay cheap)"""
+    digest = hashlib.sha256()
+    with open(Path(path), "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_sha256(obj):
+    """SHA-256 of a JSON-serializable object (key order doesn't matter)"""
+    payload = json.dumps(obj, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
@@ -0,0 +1,176 @@
+"""
+Content-addressed model registry
+Each trained model set is stored under models/registry/<version>/, where the version
+is a hash of the training data file and the training parameters. A CURRENT pointer
+file names the version used by default for predictions.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import config
+from hashing import file_sha256, params_sha256
+
+# Models already loaded in this process, keyed by version
+_LOADED = {}
+
+LEGACY_VERSION = "legacy"
+
+GLOBAL_MODELS = ["top10_classifier", "top3_classifier"]
+
+
+def compute_version(data_path, params):
+    """Return (version, data_hash) for a training data file + parameter set"""
+    data_hash = file_sha256(data_path)
+    version = params_sha256({"data": data_hash, "params": params})[:16]
+    return version, data_hash
+
+
+def version_dir(version):
+    return config.REGISTRY_DIR / version
+
+
+def version_exists(version):
+    return (version_dir(version) / "metadata.json").exists()
+
+
+def current_version():
+    """Version named by the CURRENT pointer (None if nothing is registered yet)"""
+    if not config.REGISTRY_CURRENT.exists():
+        return None
+    version = config.REGISTRY_CURRENT.read_text().strip()
+    return version or None
+
+
+def set_current(version):
+    """Point CURRENT at a registered version (atomic replace)"""
+    if not version_exists(version):
+        raise ValueError(f"Unknown model version: {version}")
+    config.REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = config.REGISTRY_CURRENT.with_suffix(".tmp")
+    tmp_path.write_text(version)
+    os.replace(tmp_path, config.REGISTRY_CURRENT)
+
+
+def list_versions():
+    """Metadata for every registered version, newest first"""
+    if not config.REGISTRY_DIR.exists():
+        return []
+    versions = []
+    for meta_path in config.REGISTRY_DIR.glob("*/metadata.json"):
+        with open(meta_path, "r") as f:
+            versions.append(json.load(f))
+    return sorted(versions, key=lambda m: m.get("training_date", ""), reverse=True)
+
+
+def save_version(version, models, metadata, make_current=True):
+    """Persist a set of fitted models ({name: estimator}) and their metadata"""
+    import joblib
+
+    out_dir = version_dir(version)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, model in models.items():
+        joblib.dump(model, out_dir / f"{name}.joblib")
+
+    metadata = dict(metadata, version=version, models=sorted(models))
+    with open(out_dir / "metadata.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    if make_current:
+        set_current(version)
+    return out_dir
+
+
+def resolve_version(version=None):
+    """Explicit version, else CURRENT, else the legacy single-file models"""
+    if version:
+        return version
+    return current_version() or LEGACY_VERSION
+
+
+def load_metadata(version=None):
+    version = resolve_version(version)
+    meta_path = config.MODEL_METADATA if version == LEGACY_VERSION else version_dir(version) / "metadata.json"
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+def load_version(version=None):
+    """Load (model_top10, model_top3, metadata) for a version, reusing loaded ones"""
+    version = resolve_version(version)
+    if version in _LOADED:
+        return _LOADED[version]
+
+    import joblib
+
+    if version == LEGACY_VERSION:
+        model_top10 = joblib.load(config.TOP10_MODEL)
+        model_top3 = joblib.load(config.TOP3_MODEL)
+    else:
+        if not version_exists(version):
+            raise FileNotFoundError(f"Model version {version} not found in {config.REGISTRY_DIR}")
+        model_top10 = joblib.load(version_dir(version) / "top10_classifier.joblib")
+        model_top3 = joblib.load(version_dir(version) / "top3_classifier.joblib")
+
+    metadata = load_metadata(version)
+    metadata.setdefault("version", version)
+
+    _LOADED[version] = (model_top10, model_top3, metadata)
+    return _LOADED[version]
+
+
+def category_label(category):
+    """Canonical category ("Men Under 23" / "MU23" -> "Men U23"), None if unknown"""
+    if not isinstance(category, str):
+        return None
+    return config.CATEGORY_FULL_MAP.get(" ".join(category.split()).lower())
+
+
+def category_model_name(target, category=None):
+    """Registry name of a target's model for a category ("top10_classifier__men-u23")"""
+    if not category:
+        return target
+    return f"{target}__{category.lower().replace(' ', '-')}"
+
+
+def category_models(metadata, category=None):
+    """{target: model name} to use for a race category: its own models if trained, else the global ones"""
+    trained = metadata.get("category_models", {}).get(category_label(category), {})
+    return {target: trained.get(target, target) for target in GLOBAL_MODELS}
+
+
+def load_category(version=None, category=None):
+    """Load (model_top10, model_top3, metadata) for a race category (falls back to the global models)"""
+    model_top10, model_top3, metadata = load_version(version)
+    names = category_models(metadata, category)
+    if names == {target: target for target in GLOBAL_MODELS}:
+        return model_top10, model_top3, metadata
+
+    key = (metadata["version"], names["top10_classifier"])
+    if key not in _LOADED:
+        import joblib
+
+        _LOADED[key] = tuple(
+            joblib.load(version_dir(metadata["version"]) / f"{names[target]}.joblib") for target in GLOBAL_MODELS
+        ) + (metadata,)
+    return _LOADED[key]
+
+
+def benchmark_latency(model, X, batch_size=50, repeats=5):
+    """Median predict_proba latency (ms) for one rider and for a startlist-sized batch"""
+    def median_ms(rows):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict_proba(rows)
+            timings.append((time.perf_counter() - start) * 1000)
+        return float(sorted(timings)[len(timings) // 2])
+
+    batch = X[:batch_size]
+    return {
+        "single_row_ms": median_ms(X[:1]),
+        "batch_ms": median_ms(batch),
+        "batch_size": len(batch),
+    }
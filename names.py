@@ -0,0 +1,30 @@
+"""
+Rider name normalization shared by ingestion, feature building and prediction
+Stdlib only, so the lean prediction CLI can use it without importing pandas
+"""
+import re
+import unicodedata
+
+
+def normalize_name(name):
+    """Lowercase, strip accents and collapse whitespace ("VAN AERT  Wout" -> "van aert wout")"""
+    if name is None or name != name:  # None or NaN
+        return None
+    name = unicodedata.normalize("NFD", str(name))
+    name = "".join(char for char in name if unicodedata.category(char) != "Mn")
+    name = re.sub(r"\s+", " ", name.lower().strip())
+    return name or None
+
+
+def name_variants(norm_name):
+    """Normalized name plus its "LASTNAME Firstname" -> "firstname lastname" reversal"""
+    parts = norm_name.split()
+    if len(parts) >= 2:
+        return [norm_name, f"{parts[-1]} {' '.join(parts[:-1])}"]
+    return [norm_name]
+
+
+def name_key(name):
+    """Order-independent join key ("VAN AERT Wout" and "Wout van Aert" -> "aert van wout")"""
+    norm = normalize_name(name)
+    return " ".join(sorted(norm.split())) if norm else None
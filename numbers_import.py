@@ -0,0 +1,61 @@
+"""
+Apple Numbers race exports (.numbers) read as CSV
+The first table of the first sheet is converted to the same text a Numbers CSV export
+gives (whole numbers without ".0", 15 significant digits, empty cells empty) and cached
+under data/clean/numbers_cache/<sha256 of the .numbers file>.csv, so each file is
+converted once and re-read like any race CSV afterwards.
+"""
+import csv
+import datetime
+import os
+from pathlib import Path
+
+import config
+from hashing import file_sha256
+
+NUMBERS_SUFFIX = ".numbers"
+
+
+def cell_text(value):
+    """CSV text of one Numbers cell value"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else format(value, ".15g")
+    if isinstance(value, datetime.timedelta):
+        minutes, seconds = divmod(int(round(value.total_seconds())), 60)
+        return f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}"
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d") if value.time() == datetime.time() else value.isoformat(sep=" ")
+    return str(value)
+
+
+def table_rows(path):
+    """Header and rows of the first table in a .numbers file, as CSV text"""
+    from numbers_parser import Document
+
+    table = Document(str(path)).sheets[0].tables[0]
+    rows = [[cell_text(value) for value in row] for row in table.rows(values_only=True)]
+    if not rows:
+        return []
+    # Unnamed columns get pandas' names, so they are dropped like a CSV's empty columns
+    header = [name or f"Unnamed: {i}" for i, name in enumerate(rows[0])]
+    return [header] + [row for row in rows[1:] if any(row)]
+
+
+def cache_path(path, cache_dir=None):
+    return Path(cache_dir or config.NUMBERS_CACHE_DIR) / f"{file_sha256(path)}.csv"
+
+
+def cached_csv(path, cache_dir=None):
+    """Path of the converted CSV for a .numbers file (converted on first use)"""
+    out_path = cache_path(path, cache_dir)
+    if not out_path.exists():
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_suffix(".tmp")
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(table_rows(path))
+        os.replace(tmp_path, out_path)
+    return out_path
@@ -0,0 +1,225 @@
+"""
+Lean prediction CLI for scripted race-weekend runs
+Loads only the precomputed rider snapshot and compact model artifacts: no pandas,
+sklearn or joblib, and no full history CSV. Heavy imports are deferred until after
+argument parsing.
+
+Usage: python predict_fast.py --startlist data/startlists/tabor_men_elite_2025-11-23.csv --category "Men Elite"
+"""
+import time
+
+START = time.perf_counter()
+
+import argparse
+import csv
+
+import affinity
+import config
+import drift
+import field
+import model_registry
+import ranking_index
+import rider_snapshot
+import uncertainty
+from split_startlist import parse_startlist_filename, startlist_race_date
+
+OUTPUT_COLUMNS = [
+    "Rider",
+    "Top-10 Probability",
+    "Top-3 Probability",
+    "Predicted Finish",
+    *uncertainty.UNCERTAINTY_COLUMNS,
+    "Status",
+    "DNS Risk",
+    "DNS Reason",
+    "Recent Form",
+    "Career Top-10 Rate",
+    "UCI Ranking Points",
+    "UCI Rank",
+    "Top-10 Drivers",
+]
+
+
+def elapsed_ms():
+    return (time.perf_counter() - START) * 1000
+
+
+def read_startlist(path):
+    """Rider names from a startlist CSV (rider_name / Naam / Name column)"""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [row.get("rider_name") or row.get("Naam") or row.get("Name") for row in rows]
+
+
+def load_artifacts(version=None):
+    """Compact forests + preprocessor for a registry version"""
+    from compact_forest import COMPACT_FILENAME, load_compact
+    from preprocessing import FeaturePreprocessor
+
+    metadata = model_registry.load_metadata(version)
+    compact_path = model_registry.version_dir(metadata["version"]) / COMPACT_FILENAME
+    if not compact_path.exists():
+        raise FileNotFoundError(
+            f"No compact artifacts at {compact_path}. Run: python compact_forest.py --version {metadata['version']}"
+        )
+
+    forests = load_compact(compact_path)
+    return forests, FeaturePreprocessor.from_metadata(metadata), metadata
+
+
+def load_rankings(path=None):
+    """Ranking points index, or None if ranking_index.py has not been run"""
+    path = path or config.RANKING_INDEX
+    return ranking_index.load_index(path) if path.exists() else None
+
+
+def predict_fast(startlist_path, category="Men Elite", output_path=None, confidence_threshold=0.55,
+                 enable_dns_filter=True, model_version=None, artifacts=None, snapshot=None, verbose=True,
+                 race_date=None, rankings=None, venue=None, series=None, affinity_lookup=None,
+                 race_id=None, log=True):
+    """Score a startlist from the rider snapshot; returns a list of prediction dicts
+
+    artifacts/snapshot/rankings/affinity_lookup can be passed in (already loaded) when
+    predicting several startlists in one process. UCI ranking points (display columns,
+    not a model input, see ranking_index) are looked up as of race_date (default: the
+    date in the startlist file name, see split_startlist), which is also the prediction
+    log partition; venue/series select the affinity features.
+    Every run is appended to the prediction log unless log=False.
+    """
+    import explanations
+
+    race_date = startlist_race_date(startlist_path, race_date)
+
+    forests, preprocessor, metadata = artifacts or load_artifacts(model_version)
+    # This category's own models when the version has them, else the global ones
+    forests = {target: forests[name] for target, name in model_registry.category_models(metadata, category).items()}
+    snapshot = snapshot if snapshot is not None else rider_snapshot.load_snapshot()
+    rankings = rankings if rankings is not None else load_rankings()
+    affinity_lookup = affinity_lookup if affinity_lookup is not None else affinity.load_lookup()
+    startup_ms = elapsed_ms()
+
+    rider_names = read_startlist(startlist_path)
+    latest_rows = [rider_snapshot.find(snapshot, name, category) for name in rider_names]
+    looked_up = [
+        (rider_snapshot.features_from_latest(latest, category), "found") if latest is not None
+        else (rider_snapshot.new_rider_features(category), "new_rider")
+        for latest in latest_rows
+    ]
+    for name, (features, _) in zip(rider_names, looked_up):
+        features.update(affinity.features_for(affinity_lookup, name, venue, series))
+    field.add_field_features([features for features, _ in looked_up])
+
+    if rankings is not None:
+        rider_ids = [
+            ranking_index.rider_key(latest["RacerID"] if latest is not None else None, name)
+            for name, latest in zip(rider_names, latest_rows)
+        ]
+        uci_points, uci_rank = ranking_index.lookup_points(rankings, rider_ids, race_date)
+    else:
+        uci_points, uci_rank = [float("nan")] * len(rider_names), [-1] * len(rider_names)
+
+    X = preprocessor.transform([features for features, _ in looked_up])
+
+    # One traversal per forest gives both the probabilities and their per-feature breakdown
+    explained = explanations.explain(forests, X)
+    bias10, contrib10 = explained["top10_classifier"]
+    bias3, contrib3 = explained["top3_classifier"]
+    top10_probs = bias10 + contrib10.sum(axis=1)
+    top3_probs = bias3 + contrib3.sum(axis=1)
+    spread = uncertainty.rider_uncertainty(forests["top10_classifier"], X, confidence_threshold)
+
+    predictions = []
+    for i, (name, (features, status), top10_prob, top3_prob, points, rank, contributions) in enumerate(zip(
+        rider_names, looked_up, top10_probs, top3_probs, uci_points, uci_rank, contrib10
+    )):
+        dns_risk, dns_reason = rider_snapshot.dns_check(features, status) if enable_dns_filter else (False, "")
+        if dns_risk:
+            predicted_finish = "DNS Risk"
+        elif top10_prob > confidence_threshold:
+            predicted_finish = "Top-10"
+        else:
+            predicted_finish = "Outside Top-10"
+
+        predictions.append({
+            "Rider": name,
+            "Top-10 Probability": float(top10_prob),
+            "Top-3 Probability": float(top3_prob),
+            "Predicted Finish": predicted_finish,
+            **uncertainty.rows(spread, i),
+            "Status": status,
+            "DNS Risk": dns_risk,
+            "DNS Reason": dns_reason,
+            "Recent Form": features.get("avg_place_last3", "N/A"),
+            "Career Top-10 Rate": features.get("top10_rate_career", 0),
+            "UCI Ranking Points": None if points != points else float(points),
+            "UCI Rank": int(rank) if rank > 0 else None,
+            "Top-10 Drivers": explanations.top_drivers(contributions, preprocessor.feature_names),
+        })
+
+    predictions.sort(key=lambda p: p["Top-10 Probability"], reverse=True)
+
+    if output_path is None:
+        output_path = config.CLEAN_DIR / f"predictions_{time.strftime('%Y%m%d_%H%M')}.csv"
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(predictions)
+    explanations.save_contributions(
+        explanations.contributions_path(output_path), rider_names, preprocessor.feature_names, explained
+    )
+    drift_report = drift.update(metadata, X, preprocessor.feature_names, category, record=log)
+    if drift_report is not None:
+        drift.save_report(drift.drift_path(output_path), drift_report)
+
+    runtime_ms = elapsed_ms()
+    if log:
+        import prediction_log
+
+        log_path = prediction_log.append(
+            predictions, race_date, category, metadata["version"],
+            prediction_log.snapshot_hash(), runtime_ms, race_id=race_id, startlist=startlist_path,
+        )
+
+    if not verbose:
+        return predictions
+
+    n_top10 = sum(p["Predicted Finish"] == "Top-10" for p in predictions)
+    n_new = sum(p["Status"] == "new_rider" for p in predictions)
+    n_borderline = sum(p["Borderline"] for p in predictions)
+    print(f"{category}: {len(predictions)} riders, {n_top10} predicted Top-10 ({n_borderline} borderline), "
+          f"{n_new} new riders (model {metadata['version']})")
+    for p in predictions[:10]:
+        print(f"  {p['Rider']:30s}  Top-10: {p['Top-10 Probability']:5.1%} "
+              f"[{p['Top-10 Low']:4.0%}-{p['Top-10 High']:4.0%}]{' ≈' if p['Borderline'] else '  '} "
+              f"|  Podium: {p['Top-3 Probability']:5.1%}")
+    print(f"✓ Predictions saved to: {output_path}")
+    print(f"✓ Feature contributions saved to: {explanations.contributions_path(output_path)}")
+    if drift_report is not None:
+        print(f"{'⚠️ ' if any(r['drifted'] for r in drift_report) else '✓'} Drift: {drift.summary(drift_report)} "
+              f"-> {drift.drift_path(output_path)}")
+    if log:
+        print(f"✓ Logged to: {log_path}")
+    print(f"⏱  startup {startup_ms:.0f} ms, predictions {runtime_ms:.0f} ms, total {elapsed_ms():.0f} ms")
+
+    return predictions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fast race predictions from the rider snapshot")
+    parser.add_argument("--startlist", required=True, help="Path to startlist CSV")
+    parser.add_argument("--category", default="Men Elite", help="Race category")
+    parser.add_argument("--output", help="Output path for predictions")
+    parser.add_argument("--model-version", help="Model registry version (default: CURRENT)")
+    parser.add_argument("--race-date", help="Race date YYYY-MM-DD for UCI ranking points and the prediction log "
+                                            "(default: from the startlist file name)")
+    parser.add_argument("--venue", help="Race location, e.g. Koksijde-BEL")
+    parser.add_argument("--series", help="Series name, e.g. UCI-World-Cup")
+    parser.add_argument("--race-id", help="Race identifier to record in the prediction log")
+    parser.add_argument("--no-log", action="store_true", help="Do not append to the prediction log")
+    args = parser.parse_args()
+    if not (args.race_date or parse_startlist_filename(args.startlist)[1]):
+        parser.error("--race-date is required when the startlist file name has no YYYY-MM-DD date")
+
+    predict_fast(args.startlist, args.category, args.output, model_version=args.model_version,
+                 race_date=args.race_date, venue=args.venue, series=args.series,
+                 race_id=args.race_id, log=not args.no_log)
@@ -4,114 +4,58 @@ Usage: python predict_race.py --startlist data/startlists/tabor_men_elite_2025-1
 """
 import pandas as pd
 import numpy as np
-import joblib
-import json
 import argparse
+import time
 from pathlib import Path
 import config
+import affinity
+import drift
+import explanations
+import feature_spec
+import field
+import model_registry
+import prediction_log
+import ranking_index
+import results_db
+import rider_snapshot
+import teams
+import uncertainty
+from predict_fast import load_rankings
+from preprocessing import FeaturePreprocessor
+from split_startlist import parse_startlist_filename, startlist_race_date
 
 def load_historical_data():
-    """Load historical rider data for feature lookup"""
-    df = pd.read_csv(config.RESULTS_WITH_FEATURES, parse_dates=["race_date"])
-    return df
-
-def load_models():
-    """Load trained models"""
-    model_top10 = joblib.load(config.TOP10_MODEL)
-    model_top3 = joblib.load(config.TOP3_MODEL)
-
-    with open(config.MODEL_METADATA, 'r') as f:
-        metadata = json.load(f)
-
-    return model_top10, model_top3, metadata
-
-def normalize_name(name):
-    """Normalize rider name for matching"""
-    if pd.isna(name):
-        return None
-    name = str(name).strip().lower()
-    name = (
-        name.replace("é", "e").replace("è", "e").replace("ë", "e")
-            .replace("ó", "o").replace("ò", "o").replace("ö", "o")
-            .replace("á", "a").replace("à", "a").replace("ä", "a")
-            .replace("ü", "u").replace("ï", "i").replace("ř", "r")
-            .replace("ž", "z").replace("š", "s").replace("č", "c")
-    )
-    return name
+    """Open the indexed results database for rider lookups"""
+    return results_db.connect()
+
+def load_models(version=None, category=None):
+    """Load trained models (registry version, defaults to CURRENT; cached per process)
+
+    Versions trained with --per-category have their own models for some categories;
+    other categories use the global models.
+    """
+    return model_registry.load_category(version, category)
 
 def get_rider_features(rider_name, historical_data, category="Men Elite"):
-    """Get latest features for a rider from historical data"""
-
-    # Normalize name for matching
-    norm_name = normalize_name(rider_name)
-    historical_data["rider_name_norm"] = historical_data["rider_name"].apply(normalize_name)
-
-    # Try different name formats for matching
-    # "LASTNAME Firstname" -> "firstname lastname"
-    parts = norm_name.split()
-    if len(parts) >= 2:
-        # Try reversed: "firstname lastname"
-        reversed_name = f"{parts[-1]} {' '.join(parts[:-1])}"
-    else:
-        reversed_name = norm_name
-
-    # Find rider's most recent race (try both name orders)
-    rider_history = historical_data[
-        (
-            (historical_data["rider_name_norm"] == norm_name) |
-            (historical_data["rider_name_norm"] == reversed_name)
-        ) &
-        (historical_data["Category Name"].str.contains(category.split()[0], case=False, na=False))
-    ].sort_values("race_date", ascending=False)
-
-    if len(rider_history) > 0:
-        # Use most recent data
-        latest = rider_history.iloc[0]
-
-        features = {
-            "uci_points_normalized": latest["uci_points_normalized"],
-            "races_so_far": latest["races_so_far"] + 1,  # +1 for this race
-            "avg_place_last3": latest["avg_place_last3"],
-            "best_place_last5": latest["best_place_last5"],
-            "last_place": latest["Place"],
-            "days_since_last_race": 7,  # Assume weekly racing
-            "last_carried_points": latest["Carried Points"],
-            "last_scored_points": latest["Scored Points"],
-            "top3_rate_career": latest["top3_rate_career"],
-            "top10_rate_career": latest["top10_rate_career"],
-            "series_appearances": 0,  # Reset for new series
-            "is_elite": 1 if "Elite" in category else 0,
-            "is_women": 1 if "Women" in category else 0,
-            "points_tier": latest["points_tier"],
-            "team_tier": latest["team_tier"]
-        }
-
-        return features, "found"
-    else:
-        # New rider - use defaults
-        print(f"  ⚠️  {rider_name}: No history found, using defaults")
-
-        features = {
-            "uci_points_normalized": 0.1,  # Low but not zero
-            "races_so_far": 0,
-            "avg_place_last3": config.MEDIAN_PLACE_DEFAULT,
-            "best_place_last5": config.MEDIAN_PLACE_DEFAULT,
-            "last_place": config.MEDIAN_PLACE_DEFAULT,
-            "days_since_last_race": 14,
-            "last_carried_points": 0,
-            "last_scored_points": 0,
-            "top3_rate_career": 0,
-            "top10_rate_career": 0,
-            "series_appearances": 0,
-            "is_elite": 1 if "Elite" in category else 0,
-            "is_women": 1 if "Women" in category else 0,
-            "points_tier": "low",
-            "team_tier": "no_team"
-        }
-
-        return features, "new_rider"
-
-def predict_race(startlist_path, category="Men Elite", output_path=None, confidence_threshold=0.55, enable_dns_filter=True):
+    """Get next-race features for a rider from the results database"""
+
+    # Rider's results in this gender, newest first (both name orders are tried)
+    history = results_db.rider_history(historical_data, rider_name, rider_snapshot.category_flags(category)["is_women"])
+
+    if history:
+        # Same history features as training, as of the rider's next race
+        next_race = feature_spec.as_of(pd.DataFrame(history), riders=np.zeros(len(history)))
+        latest = dict(history[0], **next_race.iloc[0])
+        if latest["team_id"]:
+            # The team's current strength, as in the snapshot (the row holds the strength before that race)
+            latest["team_strength"] = teams.smoothed_strength(*results_db.team_record(historical_data, latest["team_id"]))
+        return rider_snapshot.features_from_latest(latest, category), "found"
+
+    # New rider - use defaults
+    print(f"  ⚠️  {rider_name}: No history found, using defaults")
+    return rider_snapshot.new_rider_features(category), "new_rider"
+
+def predict_race(startlist_path, category="Men Elite", output_path=None, confidence_threshold=0.55, enable_dns_filter=True, model_version=None, venue=None, series=None, race_date=None, race_id=None, log=True):
     """Generate predictions for a race
 
     Args:
@@ -120,7 +64,15 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
         output_path: Where to save predictions
         confidence_threshold: Minimum probability to predict Top-10 (default: 0.55, reduced false positives)
         enable_dns_filter: Filter riders unlikely to start (default: True)
+        model_version: Registry version to use (default: CURRENT)
+        venue: Race location, e.g. "Koksijde-BEL" (venue affinity features)
+        series: Series name, e.g. "UCI-World-Cup" (series affinity features)
+        race_date: Race date YYYY-MM-DD for the prediction log (default: from the startlist file name)
+        race_id: Race identifier recorded in the prediction log
+        log: Append this run to the prediction log (default: True)
     """
+    start_time = time.perf_counter()
+    race_date = startlist_race_date(startlist_path, race_date)
 
     print("=" * 70)
     print("VELOPREDICT: RACE PREDICTIONS (v2 - Improved Precision)")
@@ -128,11 +80,15 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
 
     # Load models and data
     print("\nLoading models and historical data...")
-    model_top10, model_top3, metadata = load_models()
+    model_top10, model_top3, metadata = load_models(model_version, category)
+    preprocessor = FeaturePreprocessor.from_metadata(metadata)
     historical_data = load_historical_data()
+    affinity_lookup = affinity.load_lookup()
+    rankings = load_rankings()
 
+    print(f"✓ Model version: {metadata['version']} ({model_registry.category_models(metadata, category)['top10_classifier']})")
     print(f"✓ Model loaded (90.0% Top-10 accuracy on Tabor)")
-    print(f"✓ Historical data: {len(historical_data)} observations")
+    print(f"✓ Historical data: {results_db.count(historical_data)} observations")
     print(f"✓ Confidence threshold: {confidence_threshold:.0%} (improved precision)")
     print(f"✓ DNS filter: {'Enabled' if enable_dns_filter else 'Disabled'}")
 
@@ -147,46 +103,40 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
     print(f"\nGenerating predictions for {category}...")
     print("-" * 70)
 
+    # Look up features for every rider, then score the whole startlist in one batch
+    riders = []
     for idx, row in startlist.iterrows():
         rider_name = row.get("rider_name", row.get("Naam", row.get("Name")))
-
-        # Get features
         features, status = get_rider_features(rider_name, historical_data, category)
-
-        # Prepare feature vector
-        X = pd.DataFrame([features])
-        X = pd.get_dummies(X, columns=["points_tier", "team_tier"], drop_first=True)
-
-        # Align with training features
-        for feat in metadata['features']:
-            if feat not in X.columns:
-                X[feat] = 0
-        X = X[metadata['features']]
-
-        # Fill any remaining NaN
-        X = X.fillna(config.FILL_VALUES)
-
-        # Predict
-        top10_prob = model_top10.predict_proba(X)[0][1]
-        top3_prob = model_top3.predict_proba(X)[0][1]
-
+        features.update(affinity.features_for(affinity_lookup, rider_name, venue, series))
+        riders.append((rider_name, features, status))
+    field.add_field_features([features for _, features, _ in riders])  # the startlist is the field
+
+    # UCI ranking as of race day, shown next to the predictions (not a model input, see ranking_index)
+    if rankings is not None:
+        is_women = rider_snapshot.category_flags(category)["is_women"]
+        latest = [results_db.latest_state(historical_data, rider_name, is_women) for rider_name, _, _ in riders]
+        rider_ids = [
+            ranking_index.rider_key(state["RacerID"] if state else None, rider_name)
+            for (rider_name, _, _), state in zip(riders, latest)
+        ]
+        uci_points, uci_rank = ranking_index.lookup_points(rankings, rider_ids, race_date)
+    else:
+        uci_points, uci_rank = [np.nan] * len(riders), [-1] * len(riders)
+
+    X = preprocessor.transform([features for _, features, _ in riders])
+    top10_probs = model_top10.predict_proba(X)[:, 1]
+    top3_probs = model_top3.predict_proba(X)[:, 1]
+    forests = explanations.load_forests(model_top10, model_top3, metadata, category)
+    explained = explanations.explain(forests, X)
+    _, top10_contributions = explained["top10_classifier"]
+    spread = uncertainty.rider_uncertainty(forests["top10_classifier"], X, confidence_threshold)
+
+    for i, ((rider_name, features, status), top10_prob, top3_prob, points, rank, contributions) in enumerate(zip(
+        riders, top10_probs, top3_probs, uci_points, uci_rank, top10_contributions
+    )):
         # DNS Filter: Check if rider is unlikely to start
-        dns_risk = False
-        dns_reason = ""
-
-        if enable_dns_filter:
-            days_since = features.get("days_since_last_race", 7)
-            races_count = features.get("races_so_far", 0)
-
-            # Flag if hasn't raced in 21+ days (likely taking break or injured)
-            if days_since > 21:
-                dns_risk = True
-                dns_reason = f"⚠️ DNS Risk: {days_since} days since last race"
-
-            # Flag if very few races this season (< 2)
-            elif races_count < 2 and status == "found":
-                dns_risk = True
-                dns_reason = "⚠️ DNS Risk: Only 1 race this season"
+        dns_risk, dns_reason = rider_snapshot.dns_check(features, status) if enable_dns_filter else (False, "")
 
         # Apply confidence threshold (Quick Win #1)
         predicted_finish = "Top-10" if (top10_prob > confidence_threshold and not dns_risk) else "Outside Top-10"
@@ -200,11 +150,15 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
             "Top-10 Probability": top10_prob,
             "Top-3 Probability": top3_prob,
             "Predicted Finish": predicted_finish,
+            **uncertainty.rows(spread, i),
             "Status": status,
             "DNS Risk": dns_risk,
             "DNS Reason": dns_reason,
             "Recent Form": features.get("avg_place_last3", "N/A"),
-            "Career Top-10 Rate": features.get("top10_rate_career", 0)
+            "Career Top-10 Rate": features.get("top10_rate_career", 0),
+            "UCI Ranking Points": None if points != points else float(points),
+            "UCI Rank": int(rank) if rank > 0 else None,
+            "Top-10 Drivers": explanations.top_drivers(contributions, preprocessor.feature_names)
         })
 
         # Print status
@@ -213,8 +167,9 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
         else:
             confidence = "🔥 HIGH" if top10_prob > 0.7 else "⚠️  MED" if top10_prob > 0.4 else "   LOW"
 
-        dns_marker = " [DNS RISK]" if dns_risk else ""
-        print(f"  {confidence}  {rider_name:30s}  Top-10: {top10_prob:5.1%}  |  Podium: {top3_prob:5.1%}{dns_marker}")
+        dns_marker = " [DNS RISK]" if dns_risk else " [BORDERLINE]" if spread["Borderline"][i] else ""
+        print(f"  {confidence}  {rider_name:30s}  Top-10: {top10_prob:5.1%} "
+              f"[{spread['Top-10 Low'][i]:4.0%}-{spread['Top-10 High'][i]:4.0%}]  |  Podium: {top3_prob:5.1%}{dns_marker}")
 
     # Sort by Top-10 probability
     df_predictions = pd.DataFrame(predictions).sort_values("Top-10 Probability", ascending=False)
@@ -232,7 +187,8 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
 
     for idx, row in top10_predictions.iterrows():
         podium_icon = "🥇" if row["Top-3 Probability"] > 0.5 else "  "
-        print(f"{podium_icon} {row['Rider']:30s}  {row['Top-10 Probability']:5.1%} chance")
+        borderline = "  (borderline)" if row["Borderline"] else ""
+        print(f"{podium_icon} {row['Rider']:30s}  {row['Top-10 Probability']:5.1%} chance{borderline}")
 
     print(f"\nTotal predicted Top-10: {len(top10_predictions)} riders")
     print(f"(Using {confidence_threshold:.0%} confidence threshold)")
@@ -265,6 +221,26 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
     df_predictions.to_csv(output_path, index=False)
     print(f"\n✓ Predictions saved to: {output_path}")
 
+    contributions_path = explanations.save_contributions(
+        explanations.contributions_path(output_path), [name for name, _, _ in riders],
+        preprocessor.feature_names, explained
+    )
+    print(f"✓ Feature contributions saved to: {contributions_path}")
+
+    drift_report = drift.update(metadata, X, preprocessor.feature_names, category, record=log)
+    if drift_report is not None:
+        drift_path = drift.save_report(drift.drift_path(output_path), drift_report)
+        print(f"{'⚠️ ' if any(r['drifted'] for r in drift_report) else '✓'} Drift: {drift.summary(drift_report)}")
+        print(f"✓ Drift report saved to: {drift_path}")
+
+    if log:
+        log_path = prediction_log.append(
+            df_predictions.to_dict("records"), race_date, category,
+            metadata["version"], prediction_log.snapshot_hash(),
+            (time.perf_counter() - start_time) * 1000, race_id=race_id, startlist=startlist_path
+        )
+        print(f"✓ Logged to: {log_path}")
+
     # Summary stats
     print("\n" + "=" * 70)
     print("SUMMARY")
@@ -272,6 +248,8 @@ def predict_race(startlist_path, category="Men Elite", output_path=None, confide
     print(f"Riders analyzed: {len(df_predictions)}")
     print(f"Predicted Top-10: {len(top10_predictions)} (threshold: {confidence_threshold:.0%})")
     print(f"High confidence (>70%): {len(df_predictions[df_predictions['Top-10 Probability'] > 0.7])}")
+    print(f"Borderline Top-10 calls ({config.UNCERTAINTY_LEVEL:.0%} interval spans the threshold): "
+          f"{int(df_predictions['Borderline'].sum())}")
     print(f"DNS risks flagged: {len(dns_risks)}")
     print(f"Riders with history: {len(df_predictions[df_predictions['Status'] == 'found'])}")
     print(f"New riders: {len(df_predictions[df_predictions['Status'] == 'new_rider'])}")
@@ -289,7 +267,18 @@ if __name__ == "__main__":
     parser.add_argument("--startlist", required=True, help="Path to startlist CSV")
     parser.add_argument("--category", default="Men Elite", help="Race category")
     parser.add_argument("--output", help="Output path for predictions")
+    parser.add_argument("--model-version", help="Model registry version (default: CURRENT)")
+    parser.add_argument("--venue", help="Race location, e.g. Koksijde-BEL")
+    parser.add_argument("--series", help="Series name, e.g. UCI-World-Cup")
+    parser.add_argument("--race-date", help="Race date YYYY-MM-DD (prediction log partition; "
+                                            "default: from the startlist file name)")
+    parser.add_argument("--race-id", help="Race identifier to record in the prediction log")
+    parser.add_argument("--no-log", action="store_true", help="Do not append to the prediction log")
 
     args = parser.parse_args()
+    if not (args.race_date or parse_startlist_filename(args.startlist)[1]):
+        parser.error("--race-date is required when the startlist file name has no YYYY-MM-DD date")
 
-    predictions = predict_race(args.startlist, args.category, args.output)
+    predictions = predict_race(args.startlist, args.category, args.output, model_version=args.model_version,
+                               venue=args.venue, series=args.series, race_date=args.race_date,
+                               race_id=args.race_id, log=not args.no_log)
@@ -0,0 +1,185 @@
+"""
+Append-only prediction log
+Every prediction run appends one Parquet file per (race date, category) partition:
+
+    data/clean/prediction_log/race_date=2025-11-23/category=Men%20Elite/<run_id>.parquet
+
+Rows carry the model version, the snapshot_hash and the run time, so any past prediction
+can be traced and re-validated. snapshot_hash is always the SHA-256 of the rider snapshot
+(config.RIDER_SNAPSHOT, see snapshot_hash()), whichever CLI made the predictions: it is
+written by the same add_features run as the results database predict_race reads, so
+predictions from the same feature state share one hash. Files
+are never rewritten. query() prunes partitions by path and pushes rider / race filters
+down to the Parquet row groups, so it does not read the whole log.
+
+Usage: python prediction_log.py [--race-date 2025-11-23] [--category "Men Elite"] [--rider "Van Aert"]
+"""
+import time
+import uuid
+from urllib.parse import quote
+
+import config
+
+# Prediction output column -> log column (missing outputs are logged as null)
+PREDICTION_COLUMNS = {
+    "Rider": "rider_name",
+    "Top-10 Probability": "top10_probability",
+    "Top-3 Probability": "top3_probability",
+    "Predicted Finish": "predicted_finish",
+    "Status": "status",
+    "DNS Risk": "dns_risk",
+    "DNS Reason": "dns_reason",
+    "Recent Form": "recent_form",
+    "Career Top-10 Rate": "career_top10_rate",
+    "UCI Ranking Points": "uci_ranking_points",
+    "UCI Rank": "uci_rank",
+    "Top-10 Drivers": "top10_drivers",
+}
+
+PARTITION_COLUMNS = ["race_date", "category"]
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("run_id", pa.string()),
+        ("logged_at", pa.timestamp("s")),
+        ("race_id", pa.string()),
+        ("startlist", pa.string()),
+        ("rider_name", pa.string()),
+        ("rider_name_norm", pa.string()),
+        ("top10_probability", pa.float64()),
+        ("top3_probability", pa.float64()),
+        ("predicted_finish", pa.string()),
+        ("status", pa.string()),
+        ("dns_risk", pa.bool_()),
+        ("dns_reason", pa.string()),
+        ("recent_form", pa.float64()),
+        ("career_top10_rate", pa.float64()),
+        ("uci_ranking_points", pa.float64()),
+        ("uci_rank", pa.int64()),
+        ("top10_drivers", pa.string()),
+        ("model_version", pa.string()),
+        ("snapshot_hash", pa.string()),
+        ("runtime_ms", pa.float64()),
+    ])
+
+
+def snapshot_hash(path=None):
+    """The snapshot_hash logged with every run: SHA-256 of the rider snapshot CSV"""
+    from hashing import file_sha256
+
+    return file_sha256(path or config.RIDER_SNAPSHOT)
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def append(predictions, race_date, category, model_version, snapshot_hash, runtime_ms,
+           race_id=None, startlist=None, log_dir=None):
+    """Append one run's predictions (list of prediction dicts); returns the written file"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from names import normalize_name
+
+    log_dir = log_dir or config.PREDICTION_LOG_DIR
+    run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    logged_at = int(time.time())
+
+    rows = []
+    for prediction in predictions:
+        row = {log_col: prediction.get(col) for col, log_col in PREDICTION_COLUMNS.items()}
+        for col in ["top10_probability", "top3_probability", "recent_form", "career_top10_rate", "uci_ranking_points"]:
+            row[col] = _number(row[col])
+        row["uci_rank"] = int(row["uci_rank"]) if _number(row["uci_rank"]) is not None else None
+        row["dns_risk"] = bool(row["dns_risk"])
+        row["dns_reason"] = row["dns_reason"] or None
+        row.update(
+            run_id=run_id,
+            logged_at=logged_at,
+            race_id=race_id,
+            startlist=str(startlist) if startlist else None,
+            rider_name_norm=normalize_name(row["rider_name"]),
+            model_version=model_version,
+            snapshot_hash=snapshot_hash,
+            runtime_ms=float(runtime_ms),
+        )
+        rows.append(row)
+
+    partition = log_dir / f"race_date={quote(str(race_date))}" / f"category={quote(str(category))}"
+    partition.mkdir(parents=True, exist_ok=True)
+    path = partition / f"{run_id}.parquet"
+    pq.write_table(pa.Table.from_pylist(rows, schema=_schema()), path)
+    return path
+
+
+def query(race_date=None, category=None, rider=None, race_id=None, model_version=None,
+          columns=None, log_dir=None):
+    """Logged predictions as a DataFrame
+
+    race_date: one date or a (start, end) pair (inclusive, YYYY-MM-DD);
+    rider: matched on the normalized name in either order ("VAN AERT Wout" == "wout van aert").
+    """
+    import pyarrow.dataset as ds
+    from names import normalize_name, name_variants
+
+    log_dir = log_dir or config.PREDICTION_LOG_DIR
+    if not log_dir.exists():
+        import pandas as pd
+        return pd.DataFrame(columns=list(_schema().names) + PARTITION_COLUMNS)
+
+    dataset = ds.dataset(log_dir, format="parquet", partitioning="hive", schema=_log_schema())
+
+    filters = []
+    if isinstance(race_date, (tuple, list)):
+        start, end = race_date
+        if start:
+            filters.append(ds.field("race_date") >= str(start))
+        if end:
+            filters.append(ds.field("race_date") <= str(end))
+    elif race_date:
+        filters.append(ds.field("race_date") == str(race_date))
+    if category:
+        filters.append(ds.field("category") == category)
+    if rider:
+        filters.append(ds.field("rider_name_norm").isin(name_variants(normalize_name(rider))))
+    if race_id:
+        filters.append(ds.field("race_id") == race_id)
+    if model_version:
+        filters.append(ds.field("model_version") == model_version)
+
+    expression = None
+    for f in filters:
+        expression = f if expression is None else expression & f
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def _log_schema():
+    import pyarrow as pa
+
+    # Partition values are read back as strings (dates stay sortable as YYYY-MM-DD)
+    return pa.schema(list(_schema()) + [(col, pa.string()) for col in PARTITION_COLUMNS])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the prediction log")
+    parser.add_argument("--race-date", help="Race date YYYY-MM-DD")
+    parser.add_argument("--category", help="Race category")
+    parser.add_argument("--rider", help="Rider name (either order)")
+    parser.add_argument("--model-version", help="Model registry version")
+    args = parser.parse_args()
+
+    logged = query(args.race_date, args.category, args.rider, model_version=args.model_version)
+    print(f"✓ {len(logged)} logged predictions")
+    if len(logged):
+        cols = ["race_date", "category", "rider_name", "top10_probability", "predicted_finish", "model_version", "run_id"]
+        print(logged[cols].sort_values(["race_date", "category", "top10_probability"], ascending=[True, True, False])
+              .to_string(index=False))
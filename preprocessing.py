@@ -0,0 +1,192 @@
+"""
+Shared feature preprocessing for training and prediction
+Categoricals are one-hot encoded against fixed vocabularies and NaNs are filled from
+config.FILL_VALUES, so the encoded columns never depend on which tiers happen to
+appear in a batch (no train/serve skew). Encoded training matrices are cached on disk
+as dense float32 arrays keyed by the features file hash.
+"""
+import json
+
+import numpy as np
+
+import config
+from hashing import file_sha256, params_sha256
+
+
+class FeaturePreprocessor:
+    """Turns rider feature rows into the model's float32 feature matrix"""
+
+    def __init__(self, numeric_features=None, categorical_levels=None, fill_values=None, output_columns=None):
+        self.numeric_features = list(numeric_features or config.NUMERIC_FEATURES)
+        self.categorical_levels = {
+            col: list(levels)
+            for col, levels in (categorical_levels or config.CATEGORICAL_LEVELS).items()
+        }
+        self.fill_values = dict(config.FILL_VALUES if fill_values is None else fill_values)
+        # Optional fixed column order (e.g. models trained before the preprocessor existed)
+        self.output_columns = list(output_columns) if output_columns else None
+
+    @property
+    def encoded_columns(self):
+        # First level is the reference category (same as get_dummies(drop_first=True))
+        columns = list(self.numeric_features)
+        for col, levels in self.categorical_levels.items():
+            columns += [f"{col}_{level}" for level in levels[1:]]
+        return columns
+
+    @property
+    def feature_names(self):
+        return self.output_columns or self.encoded_columns
+
+    def transform(self, data):
+        """Encode a DataFrame or a list of feature dicts into an (n_rows, n_features) float32 array"""
+        n_rows = len(data)
+        blocks = []
+
+        for col in self.numeric_features:
+            values = np.asarray(_column(data, col, n_rows), dtype=np.float64)
+            values = np.where(np.isnan(values), self.fill_values.get(col, 0), values)
+            blocks.append(values)
+
+        for col, levels in self.categorical_levels.items():
+            values = np.asarray(_column(data, col, n_rows), dtype=object)
+            for level in levels[1:]:
+                blocks.append((values == level).astype(np.float64))
+
+        X = np.column_stack(blocks).astype(np.float32) if blocks else np.empty((n_rows, 0), np.float32)
+
+        if self.output_columns:
+            index = {name: i for i, name in enumerate(self.encoded_columns)}
+            aligned = np.zeros((n_rows, len(self.output_columns)), dtype=np.float32)
+            for j, name in enumerate(self.output_columns):
+                if name in index:
+                    aligned[:, j] = X[:, index[name]]
+            X = aligned
+
+        return X
+
+    def to_dict(self):
+        return {
+            "numeric_features": self.numeric_features,
+            "categorical_levels": self.categorical_levels,
+            "fill_values": self.fill_values,
+            "output_columns": self.output_columns,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            numeric_features=d["numeric_features"],
+            categorical_levels=d["categorical_levels"],
+            fill_values=d["fill_values"],
+            output_columns=d.get("output_columns"),
+        )
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """Preprocessor stored with a model version (legacy models: rebuilt from their feature list)"""
+        if "preprocessor" in metadata:
+            return cls.from_dict(metadata["preprocessor"])
+        return cls(
+            numeric_features=metadata.get("numeric_features"),
+            fill_values=metadata.get("fill_values"),
+            output_columns=metadata["features"],
+        )
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _column(data, col, n_rows):
+    """Column values from a DataFrame or list of dicts (missing column -> all NaN)"""
+    if hasattr(data, "columns"):
+        if col not in data.columns:
+            return [np.nan] * n_rows
+        return data[col].to_numpy()
+    return [row.get(col, np.nan) for row in data]
+
+
+# Bumped when the cached arrays change (2: per-row race category)
+CACHE_FORMAT = 2
+
+
+def _cache_key(data_hash, preprocessor):
+    return params_sha256({"data": data_hash, "preprocessor": preprocessor.to_dict(), "format": CACHE_FORMAT})[:16]
+
+
+def load_feature_matrix(results_path=None, preprocessor=None, data_hash=None):
+    """Encoded training matrix for a features file, built once and cached by file hash
+
+    Returns a dict with X (float32), the target arrays, race dates, canonical race
+    categories ("" when unmapped) and the column schema.
+    X is memory-mapped read-only when served from the cache.
+    """
+    results_path = results_path or config.RESULTS_WITH_FEATURES
+    preprocessor = preprocessor or FeaturePreprocessor()
+    data_hash = data_hash or file_sha256(results_path)
+
+    cache_dir = config.FEATURE_CACHE_DIR / _cache_key(data_hash, preprocessor)
+    schema_path = cache_dir / "schema.json"
+
+    if schema_path.exists():
+        print(f"✓ Feature matrix cache hit: {cache_dir}")
+    else:
+        print(f"Building feature matrix cache: {cache_dir}")
+        _build_feature_matrix(results_path, preprocessor, data_hash, cache_dir)
+
+    with open(schema_path, "r") as f:
+        schema = json.load(f)
+    targets = np.load(cache_dir / "targets.npz")
+
+    return {
+        "X": np.load(cache_dir / "X.npy", mmap_mode="r"),
+        "columns": schema["columns"],
+        "is_top10": targets["is_top10"],
+        "is_top3": targets["is_top3"],
+        "race_date": targets["race_date"],
+        "category": targets["category"],
+        "schema": schema,
+        "path": cache_dir,
+    }
+
+
+def _build_feature_matrix(results_path, preprocessor, data_hash, cache_dir):
+    import pandas as pd
+    from category_models import category_labels
+
+    df = pd.read_csv(results_path, parse_dates=["race_date"])
+
+    # Training rows: valid finishing places only
+    df = df[df["Place"].notna() & (df["Place"] > 0)].reset_index(drop=True)
+
+    X = preprocessor.transform(df)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    np.save(cache_dir / "X.npy", X)
+    np.savez(
+        cache_dir / "targets.npz",
+        is_top10=(df["Place"] <= 10).to_numpy(np.int8),
+        is_top3=(df["Place"] <= 3).to_numpy(np.int8),
+        race_date=df["race_date"].to_numpy("datetime64[D]"),
+        category=category_labels(df["Category Name"].fillna("").to_numpy()),
+    )
+
+    schema = {
+        "columns": preprocessor.feature_names,
+        "dtype": "float32",
+        "n_rows": int(X.shape[0]),
+        "data_path": str(results_path),
+        "data_hash": data_hash,
+        "preprocessor": preprocessor.to_dict(),
+        "n_races": int(df["race_id"].nunique()),
+        "n_riders": int(df["rider_name"].nunique()),
+    }
+    # Schema written last: its presence marks a complete cache entry
+    with open(cache_dir / "schema.json", "w") as f:
+        json.dump(schema, f, indent=2)
@@ -0,0 +1,253 @@
+"""
+Forest size vs accuracy report, and pruned model versions
+Scores the global Top-10 / Top-3 forests of a version with fewer trees (the first n)
+and with depth caps (nodes at the cap become leaves, predicting their node's class
+fraction), and measures prediction latency and model size at each point. The size is
+chosen out of sample: a copy of each forest (same parameters) is refitted without the
+latest PRUNE_VALIDATION_FRACTION of the training window, and the grid is scored on those
+held-out rows. The smallest point with at least PRUNE_MIN_TREES trees within --tolerance
+of the full refit is then applied to the version's own forest. The chronological test
+window only reports the chosen forest's accuracy, so the choice is not tuned to the
+numbers it is reported with. --emit saves the chosen forests as a new registry version
+and makes it CURRENT.
+
+Usage: python prune_forest.py [--version VERSION] [--tolerance 0.005] [--emit]
+"""
+import argparse
+import copy
+import pickle
+import time
+
+import numpy as np
+
+import config
+import model_registry
+from category_models import TARGETS, evaluate
+from compact_forest import COMPACT_FILENAME, export_forest, predict_proba, save_compact
+from preprocessing import FeaturePreprocessor, load_feature_matrix
+from update_model import chronological_split
+
+TREE_FRACTIONS = [1, 2 / 3, 1 / 2, 1 / 3, 1 / 6, 1 / 12]
+DEPTH_CAPS = [None, 12, 10, 8, 6]
+
+
+def node_depths(left, right):
+    """Depth of every node of one tree (root = 0)"""
+    depth = np.zeros(len(left), dtype=np.int64)
+    frontier = np.array([0])
+    level = 0
+    while len(frontier):
+        depth[frontier] = level
+        children = np.concatenate([left[frontier], right[frontier]])
+        frontier = children[children != -1]
+        level += 1
+    return depth
+
+
+def cap_tree_depth(tree, max_depth):
+    """Copy of a fitted sklearn Tree without the nodes below max_depth"""
+    from sklearn.tree._tree import TREE_LEAF, TREE_UNDEFINED, Tree
+
+    state = tree.__getstate__()
+    nodes, values = state["nodes"], state["values"]
+    depth = node_depths(nodes["left_child"], nodes["right_child"])
+    keep = depth <= max_depth
+    new_index = np.cumsum(keep) - 1  # nodes are stored parents-first, so kept order is still valid
+
+    pruned = nodes[keep].copy()
+    leaf = (pruned["left_child"] == TREE_LEAF) | (depth[keep] == max_depth)
+    pruned["left_child"] = np.where(leaf, TREE_LEAF, new_index[pruned["left_child"]])
+    pruned["right_child"] = np.where(leaf, TREE_LEAF, new_index[pruned["right_child"]])
+    pruned["feature"][leaf] = TREE_UNDEFINED
+    pruned["threshold"][leaf] = TREE_UNDEFINED
+
+    capped = Tree(tree.n_features, tree.n_classes, tree.n_outputs)
+    capped.__setstate__({
+        "max_depth": int(depth[keep].max()),
+        "node_count": int(keep.sum()),
+        "nodes": pruned,
+        "values": values[keep],
+    })
+    return capped
+
+
+def prune_model(model, n_trees=None, max_depth=None):
+    """Copy of a fitted forest keeping its first n_trees trees, each capped at max_depth"""
+    pruned = copy.copy(model)
+    estimators = model.estimators_[:n_trees]
+    if max_depth is not None:
+        capped = []
+        for estimator in estimators:
+            estimator = copy.copy(estimator)
+            estimator.tree_ = cap_tree_depth(estimator.tree_, max_depth)
+            estimator.max_depth = max_depth
+            capped.append(estimator)
+        estimators = capped
+        pruned.max_depth = max_depth
+    pruned.estimators_ = estimators
+    pruned.n_estimators = len(estimators)
+    return pruned
+
+
+def size_report(model):
+    """Bytes of the pickled model (joblib load) and of its compact node arrays (lean CLI load)"""
+    compact = export_forest(model)
+    return {
+        "pickle_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        "compact_bytes": int(sum(np.asarray(values).nbytes for values in compact.values())),
+        "nodes": int(len(compact["left"])),
+    }, compact
+
+
+def compact_latency_ms(compact, X, batch_size=50, repeats=5):
+    """Median compact-forest prediction time for a startlist-sized batch"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_proba(compact, X[:batch_size])
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(sorted(timings)[len(timings) // 2])
+
+
+def validation_split(race_dates, train_indices):
+    """(fit rows, validation rows): the latest PRUNE_VALIDATION_FRACTION of the training rows by race date is held out"""
+    order = train_indices[np.argsort(np.asarray(race_dates)[train_indices], kind="stable")]
+    split_idx = int(len(order) * (1 - config.PRUNE_VALIDATION_FRACTION))
+    return np.sort(order[:split_idx]), np.sort(order[split_idx:])
+
+
+def refit_forest(model, X_fit, y_fit):
+    """A forest with the same parameters as model, fitted on (X_fit, y_fit) only"""
+    from sklearn.base import clone
+
+    return clone(model).set_params(warm_start=False).fit(X_fit, y_fit)
+
+
+def size_grid(model, X_test, y_test):
+    """Metrics, latency and size for every tree count x depth cap"""
+    n_total = len(model.estimators_)
+    tree_counts = sorted({max(1, round(n_total * fraction)) for fraction in TREE_FRACTIONS}, reverse=True)
+    grid = []
+    for max_depth in DEPTH_CAPS:
+        capped = prune_model(model, max_depth=max_depth)  # cap once, then take tree prefixes
+        for n_trees in tree_counts:
+            pruned = prune_model(capped, n_trees=n_trees)
+            sizes, compact = size_report(pruned)
+            grid.append({
+                "n_trees": n_trees,
+                "max_depth": max_depth,
+                **evaluate(pruned, X_test, y_test),
+                **sizes,
+                "sklearn_batch_ms": model_registry.benchmark_latency(pruned, X_test)["batch_ms"],
+                "compact_batch_ms": compact_latency_ms(compact, X_test),
+            })
+    return grid
+
+
+def choose(grid, tolerance, min_trees=None):
+    """Smallest point with at least min_trees trees whose AUC and accuracy are within tolerance of the full forest"""
+    full = grid[0]
+    min_trees = min(min_trees or config.PRUNE_MIN_TREES, full["n_trees"])
+    within = [
+        point for point in grid
+        if point["n_trees"] >= min_trees
+        and point["auc"] >= full["auc"] - tolerance and point["accuracy"] >= full["accuracy"] - tolerance
+    ]
+    return min(within, key=lambda point: (point["compact_bytes"], point["compact_batch_ms"]))
+
+
+def format_point(point):
+    depth = "full" if point["max_depth"] is None else point["max_depth"]
+    return (f"{point['n_trees']:4d} trees  depth {depth!s:>4}  acc {100*point['accuracy']:5.1f}%  "
+            f"AUC {point['auc']:.3f}  {point['compact_bytes']/1e6:6.2f} MB compact  "
+            f"{point['pickle_bytes']/1e6:6.2f} MB joblib  {point['compact_batch_ms']:6.1f} ms compact  "
+            f"{point['sklearn_batch_ms']:6.1f} ms sklearn")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forest size vs accuracy report, optionally saving pruned models")
+    parser.add_argument("--version", help="Model registry version (default: CURRENT)")
+    parser.add_argument("--tolerance", type=float, default=config.PRUNE_TOLERANCE,
+                        help="Largest AUC / accuracy loss allowed vs the full forest")
+    parser.add_argument("--emit", action="store_true", help="Save the chosen forests as a new CURRENT version")
+    args = parser.parse_args()
+
+    import joblib
+
+    print("=" * 60)
+    print("FOREST SIZE REPORT")
+    print("=" * 60)
+
+    parent_version = model_registry.resolve_version(args.version)
+    parent = model_registry.load_metadata(parent_version)
+    preprocessor = FeaturePreprocessor.from_metadata(parent)
+    matrix = load_feature_matrix(parent["data_path"], preprocessor, data_hash=parent["data_hash"])
+    train_indices, test_indices = chronological_split(matrix["race_date"])
+    fit_indices, validation_indices = validation_split(matrix["race_date"], train_indices)
+    X_validation, X_test = matrix["X"][validation_indices], matrix["X"][test_indices]
+    print(f"\nVersion {parent_version}, refit on {len(fit_indices)} rows, validation slice (held out, end of "
+          f"the training window): {len(validation_indices)} rows, test window: {len(test_indices)} rows")
+
+    models, choices = {}, {}
+    for name in model_registry.GLOBAL_MODELS:
+        model = joblib.load(model_registry.version_dir(parent_version) / f"{name}.joblib")
+        y = matrix[TARGETS[name]]
+        refit = refit_forest(model, matrix["X"][fit_indices], y[fit_indices])
+        grid = size_grid(refit, X_validation, y[validation_indices])
+        choice = choose(grid, args.tolerance)
+
+        print(f"\n{name} (refit without the validation slice, scored on it):")
+        for point in grid:
+            marker = "→" if point is choice else " "
+            print(f"  {marker} {format_point(point)}")
+        print(f"  ✓ Within {args.tolerance:.3f} of the full forest, at least {config.PRUNE_MIN_TREES} trees: "
+              f"{choice['n_trees']} trees, depth {'full' if choice['max_depth'] is None else choice['max_depth']} "
+              f"({100 * choice['compact_bytes'] / grid[0]['compact_bytes']:.0f}% of the size)")
+
+        # The chosen size applied to the version's own forest; test window scores reported for it only
+        models[name] = prune_model(model, choice["n_trees"], choice["max_depth"])
+        y_test = y[test_indices]
+        full_test, chosen_test = evaluate(model, X_test, y_test), evaluate(models[name], X_test, y_test)
+        print(f"  ✓ Test window: acc {100 * chosen_test['accuracy']:.1f}%  AUC {chosen_test['auc']:.3f}  "
+              f"(full forest: acc {100 * full_test['accuracy']:.1f}%  AUC {full_test['auc']:.3f})")
+
+        choices[name] = {
+            **{key: choice[key] for key in ["n_trees", "max_depth", "compact_bytes", "pickle_bytes"]},
+            "validation_accuracy": choice["accuracy"],
+            "validation_auc": choice["auc"],
+            "accuracy": chosen_test["accuracy"],
+            "auc": chosen_test["auc"],
+        }
+
+    if not args.emit:
+        print("\nRun with --emit to save the pruned forests as a new version")
+        raise SystemExit(0)
+
+    # Per-category models are kept as they are
+    for name in parent.get("models", []):
+        if name not in models:
+            models[name] = joblib.load(model_registry.version_dir(parent_version) / f"{name}.joblib")
+
+    prune_params = {name: {"n_trees": c["n_trees"], "max_depth": c["max_depth"]} for name, c in choices.items()}
+    version, _ = model_registry.compute_version(parent["data_path"], {"parent": parent_version, "prune": prune_params})
+    meta = dict(
+        parent,
+        params=dict(parent["params"], prune=prune_params),
+        top10_accuracy=choices["top10_classifier"]["accuracy"],
+        top10_auc=choices["top10_classifier"]["auc"],
+        top3_accuracy=choices["top3_classifier"]["accuracy"],
+        parent_version=parent_version,
+        base_version=parent.get("base_version", parent_version),
+        pruning={
+            "tolerance": args.tolerance,
+            "validation_fraction": config.PRUNE_VALIDATION_FRACTION,
+            "min_trees": config.PRUNE_MIN_TREES,
+            "models": choices,
+        },
+        latency_ms={name: model_registry.benchmark_latency(models[name], X_test) for name in model_registry.GLOBAL_MODELS},
+        training_date=time.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    out_dir = model_registry.save_version(version, models, meta)
+    save_compact(out_dir / COMPACT_FILENAME, models)
+    print(f"\n✓ Saved pruned version {version} to {out_dir}/")
+    print(f"✓ CURRENT -> {version}")
@@ -0,0 +1,113 @@
+"""
+Race time parsing and gap-to-winner per race
+The Time column mixes finishing times ("0:58:29", "57:14"), gaps to the winner
+("+0:00:08", or "00:00:09" under a winner's "01:03:05"), lap-down markers ("-2 LAPS",
+"-1 lap", "LAP") and DNF / DNS / DSQ. Everything is parsed with vectorized string
+operations over the full history and gaps are derived per race with one groupby.
+"""
+import numpy as np
+import pandas as pd
+
+# Status codes per result row
+FINISHED = 0
+LAPPED = 1
+DNF = 2
+DNS = 3
+DSQ = 4
+UNKNOWN = -1
+
+STATUS_NAMES = {FINISHED: "finished", LAPPED: "lapped", DNF: "dnf", DNS: "dns", DSQ: "dsq", UNKNOWN: "unknown"}
+
+# A gap larger than the winner's whole race time is a data-entry error ("13:09:53")
+MAX_GAP_PCT = 100
+
+TIME_PATTERN = r"^(?P<plus>\+)?(?:(?P<hours>\d+):)?(?P<minutes>\d+):(?P<seconds>\d+)$"
+LAPS_PATTERN = r"^-\s*(?P<laps>\d+)\s*LAPS?$"
+
+
+def parse_times(times):
+    """DataFrame of time_seconds, is_gap, laps_down, time_status for a Time column"""
+    text = pd.Series(times).fillna("").astype(str).str.strip().str.upper()
+
+    clock = text.str.extract(TIME_PATTERN)
+    seconds = (
+        clock["hours"].astype(float).fillna(0) * 3600
+        + clock["minutes"].astype(float) * 60
+        + clock["seconds"].astype(float)
+    )
+    laps_down = text.str.extract(LAPS_PATTERN)["laps"].astype(float)
+
+    status = np.select(
+        [
+            seconds.notna().to_numpy(),
+            (laps_down.notna() | (text == "LAP")).to_numpy(),
+            (text == "DNF").to_numpy(),
+            (text == "DNS").to_numpy(),
+            (text == "DSQ").to_numpy(),
+        ],
+        [FINISHED, LAPPED, DNF, DNS, DSQ],
+        default=UNKNOWN,
+    )
+    return pd.DataFrame({
+        "time_seconds": seconds.to_numpy(dtype=float),
+        "is_gap": clock["plus"].notna().to_numpy(dtype=bool),
+        "laps_down": laps_down.to_numpy(dtype=float),
+        "time_status": status,
+    }, index=pd.Series(times).index)
+
+
+def gaps_to_winner(races, places, parsed):
+    """(gap_to_winner seconds, gap_pct of the winner's time) per row, NaN without a usable finishing time
+
+    races: race key per row (race x category); the winner is the best-placed finisher
+    with a clock time. Times below the winner's are gaps, as are "+" times.
+    """
+    frame = pd.DataFrame({
+        "race": np.asarray(races),
+        "place": pd.to_numeric(pd.Series(np.asarray(places)), errors="coerce").to_numpy(),
+        "seconds": parsed["time_seconds"].to_numpy(),
+        "is_gap": parsed["is_gap"].to_numpy(),
+    })
+    timed = frame["seconds"].notna() & ~frame["is_gap"]
+    winners = (
+        frame[timed & frame["place"].notna()]
+        .sort_values(["race", "place"], kind="stable")
+        .drop_duplicates("race")
+        .set_index("race")
+    )
+    winner_seconds = frame["race"].map(winners["seconds"])
+    winner_place = frame["race"].map(winners["place"])
+
+    is_winner = frame["place"] == winner_place
+    is_gap = frame["is_gap"] | ((frame["seconds"] < winner_seconds) & ~is_winner)
+    gap = np.where(is_gap, frame["seconds"], frame["seconds"] - winner_seconds)
+    gap = np.where(is_winner, 0.0, gap)
+    gap_pct = 100 * gap / winner_seconds.to_numpy()
+    valid = frame["seconds"].notna().to_numpy() & (winner_seconds.to_numpy() > 0) & (gap_pct <= MAX_GAP_PCT)
+    return np.where(valid, gap, np.nan), np.where(valid, gap_pct, np.nan)
+
+
+def add_time_columns(results):
+    """Parsed time, status and gap-to-winner columns for a results table"""
+    parsed = parse_times(results["Time"])
+    races = results["race_id"].fillna("").astype(str) + "|" + results["Category Name"].fillna("").astype(str)
+    gap, gap_pct = gaps_to_winner(races.to_numpy(), results["Place"].to_numpy(), parsed)
+    return results.assign(
+        time_seconds=parsed["time_seconds"],
+        time_status=parsed["time_status"],
+        laps_down=parsed["laps_down"],
+        gap_to_winner=gap,
+        gap_pct=gap_pct,
+        is_dnf=(parsed["time_status"] == DNF).astype(int),
+    )
+
+
+if __name__ == "__main__":
+    import config
+
+    results = pd.read_csv(config.RESULTS_ALL, low_memory=False)
+    timed = add_time_columns(results)
+    counts = timed["time_status"].map(STATUS_NAMES).value_counts()
+    print(f"✓ Parsed {len(timed)} times: {counts.to_dict()}")
+    print(f"✓ Gap to winner known for {timed['gap_pct'].notna().sum()} rows, "
+          f"median {timed['gap_pct'].median():.1f}% of the winner's time")
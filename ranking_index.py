@@ -0,0 +1,210 @@
+"""
+Time-versioned UCI ranking points index
+Parses the ranking documents in data/results (UCI ranking CSV exports and ChronoRace
+World Cup standings PDFs) into one compact index of (ranking, rider_id, as_of) -> points,
+so prediction output can show each starter's ranking points and rank as of the race date.
+
+Display only: the model input uci_points_normalized stays the Carried Points of the
+rider's results rows in training and serving. Rankings are published on a few dates,
+not before every training race, so an as-of ranking feature would be missing for
+most training rows and present for every startlist rider. Loading and lookup are NumPy-only.
+
+Usage: python ranking_index.py   # rebuild data/clean/ranking_index.npz
+"""
+import re
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import config
+from names import name_key, normalize_name, name_variants
+
+UCI_RANKING = "UCI Ranking"
+WORLD_CUP = "UCI World Cup"
+
+# UCI-Ranking__2025-11-17__Men-Elite.csv
+RANKING_CSV_RE = re.compile(r"^UCI-Ranking__(?P<date>\d{4}-\d{2}-\d{2})__(?P<category>.+)\.csv$")
+# ChronoRace standings: "SUN 26 JAN 2025 Women Elite" header, then
+# "4. 3 * BACKSTEDT Zoe GBR 2004 19 (7) 25 (3) ... 244" rows (Prev and the U23 "*" are optional)
+PDF_HEADER_RE = re.compile(r"^[A-Z]{3} (?P<date>\d{1,2} [A-Z]{3} \d{4}) (?P<category>.+)$", re.MULTILINE)
+PDF_ROW_RE = re.compile(
+    r"^(?P<rank>\d+)\.\s+(?:\d+\s+)?(?:\*\s+)?(?P<name>.+?)\s+(?P<nation>[A-Z]{3})\s+(?P<yob>\d{4})\s.*?(?P<points>\d+)$",
+    re.MULTILINE,
+)
+
+_EPOCH_DAY = np.datetime64("1970-01-01", "D")
+
+
+def rider_key(racer_id=None, rider_name=None):
+    """Index key for a rider: RacerID when known, else an order-independent name key"""
+    if racer_id is not None and racer_id == racer_id and str(racer_id).strip():
+        return str(int(float(racer_id)))
+    key = name_key(rider_name)
+    return f"name:{key}" if key else None
+
+
+def parse_ranking_csv(path):
+    """Rows of a UCI ranking CSV export (Rank,Rider,Nation,Team,Age,Points)"""
+    import pandas as pd
+
+    match = RANKING_CSV_RE.match(Path(path).name)
+    df = pd.read_csv(path).dropna(subset=["Rider"])
+    return pd.DataFrame({
+        "ranking": UCI_RANKING,
+        "category_full": match.group("category").replace("-", " "),
+        "as_of": pd.Timestamp(match.group("date")),
+        "rank": pd.to_numeric(df["Rank"], errors="coerce"),
+        "rider_name": df["Rider"].str.strip(),
+        "nation": df["Nation"],
+        "points": pd.to_numeric(df["Points"], errors="coerce"),
+    })
+
+
+def parse_ranking_pdf(path):
+    """Rows of a ChronoRace UCI World Cup individual standings PDF"""
+    import pandas as pd
+    import pdfplumber
+    from split_startlist import to_category_full
+
+    rows = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            # Bold text is drawn several times over; dedupe before extracting
+            text = page.dedupe_chars().extract_text() or ""
+            header = PDF_HEADER_RE.search(text)
+            if not header:
+                continue
+            as_of = datetime.strptime(header.group("date").title(), "%d %b %Y")
+            category_full = to_category_full(header.group("category"))
+            for row in PDF_ROW_RE.finditer(text):
+                rows.append({
+                    "ranking": WORLD_CUP,
+                    "category_full": category_full,
+                    "as_of": pd.Timestamp(as_of),
+                    "rank": int(row.group("rank")),
+                    "rider_name": row.group("name"),
+                    "nation": row.group("nation"),
+                    "points": int(row.group("points")),
+                })
+    return pd.DataFrame(rows)
+
+
+def find_ranking_files(results_dir=None):
+    """Ranking documents among the race result files"""
+    results_dir = Path(results_dir or config.RESULTS_DIR)
+    csvs = sorted(p for p in results_dir.glob("UCI-Ranking__*.csv") if RANKING_CSV_RE.match(p.name))
+    pdfs = sorted(p for p in results_dir.glob("*.pdf") if "ranking" in p.name.lower())
+    return csvs, pdfs
+
+
+def load_rankings(results_dir=None):
+    """All ranking rows from the ranking documents, one DataFrame"""
+    import pandas as pd
+
+    csvs, pdfs = find_ranking_files(results_dir)
+    frames = [parse_ranking_csv(p) for p in csvs] + [parse_ranking_pdf(p) for p in pdfs]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=["ranking", "category_full", "as_of", "rank", "rider_name", "nation", "points"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def resolve_rider_ids(rankings, history):
+    """rider_id per ranking row: the history RacerID matched on normalized name (both orders) + gender"""
+    ids = {}
+    for racer_id, name, is_women in history[["RacerID", "rider_name", "is_women"]].drop_duplicates().itertuples(index=False):
+        norm = normalize_name(name)
+        if norm and racer_id == racer_id:
+            ids[(norm, int(is_women))] = racer_id
+
+    def resolve(name, category_full):
+        is_women = 1 if "Women" in category_full else 0
+        norm = normalize_name(name)
+        for variant in name_variants(norm) if norm else []:
+            if (variant, is_women) in ids:
+                return rider_key(ids[(variant, is_women)])
+        return rider_key(None, name)
+
+    return [resolve(name, cat) for name, cat in zip(rankings["rider_name"], rankings["category_full"])]
+
+
+def build_index(rankings):
+    """Compact arrays sorted by (ranking|rider_id, as_of) for searchsorted as-of lookups"""
+    rankings = rankings.dropna(subset=["rider_id", "points"])
+    keys = (rankings["ranking"] + "|" + rankings["rider_id"]).to_numpy(str)
+    days = (rankings["as_of"].to_numpy("datetime64[D]") - _EPOCH_DAY).astype(np.int64)
+
+    unique_keys, key_codes = np.unique(keys, return_inverse=True)
+    order = np.lexsort((days, key_codes))
+
+    return {
+        "keys": unique_keys,
+        "key_code": key_codes[order].astype(np.int64),
+        "day": days[order],
+        "points": rankings["points"].to_numpy(np.float32)[order],
+        "rank": rankings["rank"].fillna(-1).to_numpy(np.int32)[order],
+        "rider_name": rankings["rider_name"].to_numpy(str)[order],
+        "category_full": rankings["category_full"].to_numpy(str)[order],
+    }
+
+
+def save_index(index, path=None):
+    np.savez(path or config.RANKING_INDEX, **index)
+
+
+def load_index(path=None):
+    with np.load(path or config.RANKING_INDEX) as data:
+        return {key: data[key] for key in data.files}
+
+
+def lookup_points(index, rider_ids, as_of, ranking=UCI_RANKING):
+    """(points, rank) of every rider in the latest ranking published on or before as_of
+
+    rider_ids: sequence of rider_key values; as_of: one date or one date per rider.
+    Riders without a ranking by then get NaN points and rank -1.
+    """
+    n = len(rider_ids)
+    query_keys = np.asarray([f"{ranking}|{rid}" for rid in rider_ids], dtype=str)
+    query_days = np.broadcast_to(
+        (np.asarray(as_of, dtype="datetime64[D]") - _EPOCH_DAY).astype(np.int64), (n,)
+    )
+
+    keys = index["keys"]
+    code = np.searchsorted(keys, query_keys)
+    known = code < len(keys)
+    known[known] = keys[code[known]] == query_keys[known]
+
+    # One sorted int64 axis (key code major, day minor): last entry <= (code, day)
+    composite = (index["key_code"] << 32) + index["day"]
+    query = (code.astype(np.int64) << 32) + query_days
+    pos = np.searchsorted(composite, query, side="right") - 1
+    found = known & (pos >= 0)
+    found[found] = index["key_code"][pos[found]] == code[found]
+
+    points = np.full(n, np.nan, dtype=np.float64)
+    rank = np.full(n, -1, dtype=np.int32)
+    points[found] = index["points"][pos[found]]
+    rank[found] = index["rank"][pos[found]]
+    return points, rank
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    print("=" * 60)
+    print("BUILDING UCI RANKING INDEX")
+    print("=" * 60)
+
+    rankings = load_rankings()
+    history = pd.read_csv(config.RESULTS_WITH_FEATURES, usecols=["RacerID", "rider_name", "is_women"])
+    rankings["rider_id"] = resolve_rider_ids(rankings, history)
+
+    matched = ~rankings["rider_id"].str.startswith("name:")
+    for (ranking, category_full, as_of), group in rankings.groupby(["ranking", "category_full", "as_of"]):
+        print(f"  ✓ {ranking:14s} {category_full:12s} {as_of.date()}  {len(group):4d} riders, "
+              f"{matched[group.index].mean():.0%} matched to a RacerID")
+
+    index = build_index(rankings)
+    save_index(index)
+    print(f"\n✓ Saved {len(index['day'])} ranking entries ({len(index['keys'])} rider series) to {config.RANKING_INDEX}")
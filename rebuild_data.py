@@ -1,40 +1,54 @@
 """
 Quick script to rebuild clean data with all 45 races
 Run this first to update the dataset
+
+Race files are the CSVs plus Apple Numbers exports (.numbers, converted once and cached
+by numbers_import.py); a .numbers file with a same-named CSV is skipped. Both filename
+conventions parse to one canonical race_id, and rows already ingested from another copy
+of a race (same race and rider, or the same result cells on the same day) are dropped.
+Race files are streamed: each one is read, validated and appended to results_all.csv
+and its season partition before the next is opened, so peak memory is one race file.
+Outputs are written to .tmp siblings and only replace the previous files once every
+race file went through, so an interrupted run leaves the last complete rebuild in place.
+A header-only pass first fixes the output columns (same order as concatenating all files).
 """
+import os
 import pandas as pd
 from pathlib import Path
 import re
+import config
+import numbers_import
+from ranking_index import RANKING_CSV_RE
+from schema import RESULTS_SCHEMA, missing_columns, validate
+import seasons
 
 DATA_DIR = Path("data")
 RESULTS_DIR = DATA_DIR / "results"
 CLEAN_DIR = DATA_DIR / "clean"
 CLEAN_DIR.mkdir(parents=True, exist_ok=True)
 
+# Filename conventions: "Series__Race__2025-10-04__Loc" (race name optional) and the
+# bullet-separated export names "Series • Race • Oct 4 2025 • Loc, CC" (notebook 01)
+BULLET = "•"
+DATE_FORMATS = {"__": "%Y-%m-%d", BULLET: "%b %d %Y"}
+
 def parse_race_meta_from_filename(path: Path):
     """Extract series, race name, date, location from filename"""
     stem = path.stem
-    parts = [p.strip() for p in stem.split("__")]
-
-    if len(parts) >= 3:
-        series_name = parts[0]
-        race_name = parts[1]
-        date_str = parts[2] if len(parts) > 2 else None
-        location = parts[3] if len(parts) > 3 else None
-    else:
-        series_name = None
-        race_name = stem
-        date_str = None
-        location = None
-
-    race_date = None
-    if date_str:
-        try:
-            race_date = pd.to_datetime(date_str, format="%Y-%m-%d")
-        except:
-            pass
+    separator = BULLET if BULLET in stem else "__"
+    parts = [" ".join(p.split()) for p in stem.split(separator)]
+
+    # The date is the first part that parses as one; series before it, location after
+    dates = [pd.to_datetime(p, format=DATE_FORMATS[separator], errors="coerce") for p in parts]
+    date_index = next((i for i, d in enumerate(dates) if pd.notnull(d) and i > 0), None)
+    if date_index is None:
+        return None, stem, None, None
 
-    return series_name, race_name, race_date, location
+    series_name = parts[0]
+    # "Series__date__Loc" (championships) has no separate race name
+    race_name = separator.join(parts[1:date_index]) or series_name
+    location = separator.join(parts[date_index + 1:]) or None
+    return series_name, race_name, dates[date_index], location
 
 def slugify(s):
     if not isinstance(s, str):
@@ -48,65 +62,219 @@ def make_race_id(series_name, race_name, race_date, location):
     loc_part = slugify(location) if location else "noloc"
     return f"{date_part}_{series_part}_{name_part}_{loc_part}"
 
+# Columns added to every race file's own columns
+META_COLUMNS = ["series_name", "race_name", "race_date", "race_location", "race_id", "rider_name"]
+
+# Output dtypes fixed up front, so a column is written the same way whichever files have
+# gaps in it (integer columns as "3", not "3.0" in some races and "3" in others)
+OUTPUT_DTYPES = {
+    col: "Int64" if rules.get("integer") else "float64"
+    for col, rules in RESULTS_SCHEMA.items() if rules["dtype"] == "float64"
+}
+
+# race_date as written by a concatenated frame (Timestamps in an object column)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def race_files():
+    """Race CSVs, then .numbers files without a same-named CSV (sorted within each)"""
+    # Ranking exports live next to the race results but are ingested by ranking_index.py
+    csv_files = sorted(p for p in RESULTS_DIR.glob("*.csv") if not RANKING_CSV_RE.match(p.name))
+    numbers_files = sorted(
+        p for p in RESULTS_DIR.glob(f"*{numbers_import.NUMBERS_SUFFIX}") if not p.with_suffix(".csv").exists()
+    )
+    return csv_files, numbers_files
+
+def csv_source(path: Path):
+    """The file to read as CSV: the race CSV itself, or the cached conversion of a .numbers file"""
+    return numbers_import.cached_csv(path) if path.suffix == numbers_import.NUMBERS_SUFFIX else path
+
+def read_race_file(path: Path):
+    """Raw strings of one race file without empty columns (validation decides what is numeric)"""
+    raw = pd.read_csv(csv_source(path), dtype=str)
+    return raw.loc[:, ~raw.columns.str.startswith("Unnamed")]
+
+def output_columns(paths):
+    """Union of the race files' columns in first-seen order, metadata after each file's own
+
+    Files that will be rejected whole (unreadable, missing required columns) add nothing.
+    """
+    columns = {}
+    for path in paths:
+        try:
+            header = pd.read_csv(csv_source(path), dtype=str, nrows=0).columns
+        except (pd.errors.ParserError, UnicodeDecodeError, pd.errors.EmptyDataError):
+            continue
+        if missing_columns(header):
+            continue
+        columns.update(dict.fromkeys(c for c in header if not c.startswith("Unnamed")))
+        columns.update(dict.fromkeys(META_COLUMNS))
+    return list(columns)
+
+def load_race(path: Path):
+    """(clean results with race metadata, rejected rows) for one race file"""
+    series_name, race_name, race_date, race_location = parse_race_meta_from_filename(path)
+    race_id = make_race_id(series_name, race_name, race_date, race_location)
+
+    df, rejected = validate(read_race_file(path))
+    if len(df):
+        df = df.assign(
+            series_name=series_name,
+            race_name=race_name,
+            race_date=race_date,
+            race_location=race_location,
+            race_id=race_id,
+            # Build rider name
+            rider_name=(
+                df["First Name"].fillna("").astype(str).str.strip()
+                + " "
+                + df["Last Name"].fillna("").astype(str).str.strip()
+            ).str.strip(),
+        )
+    return df, rejected
+
+def with_output_dtypes(df, columns):
+    return df.reindex(columns=columns).astype({col: dtype for col, dtype in OUTPUT_DTYPES.items() if col in columns})
+
+def append_rows(handle, df, columns, header):
+    with_output_dtypes(df, columns).to_csv(handle, index=False, header=header, date_format=DATE_FORMAT)
+
+# Dedup index keys: a rider has one result per race (canonical race_id + category), and
+# the same result cells on the same day are the same result whatever the file is called
+RACE_KEY = ["race_id", "Category Name", "rider_name"]
+CONTENT_KEY = list(RESULTS_SCHEMA) + ["race_date"]
+
+def new_dedup_index():
+    return {"race_rows": set(), "row_hashes": set()}
+
+def drop_seen(df, index):
+    """(rows not ingested yet, number dropped); adds the kept rows to the dedup index
+
+    One set lookup per row for each key, so the cost does not grow with results_all.
+    """
+    race_keys = pd.util.hash_pandas_object(df[RACE_KEY], index=False).tolist()
+    content = with_output_dtypes(df, CONTENT_KEY).astype(str)
+    row_hashes = pd.util.hash_pandas_object(content, index=False).tolist()
+
+    keep = []
+    for race_key, row_hash in zip(race_keys, row_hashes):
+        seen = race_key in index["race_rows"] or row_hash in index["row_hashes"]
+        if not seen:
+            index["race_rows"].add(race_key)
+            index["row_hashes"].add(row_hash)
+        keep.append(not seen)
+    return df[keep], len(keep) - sum(keep)
+
+def tmp_path(path):
+    """Sibling file an output is written to before it replaces the previous one"""
+    return path.with_name(path.name + ".tmp")
+
 print("=" * 60)
 print("REBUILDING CLEAN DATA WITH ALL RACES")
 print("=" * 60)
 
-all_results = []
-csv_files = sorted(RESULTS_DIR.glob("*.csv"))
+quarantined = []
+csv_files, numbers_files = race_files()
 
-print(f"\nFound {len(csv_files)} race CSV files\n")
+print(f"\nFound {len(csv_files)} race CSV files and {len(numbers_files)} Numbers files without a CSV\n")
 
-for csv_path in csv_files:
-    print(f"Processing: {csv_path.name}")
+columns = output_columns(csv_files + numbers_files)
+output_path = CLEAN_DIR / "results_all.csv"
+n_rows = 0
+race_ids, rider_names = set(), set()
+season_rows = {}
+sample = None
 
-    # Parse metadata from filename
-    series_name, race_name, race_date, race_location = parse_race_meta_from_filename(csv_path)
-    race_id = make_race_id(series_name, race_name, race_date, race_location)
+# One partition per season (add_features.py carries career summaries across them)
+season_handles = {}
+dedup_index = new_dedup_index()
+n_duplicates = 0
+try:
+    with open(tmp_path(output_path), "w", newline="", encoding="utf-8") as output:
+        for csv_path in csv_files + numbers_files:
+            print(f"Processing: {csv_path.name}")
 
-    # Read CSV
-    try:
-        df = pd.read_csv(csv_path)
+            try:
+                df, rejected = load_race(csv_path)
+            except (pd.errors.ParserError, UnicodeDecodeError, pd.errors.EmptyDataError) as e:
+                print(f"  ✗ ERROR: unreadable file: {e}")
+                continue
 
-        # Drop empty columns
-        df = df.loc[:, ~df.columns.str.startswith("Unnamed")]
+            if len(rejected):
+                quarantined.append(rejected.assign(source_file=csv_path.name, source_row=rejected.index + 2))
+                print(f"  ⚠️  Quarantined {len(rejected)} rows: {rejected['reason'].value_counts().to_dict()}")
 
-        # Add metadata
-        df["series_name"] = series_name
-        df["race_name"] = race_name
-        df["race_date"] = race_date
-        df["race_location"] = race_location
-        df["race_id"] = race_id
+            if len(df):
+                df, n_seen = drop_seen(df, dedup_index)
+                n_duplicates += n_seen
+                if n_seen:
+                    print(f"  - Skipped {n_seen} results already ingested (same race and rider, or same result)")
 
-        # Build rider name
-        df["rider_name"] = (
-            df["First Name"].fillna("").astype(str).str.strip()
-            + " "
-            + df["Last Name"].fillna("").astype(str).str.strip()
-        ).str.strip()
+            if len(df):
+                append_rows(output, df, columns, header=n_rows == 0)
 
-        # Make Place numeric
-        df["Place"] = pd.to_numeric(df["Place"], errors="coerce")
+                season = seasons.season_of(df["race_date"].iloc[:1])[0]
+                if season not in season_handles:
+                    seasons.partition_dir(season).mkdir(parents=True, exist_ok=True)
+                    season_handles[season] = open(tmp_path(seasons.partition_file(season)), "w", newline="", encoding="utf-8")
+                append_rows(season_handles[season], df, columns, header=season not in season_rows)
+                season_rows[season] = season_rows.get(season, 0) + len(df)
 
-        all_results.append(df)
-        print(f"  ✓ Added {len(df)} results")
+                n_rows += len(df)
+                race_ids.add(df["race_id"].iloc[0])
+                rider_names.update(df["rider_name"])
+                sample = df.head(10) if sample is None else pd.concat([sample, df]).head(10)
+                print(f"  ✓ Added {len(df)} results")
+except BaseException:
+    # Interrupted: drop the partial outputs, the previous ones stay in place
+    for handle in season_handles.values():
+        handle.close()
+    for partial in [output_path] + [seasons.partition_file(season) for season in season_handles]:
+        tmp_path(partial).unlink(missing_ok=True)
+    raise
+finally:
+    for handle in season_handles.values():
+        handle.close()
 
-    except Exception as e:
-        print(f"  ✗ ERROR: {e}")
+if n_rows == 0:
+    tmp_path(output_path).unlink(missing_ok=True)
+    raise SystemExit(
+        f"✗ No results ingested from {len(csv_files) + len(numbers_files)} race files (all unreadable, "
+        f"quarantined or already ingested); {output_path} and the season partitions were left unchanged"
+    )
 
-# Combine all
-results_all = pd.concat(all_results, ignore_index=True)
+# Every race file went through: swap the complete outputs in
+os.replace(tmp_path(output_path), output_path)
+for season in season_rows:
+    os.replace(tmp_path(seasons.partition_file(season)), seasons.partition_file(season))
+
+# A season with no rows this time (e.g. undated rows whose dates now parse) keeps no old partition
+for stale_partition in config.SEASONS_DIR.glob("*/results.csv"):
+    if stale_partition.parent.name not in season_rows:
+        stale_partition.unlink()
 
 print(f"\n" + "=" * 60)
-print(f"TOTAL: {len(results_all)} rider-race observations")
-print(f"Unique races: {results_all['race_id'].nunique()}")
-print(f"Unique riders: {results_all['rider_name'].nunique()}")
+print(f"TOTAL: {n_rows} rider-race observations")
+print(f"Unique races: {len(race_ids)}")
+print(f"Unique riders: {len(rider_names)}")
+print(f"Duplicate results skipped: {n_duplicates}")
 print("=" * 60)
 
-# Save
-output_path = CLEAN_DIR / "results_all.csv"
-results_all.to_csv(output_path, index=False)
 print(f"\n✓ Saved to: {output_path}")
+for season in seasons.season_order(list(season_rows)):
+    print(f"✓ Season {season}: {season_rows[season]} results -> {seasons.partition_dir(season)}")
+
+# Rejected rows with reasons, for review (overwritten every rebuild)
+if quarantined:
+    quarantine = pd.concat(quarantined, ignore_index=True)
+    front = ["source_file", "source_row", "reason"]
+    quarantine = quarantine[front + [c for c in quarantine.columns if c not in front]]
+    quarantine.to_csv(config.QUARANTINE_FILE, index=False)
+    print(f"⚠️  Quarantined {len(quarantine)} rows from {quarantine['source_file'].nunique()} files -> {config.QUARANTINE_FILE}")
+    for reason, count in quarantine["reason"].value_counts().items():
+        print(f"   • {count:5d}  {reason}")
+else:
+    config.QUARANTINE_FILE.unlink(missing_ok=True)
+    print("✓ No rows quarantined")
 
 print(f"\nSample data:")
-print(results_all[['race_date', 'series_name', 'race_name', 'rider_name', 'Place']].head(10))
+print(sample[['race_date', 'series_name', 'race_name', 'rider_name', 'Place']].head(10))
@@ -0,0 +1,178 @@
+"""
+Indexed results database (SQLite) with a small query API
+add_features.py writes every results-with-features row to data/clean/results.sqlite,
+indexed on rider, race date, race, series and category, so history lookups are
+index seeks instead of loading the full CSV and masking it. Queries are stdlib-only
+and return plain dicts keyed by the results columns.
+
+Usage: python results_db.py [--rider "Van Aert"] [--race-id ...] [--series UCI-World-Cup]
+"""
+import os
+import sqlite3
+
+import config
+from names import normalize_name, name_variants
+
+TABLE = "results"
+
+# index name -> indexed columns
+INDEXES = {
+    "idx_results_rider": ["rider_name_norm", "race_date"],
+    "idx_results_date": ["race_date"],
+    "idx_results_race": ["race_id", "Place"],
+    "idx_results_series": ["series_name", "race_date"],
+    "idx_results_category": ["Category Name", "race_date"],
+    "idx_results_team": ["team_id"],
+}
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def build(results, path=None):
+    """Write the results table and its indexes (replaces the database atomically)"""
+    path = path or config.RESULTS_DB
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    rows = results.assign(
+        race_date=results["race_date"].dt.strftime("%Y-%m-%d"),  # ISO text sorts by date
+        rider_name_norm=results["rider_name"].map({n: normalize_name(n) for n in results["rider_name"].dropna().unique()}),
+    )
+    with sqlite3.connect(tmp_path) as conn:
+        rows.to_sql(TABLE, conn, index=False)
+        for name, columns in INDEXES.items():
+            conn.execute(f"CREATE INDEX {name} ON {TABLE} ({', '.join(_quote(c) for c in columns)})")
+        conn.execute("ANALYZE")
+    conn.close()
+    os.replace(tmp_path, path)  # readers never see a half-written database
+    return path
+
+
+def connect(path=None):
+    """Read-only connection (shareable across threads, e.g. a Streamlit resource cache)"""
+    path = path or config.RESULTS_DB
+    if not path.exists():
+        raise FileNotFoundError(f"No results database at {path}. Run: python add_features.py")
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+# Newest first, same-day results in the reverse of feature_spec.HISTORY_ORDER
+NEWEST_FIRST = 'race_date DESC, race_id DESC, "Category Name" DESC'
+
+
+def _rows(conn, sql, params=()):
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def _rider_filter(rider_name, is_women):
+    norm_name = normalize_name(rider_name)
+    variants = name_variants(norm_name) if norm_name else []
+    sql = f"rider_name_norm IN ({', '.join('?' * len(variants)) or 'NULL'})"
+    params = list(variants)
+    if is_women is not None:
+        sql += " AND is_women = ?"
+        params.append(int(is_women))
+    return sql, params
+
+
+def count(conn):
+    return conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+
+def rider_history(conn, rider_name, is_women=None, limit=None):
+    """A rider's results, newest first (either name order; is_women narrows to one gender)"""
+    where, params = _rider_filter(rider_name, is_women)
+    sql = f"SELECT * FROM {TABLE} WHERE {where} ORDER BY {NEWEST_FIRST}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return _rows(conn, sql, params)
+
+
+def latest_state(conn, rider_name, is_women=None):
+    """A rider's most recent results row, or None"""
+    history = rider_history(conn, rider_name, is_women, limit=1)
+    return history[0] if history else None
+
+
+def team_record(conn, team_id):
+    """(Top-10 finishes, results) of a team over the whole history, as counted by teams.team_table"""
+    sql = f'SELECT COALESCE(SUM("Place" <= 10), 0), COUNT(*) FROM {TABLE} WHERE team_id = ?'
+    return tuple(conn.execute(sql, [team_id]).fetchone())
+
+
+def race_field(conn, race_id, category=None):
+    """Every rider in a race in finishing order (unplaced riders last)"""
+    sql = f"SELECT * FROM {TABLE} WHERE race_id = ?"
+    params = [race_id]
+    if category:
+        sql += ' AND "Category Name" = ?'
+        params.append(category)
+    return _rows(conn, sql + ' ORDER BY "Category Name", "Place" IS NULL, "Place"', params)
+
+
+def series_standings(conn, series_name, category=None, since=None, until=None):
+    """Points standings for a series: races, scored points, best and average place per rider"""
+    sql = (
+        f'SELECT rider_name, "Category Name", COUNT(*) AS races, '
+        f'COALESCE(SUM("Scored Points"), 0) AS points, MIN("Place") AS best_place, AVG("Place") AS avg_place '
+        f"FROM {TABLE} WHERE series_name = ?"
+    )
+    params = [series_name]
+    for clause, value in [('"Category Name" = ?', category), ("race_date >= ?", since), ("race_date <= ?", until)]:
+        if value:
+            sql += f" AND {clause}"
+            params.append(str(value))
+    sql += ' GROUP BY rider_name, "Category Name" ORDER BY "Category Name", points DESC, best_place'
+    return _rows(conn, sql, params)
+
+
+def recent_riders(conn, since, limit=50):
+    """Riders who raced since a date: average place since then plus their latest state, by UCI points"""
+    sql = f"""
+        WITH recent AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY rider_name ORDER BY {NEWEST_FIRST}) AS recency,
+                   AVG("Place") OVER (PARTITION BY rider_name) AS avg_place
+            FROM {TABLE} WHERE race_date > ?
+        )
+        SELECT rider_name, avg_place, uci_points_normalized, team_tier, top10_rate_career
+        FROM recent WHERE recency = 1
+        ORDER BY uci_points_normalized DESC LIMIT ?
+    """
+    return _rows(conn, sql, [str(since), int(limit)])
+
+
+def category_stats(conn):
+    """Results and Top-10 finishes per category"""
+    sql = (
+        f'SELECT "Category Name", COUNT("Place") AS results, SUM(top10_finish) AS top10_finishes '
+        f'FROM {TABLE} GROUP BY "Category Name" ORDER BY "Category Name"'
+    )
+    return _rows(conn, sql)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the results database")
+    parser.add_argument("--rider", help="Rider history (either name order)")
+    parser.add_argument("--race-id", help="Field of a race")
+    parser.add_argument("--series", help="Series standings")
+    parser.add_argument("--category", help="Category Name filter (race field, series standings)")
+    args = parser.parse_args()
+
+    conn = connect()
+    print(f"✓ {count(conn)} results in {config.RESULTS_DB}")
+    if args.rider:
+        for row in rider_history(conn, args.rider):
+            print(f"  {row['race_date']}  {row['Category Name']:15s}  {str(row['Place']):>5s}  {row['race_name']}")
+    if args.race_id:
+        for row in race_field(conn, args.race_id, args.category):
+            print(f"  {str(row['Place']):>5s}  {row['rider_name']:30s}  {row['Team Name'] or ''}")
+    if args.series:
+        for row in series_standings(conn, args.series, args.category):
+            print(f"  {row['Category Name']:15s}  {row['rider_name']:30s}  {row['races']:3d} races  {row['points']:6.0f} pts")
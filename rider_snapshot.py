@@ -0,0 +1,206 @@
+"""
+Precomputed rider snapshot: the latest known state of every rider
+Built once by add_features.py so prediction can look riders up in O(1) instead of
+scanning the full results history. The history features are stored as of each
+rider's next race (feature_spec.as_of), so a lookup needs no further computation.
+Loading and lookup are stdlib-only.
+
+Usage: python rider_snapshot.py data/startlists/*.csv  (check the snapshot against results_db)
+"""
+import csv
+import math
+
+import config
+from names import normalize_name, name_variants
+
+# Columns kept from each rider's most recent history row (team_strength: the team's current
+# strength), then the next-race history features
+SNAPSHOT_COLUMNS = [
+    "RacerID",
+    "rider_name",
+    "rider_name_norm",
+    "is_women",
+    "race_date",
+    "Category Name",
+    "Team Name",
+    "Place",
+    "Carried Points",
+    "Scored Points",
+    "uci_points_normalized",
+    "points_tier",
+    "team_tier",
+    "team_strength",
+] + config.HISTORY_FEATURES
+
+TEXT_COLUMNS = {"RacerID", "rider_name", "rider_name_norm", "race_date", "Category Name", "Team Name", "points_tier", "team_tier"}
+
+
+def rider_keys(history):
+    """(rider, gender) key per history row, as used by the snapshot and as_of()"""
+    return history["rider_name_norm"] + "|" + history["is_women"].astype(int).astype(str)
+
+
+def build_snapshot(history):
+    """Latest history row + next-race history features per (rider, gender), vectorized over the full results table"""
+    import feature_spec
+    import teams
+
+    norm_lookup = {name: normalize_name(name) for name in history["rider_name"].dropna().unique()}
+    history = history.assign(rider_name_norm=history["rider_name"].map(norm_lookup)).dropna(subset=["rider_name_norm"])
+    keys = rider_keys(history)
+    latest = (
+        history.assign(_key=keys)
+        .sort_values(feature_spec.HISTORY_ORDER, kind="stable", na_position=feature_spec.UNDATED_POSITION)
+        .groupby(["rider_name_norm", "is_women"])
+        .tail(1)
+    )
+    next_race = feature_spec.as_of(history, riders=keys)
+    latest = latest.drop(columns=config.HISTORY_FEATURES, errors="ignore").join(next_race, on="_key")
+    # A row's team_strength is from before its race day; the next race sees the team's current strength
+    strength = teams.team_table(history["team_id"], history["race_date"], history["Place"])["strength"]
+    latest = latest.assign(team_strength=latest["team_id"].map(strength))
+    return latest[SNAPSHOT_COLUMNS].sort_values("rider_name_norm").reset_index(drop=True)
+
+
+def _parse(column, value):
+    if column in TEXT_COLUMNS:
+        return value or None
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+def load_snapshot(path=None):
+    """Snapshot as {(rider_name_norm, is_women): row dict}"""
+    path = path or config.RIDER_SNAPSHOT
+    snapshot = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            parsed = {column: _parse(column, value) for column, value in row.items()}
+            snapshot[(parsed["rider_name_norm"], int(parsed["is_women"]))] = parsed
+    return snapshot
+
+
+def category_flags(category):
+    return {
+        "is_elite": 1 if "Elite" in category else 0,
+        "is_women": 1 if "Women" in category else 0,
+    }
+
+
+def features_from_latest(latest, category):
+    """Prediction features for a rider's next race, given their snapshot row
+
+    latest: a snapshot row, or any latest history row with the next-race history
+    features (feature_spec.as_of) filled in. Works on row dicts and DataFrames alike.
+    """
+    return {
+        "uci_points_normalized": latest["uci_points_normalized"],
+        **{name: latest[name] for name in config.HISTORY_FEATURES},
+        "series_appearances": 0,  # Reset for new series
+        **category_flags(category),
+        "points_tier": latest["points_tier"],
+        "team_tier": latest["team_tier"],
+        "team_strength": latest["team_strength"]
+    }
+
+
+def new_rider_features(category):
+    """Default features for a rider with no history"""
+    return {
+        "uci_points_normalized": 0.1,  # Low but not zero
+        **{name: config.FILL_VALUES[name] for name in config.HISTORY_FEATURES},
+        "series_appearances": 0,
+        **category_flags(category),
+        "points_tier": "low",
+        "team_tier": "no_team",
+        "team_strength": config.FILL_VALUES["team_strength"]
+    }
+
+
+def find(snapshot, rider_name, category):
+    """Latest snapshot row for a startlist rider (tries both name orders), or None"""
+    norm_name = normalize_name(rider_name)
+    is_women = category_flags(category)["is_women"]
+
+    if norm_name:
+        for variant in name_variants(norm_name):
+            latest = snapshot.get((variant, is_women))
+            if latest is not None:
+                return latest
+    return None
+
+
+def lookup(snapshot, rider_name, category):
+    """(features, status) for a startlist rider"""
+    latest = find(snapshot, rider_name, category)
+    if latest is not None:
+        return features_from_latest(latest, category), "found"
+    return new_rider_features(category), "new_rider"
+
+
+def dns_check(features, status):
+    """(dns_risk, reason) for riders unlikely to start"""
+    days_since = features.get("days_since_last_race", 7)
+    races_count = features.get("races_so_far", 0)
+
+    # Flag if hasn't raced in 21+ days (likely taking break or injured)
+    if days_since > 21:
+        return True, f"⚠️ DNS Risk: {days_since} days since last race"
+
+    # Flag if very few races this season (< 2)
+    if races_count < 2 and status == "found":
+        return True, "⚠️ DNS Risk: Only 1 race this season"
+
+    return False, ""
+
+
+def _same(a, b):
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    a, b = (math.nan if v is None else float(v) for v in (a, b))
+    return (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-12)
+
+
+def check_startlists(startlists, snapshot=None, conn=None):
+    """(startlist, rider, feature, snapshot value, database value) wherever the snapshot
+    disagrees with predict_race.get_rider_features for a startlist rider"""
+    from predict_fast import read_startlist
+    from predict_race import get_rider_features
+    from results_db import connect
+    from split_startlist import parse_startlist_filename
+
+    snapshot = snapshot or load_snapshot()
+    conn = conn or connect()
+    mismatches = []
+    for path in startlists:
+        category, _ = parse_startlist_filename(path)
+        if category is None:
+            print(f"  ✗ {path}: no category in the file name, skipped")
+            continue
+        for rider_name in read_startlist(path):
+            fast, fast_status = lookup(snapshot, rider_name, category)
+            slow, slow_status = get_rider_features(rider_name, conn, category)
+            if fast_status != slow_status:
+                mismatches.append((path, rider_name, "status", fast_status, slow_status))
+                continue
+            mismatches += [
+                (path, rider_name, name, fast[name], slow[name])
+                for name in fast if not _same(fast[name], slow[name])
+            ]
+    return mismatches
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the rider snapshot against the results database")
+    parser.add_argument("startlists", nargs="+", help="Startlist CSVs named {event}_{category}_{date}.csv")
+    args = parser.parse_args()
+
+    mismatches = check_startlists(args.startlists)
+    for path, rider_name, name, fast, slow in mismatches:
+        print(f"  ✗ {rider_name:30s} {name:25s} snapshot={fast}  database={slow}  ({path})")
+    riders = len({(path, rider_name) for path, rider_name, *_ in mismatches})
+    print(f"{'✗' if mismatches else '✓'} {riders} startlist riders differ between the snapshot and the database")
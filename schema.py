@@ -0,0 +1,90 @@
+"""
+Declared schema for race result files and vectorized validation
+Every check runs column-wise over the whole file (no per-row Python), and each row
+collects the reasons it failed; rejected rows go to a quarantine file instead of
+being silently coerced to NaN.
+"""
+import numpy as np
+import pandas as pd
+
+# column -> rules (dtype: "str" | "float64"; required: must be a column in the file;
+# not_null: value required; min / integer: range checks; tokens: accepted non-numeric values)
+RESULTS_SCHEMA = {
+    "Category Name": {"dtype": "str", "required": True, "not_null": True},
+    "Place": {"dtype": "float64", "required": True, "min": 1, "integer": True,
+              "tokens": ["DNF", "DNS", "DSQ", "DNP", "OTL", "LAP"]},
+    "RacerID": {"dtype": "float64", "min": 1, "integer": True},
+    "First Name": {"dtype": "str", "required": True},
+    "Last Name": {"dtype": "str", "required": True},
+    "Team Name": {"dtype": "str"},
+    "Time": {"dtype": "str"},
+    "License": {"dtype": "float64"},
+    "Carried Points": {"dtype": "float64", "min": 0},
+    "Scored Points": {"dtype": "float64", "min": 0},
+}
+
+# A rider appears once per race (category) in a results file
+DUPLICATE_KEY = ["Category Name", "rider_name"]
+
+
+def _flag(reasons, mask, reason):
+    """Append reason to every row where mask is set"""
+    mask = np.asarray(mask, dtype=bool)
+    if mask.any():
+        reasons[mask] = reasons[mask] + reason + "; "
+    return reasons
+
+
+def missing_columns(columns, schema=None):
+    """Required schema columns absent from a file's header (the whole file is rejected)"""
+    schema = schema or RESULTS_SCHEMA
+    return [col for col, rules in schema.items() if rules.get("required") and col not in columns]
+
+
+def validate(df, schema=None):
+    """(clean, rejected) for one raw file read with dtype=str
+
+    clean has numeric columns converted (accepted tokens like "DNF" become NaN);
+    rejected keeps the raw values plus a "reason" column.
+    """
+    schema = schema or RESULTS_SCHEMA
+    reasons = np.full(len(df), "", dtype=object)
+
+    missing = missing_columns(df.columns, schema)
+    if missing:
+        rejected = df.assign(reason=f"missing columns: {', '.join(missing)}")
+        return df.iloc[0:0], rejected
+
+    converted = {}
+    for col, rules in schema.items():
+        if col not in df.columns:
+            continue
+        raw = df[col].str.strip()
+        present = raw.notna() & (raw != "")
+
+        if rules.get("not_null"):
+            reasons = _flag(reasons, ~present, f"{col}: missing")
+
+        if rules["dtype"] == "float64":
+            values = pd.to_numeric(raw, errors="coerce")
+            token = raw.str.upper().isin(rules.get("tokens", []))
+            reasons = _flag(reasons, present & values.isna() & ~token, f"{col}: not numeric")
+            if "min" in rules:
+                reasons = _flag(reasons, values < rules["min"], f"{col}: below {rules['min']}")
+            if rules.get("integer"):
+                reasons = _flag(reasons, values.notna() & (values % 1 != 0), f"{col}: not an integer")
+            converted[col] = values
+
+    rider_name = (
+        df["First Name"].fillna("").str.strip() + " " + df["Last Name"].fillna("").str.strip()
+    ).str.strip()
+    reasons = _flag(reasons, rider_name == "", "rider name: missing")
+
+    # Later copies of a rider in the same race
+    key = pd.DataFrame({"Category Name": df["Category Name"], "rider_name": rider_name})[DUPLICATE_KEY]
+    reasons = _flag(reasons, key.duplicated(keep="first") & (rider_name != ""), "duplicate rider in race")
+
+    bad = reasons != ""
+    clean = df.loc[~bad].assign(**{col: values[~bad] for col, values in converted.items()})
+    rejected = df.loc[bad].assign(reason=[r.rstrip("; ") for r in reasons[bad]])
+    return clean, rejected
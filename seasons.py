@@ -0,0 +1,254 @@
+"""
+Season partitions and carried-forward career summaries
+Results are stored per season (data/clean/seasons/<season>/results.csv, written by
+rebuild_data.py). History features for a season only need that season's rows plus
+each rider's end-of-previous-season summary (career totals for every count / rate
+feature, and the last few values of every windowed source column), so a new season
+never rescans older ones. The features match a scan over the full history exactly.
+
+build() computes one season from its partition and the previous season's
+career_summary.csv and saves the season's features next to them, keyed by the hashes
+of both inputs; build_all() only rebuilds seasons whose inputs changed.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+import config
+import feature_spec
+import race_times
+from hashing import file_sha256, params_sha256
+from names import normalize_name
+
+UNDATED = "undated"  # rows without a race date: a season before every dated one (feature_spec.UNDATED_POSITION)
+
+# Previous races kept in the summary (longest window in config.FEATURE_SPEC)
+CARRIED_RACES = feature_spec.MAX_LOOKBACK
+
+# Totals and the last CARRIED_RACES values of each window source ("Place_5" is the most recent)
+SUMMARY_COLUMNS = (
+    ["rider_name_norm", "season", "races"]
+    + feature_spec.CAREER_SOURCES
+    + [f"{source}_{i}" for source in feature_spec.WINDOW_SOURCES for i in range(1, CARRIED_RACES + 1)]
+)
+DATE_COLUMNS = [f"race_date_{i}" for i in range(1, CARRIED_RACES + 1)]
+TOTAL_COLUMNS = ["races"] + feature_spec.CAREER_SOURCES
+
+# Columns added per results row
+CAREER_FEATURES = config.HISTORY_FEATURES + list(feature_spec.DERIVED_SOURCES)
+
+# One result per rider, race and category (rebuild_data.py drops repeats), so saved
+# season features join back onto results_all rows on these columns
+ROW_KEY = ["race_id", "Category Name", "rider_name"]
+
+
+def season_of(race_dates):
+    """Season label per race date: cyclocross seasons span the new year ("2024-25")"""
+    dates = pd.to_datetime(pd.Series(race_dates))
+    start_year = dates.dt.year - (dates.dt.month < config.SEASON_START_MONTH)
+    labels = start_year.astype("Int64").astype(str) + "-" + ((start_year + 1) % 100).astype("Int64").astype(str).str.zfill(2)
+    return labels.where(dates.notna(), UNDATED).to_numpy()
+
+
+def season_order(labels):
+    """Seasons in processing order (undated rows first, as the oldest history)"""
+    labels = set(labels)
+    return ([UNDATED] if UNDATED in labels else []) + sorted(labels - {UNDATED})
+
+
+def partition_dir(season, seasons_dir=None):
+    return (seasons_dir or config.SEASONS_DIR) / season
+
+
+def partition_file(season, seasons_dir=None):
+    return partition_dir(season, seasons_dir) / "results.csv"
+
+
+def write_partitions(results, seasons_dir=None):
+    """Store results as one CSV per season; returns {season: rows}"""
+    labels = season_of(results["race_date"])
+    counts = {}
+    for season in season_order(labels):
+        partition_dir(season, seasons_dir).mkdir(parents=True, exist_ok=True)
+        rows = results[labels == season]
+        rows.to_csv(partition_file(season, seasons_dir), index=False)
+        counts[season] = len(rows)
+    return counts
+
+
+def load_partition(season, seasons_dir=None):
+    return pd.read_csv(partition_file(season, seasons_dir), parse_dates=["race_date"])
+
+
+def empty_summary():
+    return pd.DataFrame(columns=SUMMARY_COLUMNS).astype({column: int for column in TOTAL_COLUMNS})
+
+
+def summary_file(season, seasons_dir=None):
+    return partition_dir(season, seasons_dir) / "career_summary.csv"
+
+
+def load_summary(season, seasons_dir=None):
+    """End-of-season summary for a season (empty if it was never built)"""
+    path = summary_file(season, seasons_dir)
+    if not path.exists():
+        return empty_summary()
+    return pd.read_csv(path, parse_dates=DATE_COLUMNS, float_precision="round_trip")
+
+
+def save_summary(season, summary, seasons_dir=None):
+    out_dir = partition_dir(season, seasons_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    summary.to_csv(summary_file(season, seasons_dir), index=False)
+
+
+def _carried_rows(summary):
+    """Each rider's last CARRIED_RACES results as stand-in history rows (window sources only)"""
+    frames = []
+    for i in range(1, CARRIED_RACES + 1):
+        # Position i exists for riders with at least CARRIED_RACES - i + 1 races
+        has_race = summary["races"] >= CARRIED_RACES - i + 1
+        frames.append(pd.DataFrame({
+            "rider_name_norm": summary.loc[has_race, "rider_name_norm"],
+            **{source: summary.loc[has_race, f"{source}_{i}"] for source in feature_spec.WINDOW_SOURCES},
+            "_order": i,
+        }))
+    carried = pd.concat(frames, ignore_index=True).astype(
+        {source: "datetime64[ns]" if source == "race_date" else float for source in feature_spec.WINDOW_SOURCES}
+    )
+    return carried.sort_values(["rider_name_norm", "_order"], kind="stable").drop(columns="_order")
+
+
+def _with_carried(rows, summary):
+    """Carried stand-in rows followed by the season's rows, per rider (stable, so dates stay in order)"""
+    carried = _carried_rows(summary[summary["rider_name_norm"].isin(rows["rider_name_norm"])])
+    combined = pd.concat([carried, rows[carried.columns.tolist() + feature_spec.CAREER_SOURCES]], ignore_index=True)
+    combined["_counted"] = np.r_[np.zeros(len(carried)), np.ones(len(rows))]
+    return combined.iloc[np.argsort(combined["rider_name_norm"].to_numpy(), kind="stable")], len(carried)
+
+
+def add_career_features(rows, summary=None):
+    """History features for one season's rows (sorted by rider, date) given the previous summary"""
+    summary = empty_summary() if summary is None else summary
+    rows = feature_spec.add_sources(rows)
+    combined, n_carried = _with_carried(rows, summary)
+
+    # Career totals carried in from earlier seasons, per row
+    totals = summary.set_index("rider_name_norm")[TOTAL_COLUMNS]
+    prior = totals.reindex(combined["rider_name_norm"]).fillna(0)
+
+    features = feature_spec.compute(combined, counted=combined["_counted"], prior=prior)
+    season_rows = np.argsort(combined.index.to_numpy())[n_carried:]  # combined index: carried first, then rows
+    return rows.assign(**{name: values[season_rows] for name, values in features.items()})
+
+
+def carry_forward(rows, summary, season):
+    """Summary at the end of a season: previous summary updated with the season's rows"""
+    summary = empty_summary() if summary is None else summary
+    rows = feature_spec.add_sources(rows)
+    history, _ = _with_carried(rows, summary)
+
+    rider = rows["rider_name_norm"]
+    season_totals = rows[feature_spec.CAREER_SOURCES].groupby(rider).sum().assign(races=rider.value_counts())
+    previous = summary.set_index("rider_name_norm")
+    for col in TOTAL_COLUMNS:
+        season_totals[col] += previous[col].reindex(season_totals.index).fillna(0).astype(int)
+
+    # Last CARRIED_RACES values of each window source (riders with fewer races keep NaN on the left)
+    last = history.groupby("rider_name_norm").tail(CARRIED_RACES)
+    last = last.assign(position=CARRIED_RACES - last.groupby("rider_name_norm").cumcount(ascending=False))
+    carried = []
+    for source in feature_spec.WINDOW_SOURCES:
+        wide = last.pivot(index="rider_name_norm", columns="position", values=source).reindex(columns=range(1, CARRIED_RACES + 1))
+        wide.columns = [f"{source}_{i}" for i in wide.columns]
+        carried.append(wide)
+
+    updated = season_totals.join(carried).rename_axis("rider_name_norm").reset_index().assign(season=season)
+    untouched = summary[~summary["rider_name_norm"].isin(updated["rider_name_norm"])]
+    return pd.concat([untouched, updated[SUMMARY_COLUMNS]], ignore_index=True).sort_values("rider_name_norm", ignore_index=True)
+
+
+def features_file(season, seasons_dir=None):
+    return partition_dir(season, seasons_dir) / "history_features.csv"
+
+
+def build_file(season, seasons_dir=None):
+    return partition_dir(season, seasons_dir) / "build.json"
+
+
+def history_sources(rows):
+    """A partition's rows with the columns the history features read, sorted by rider and HISTORY_ORDER"""
+    norm_lookup = {name: normalize_name(name) for name in rows["rider_name"].dropna().unique()}
+    rows = rows.assign(
+        rider_name_norm=rows["rider_name"].map(norm_lookup),
+        **{column: pd.to_numeric(rows[column], errors="coerce") for column in ["Carried Points", "Scored Points"]},
+    )
+    rows = race_times.add_time_columns(rows)
+    return rows.sort_values(
+        ["rider_name_norm", *feature_spec.HISTORY_ORDER], kind="stable", na_position=feature_spec.UNDATED_POSITION
+    )
+
+
+def build_key(season, previous=None, seasons_dir=None):
+    """Hashes of everything a season's features depend on"""
+    previous_summary = summary_file(previous, seasons_dir) if previous else None
+    return {
+        "partition": file_sha256(partition_file(season, seasons_dir)),
+        "previous_summary": (
+            file_sha256(previous_summary) if previous_summary is not None and previous_summary.exists() else None
+        ),
+        "feature_spec": params_sha256(config.FEATURE_SPEC),
+    }
+
+
+def is_current(season, previous=None, seasons_dir=None):
+    """True when a season's saved features were built from its current inputs"""
+    path = build_file(season, seasons_dir)
+    if not path.exists() or not features_file(season, seasons_dir).exists():
+        return False
+    return json.loads(path.read_text()) == build_key(season, previous, seasons_dir)
+
+
+def load_features(season, seasons_dir=None):
+    return pd.read_csv(features_file(season, seasons_dir), float_precision="round_trip")
+
+
+def build(season, previous=None, seasons_dir=None):
+    """History features (ROW_KEY + CAREER_FEATURES) for one season's partition
+
+    Reads only the season's partition and the previous season's summary; saves the
+    season's features, its end-of-season summary and the build key.
+    """
+    key = build_key(season, previous, seasons_dir)
+    summary = load_summary(previous, seasons_dir) if previous else empty_summary()
+    rows = add_career_features(history_sources(load_partition(season, seasons_dir)), summary)
+    save_summary(season, carry_forward(rows, summary, season), seasons_dir)
+
+    features = rows[ROW_KEY + CAREER_FEATURES]
+    features.to_csv(features_file(season, seasons_dir), index=False)
+    build_file(season, seasons_dir).write_text(json.dumps(key, indent=2))
+    return features
+
+
+def build_all(season_labels, seasons_dir=None):
+    """{season: (features, rebuilt)} in season order, rebuilding only seasons whose inputs changed
+
+    A rebuilt season whose summary comes out different changes the next season's key,
+    so changes carry forward to later seasons and no further.
+    """
+    built, previous = {}, None
+    for season in season_order(season_labels):
+        if is_current(season, previous, seasons_dir):
+            built[season] = load_features(season, seasons_dir), False
+        else:
+            built[season] = build(season, previous, seasons_dir), True
+        previous = season
+    return built
+
+
+if __name__ == "__main__":
+    seasons_dir = config.SEASONS_DIR
+    labels = [path.parent.name for path in seasons_dir.glob("*/results.csv")]
+    for season, (features, rebuilt) in build_all(labels).items():
+        print(f"✓ Season {season}: {len(features)} results ({'rebuilt' if rebuilt else 'unchanged'})")
@@ -0,0 +1,156 @@
+"""
+Shared read-only model and history store for multi-process serving
+A loader publishes a model version once: its compact forest arrays as plain .npy files,
+its metadata, and a hard link to the results database it was published with. Every
+worker (e.g. each Streamlit server process) memory-maps the same files, so the node
+arrays and history pages live once in the OS page cache however many workers run.
+
+Publishing writes a new store directory and then swaps the CURRENT pointer atomically;
+workers pick the new store up on their next request and old stores are pruned (mapped
+files stay valid for workers still attached to them).
+
+Usage: python shared_store.py --publish [--version VERSION]
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import config
+import model_registry
+import results_db
+from compact_forest import COMPACT_FILENAME, load_compact
+from hashing import file_sha256
+
+MANIFEST = "manifest.json"
+RESULTS_DB_NAME = "results.sqlite"
+
+
+def store_path(store_id, store_dir=None):
+    return (store_dir or config.SHARED_STORE_DIR) / store_id
+
+
+def current_id(store_dir=None):
+    """Store named by the CURRENT pointer (None if nothing is published)"""
+    pointer = (store_dir or config.SHARED_STORE_DIR) / "CURRENT"
+    if not pointer.exists():
+        return None
+    return pointer.read_text().strip() or None
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)  # results.sqlite is replaced (not rewritten) by add_features.py
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def publish(version=None, store_dir=None):
+    """Write a store for a registry version + the current results database; returns its id"""
+    store_dir = store_dir or config.SHARED_STORE_DIR
+    version = model_registry.resolve_version(version)
+    metadata = dict(model_registry.load_metadata(version), version=version)
+
+    compact_path = model_registry.version_dir(version) / COMPACT_FILENAME
+    if not compact_path.exists():
+        raise FileNotFoundError(f"No compact artifacts at {compact_path}. Run: python compact_forest.py --version {version}")
+
+    db_hash = file_sha256(config.RESULTS_DB)
+    store_id = f"{version}-{db_hash[:12]}"
+    out_dir = store_path(store_id, store_dir)
+
+    if not (out_dir / MANIFEST).exists():
+        tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        forests = load_compact(compact_path)
+        for name, arrays in forests.items():
+            for field, values in arrays.items():
+                np.save(tmp_dir / f"{name}.{field}.npy", np.asarray(values))
+        with open(tmp_dir / "metadata.json", "w") as f:
+            json.dump(metadata, f, indent=2)
+        _link_or_copy(config.RESULTS_DB, tmp_dir / RESULTS_DB_NAME)
+
+        manifest = {
+            "store_id": store_id,
+            "version": version,
+            "results_db_sha256": db_hash,
+            "forests": {name: sorted(arrays) for name, arrays in forests.items()},
+            "published_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(tmp_dir / MANIFEST, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_dir, out_dir)
+
+    # Atomic pointer swap: workers see the old store or the new one, never a mix
+    pointer = store_dir / "CURRENT"
+    tmp_pointer = pointer.with_suffix(".tmp")
+    tmp_pointer.write_text(store_id)
+    os.replace(tmp_pointer, pointer)
+
+    prune(store_dir=store_dir)
+    return store_id
+
+
+def prune(keep=None, store_dir=None):
+    """Delete all but the newest `keep` stores (never the current one)"""
+    store_dir = store_dir or config.SHARED_STORE_DIR
+    keep = config.SHARED_STORE_KEEP if keep is None else keep
+    stores = sorted(
+        (path for path in store_dir.iterdir() if (path / MANIFEST).exists()),
+        key=lambda path: (path / MANIFEST).stat().st_mtime, reverse=True,
+    )
+    current = current_id(store_dir)
+    for path in stores[keep:]:
+        if path.name != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def attach(store_id=None, store_dir=None):
+    """Memory-map a published store: {"store_id", "version", "metadata", "forests", "db"}
+
+    Nothing is copied into the process: forest arrays are read-only memmaps and the
+    results database is opened read-only with SQLite's mmap I/O.
+    """
+    store_id = store_id or current_id(store_dir)
+    if store_id is None:
+        raise FileNotFoundError(f"No shared store published in {store_dir or config.SHARED_STORE_DIR}. "
+                                f"Run: python shared_store.py --publish")
+    path = store_path(store_id, store_dir)
+    with open(path / MANIFEST, "r") as f:
+        manifest = json.load(f)
+    with open(path / "metadata.json", "r") as f:
+        metadata = json.load(f)
+
+    forests = {
+        name: {field: np.load(path / f"{name}.{field}.npy", mmap_mode="r") for field in fields}
+        for name, fields in manifest["forests"].items()
+    }
+    db = results_db.connect(path / RESULTS_DB_NAME)
+    db.execute(f"PRAGMA mmap_size = {config.SHARED_STORE_MMAP_BYTES}")
+    return {"store_id": store_id, "version": manifest["version"], "metadata": metadata, "forests": forests, "db": db}
+
+
+def load_unshared(version=None):
+    """Same structure as attach() for an unpublished version, loaded privately into this process"""
+    version = model_registry.resolve_version(version)
+    metadata = dict(model_registry.load_metadata(version), version=version)
+    forests = load_compact(model_registry.version_dir(version) / COMPACT_FILENAME)
+    return {"store_id": None, "version": version, "metadata": metadata, "forests": forests, "db": results_db.connect()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publish a model version to the shared serving store")
+    parser.add_argument("--publish", action="store_true", help="Publish and make it the current store")
+    parser.add_argument("--version", help="Model registry version (default: CURRENT)")
+    args = parser.parse_args()
+
+    if args.publish:
+        store_id = publish(args.version)
+        print(f"✓ Published {store_id} -> {store_path(store_id)}")
+    print(f"✓ Current store: {current_id()}")
@@ -0,0 +1,296 @@
+"""
+Split a combined multi-category startlist PDF into per-category startlists
+and predict every category concurrently in one process.
+
+UCI World Cup startlists (e.g. Tabor) bundle Men Junior, Women Junior, Men U23,
+Women Elite and Men Elite in one ChronoRace PDF. Each page starts with
+"Start time: <hh:mm> <category>" and lists riders in two columns.
+
+Usage:
+    python split_startlist.py --pdf data/startlists/STARTLIST__UCI-World-Cup__Tabor__2025-11-23__Tabor-CZECHIA__Men-Junior__Women-Junior__Men-U23__Women-Elite__Men-Elite.pdf --predict
+"""
+import argparse
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import config
+
+START_TIME_RE = re.compile(r"Start time:\s*\d{1,2}:\d{2}\s+(?P<category>.+)$", re.MULTILINE)
+STARTLIST_CSV_RE = re.compile(r"^.+?_(?P<category>(?:men|women)_[a-z0-9]+)_(?P<date>\d{4}-\d{2}-\d{2}|unknown)$")
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+STATUS_CODES = {"NCh", "CCh", "WCh", "WCL", "N", "S"}
+STATUS_PREFIX_RE = re.compile(r"^(?:NCh|CCh|WCh|WCL)")  # glued to the team name ("CChCRELAN-CORENDON")
+
+# Header columns (x position of these words marks each column in both halves)
+HEADER_WORDS = ["NAT", "YOB", "WCS", "UCI"]
+COLUMN_START_WORD = "NrName"
+
+
+def to_category_full(raw):
+    """Canonical category name (notebook 05 mapping, extended with startlist codes)"""
+    if not isinstance(raw, str) or not raw.strip():
+        return "Unknown"
+    key = re.sub(r"\s+", " ", raw.strip()).lower()
+    return config.CATEGORY_FULL_MAP.get(key, raw.strip())
+
+
+def _group_lines(words, tolerance=2):
+    """Group words into text lines by their vertical position"""
+    lines = []
+    for word in sorted(words, key=lambda w: (round(w["top"]), w["x0"])):
+        if lines and abs(word["top"] - lines[-1][0]) <= tolerance:
+            lines[-1][1].append(word)
+        else:
+            lines.append([word["top"], [word]])
+    return lines
+
+
+def _clean_token(token):
+    if token == "S-":  # substitute marker
+        return ""
+    return re.sub(r"^[\d*]+", "", token)  # bib / U23 marker glued to the name ("34ROCHETTE", "32*")
+
+
+def _parse_half(words, columns):
+    """Riders in one column of a startlist page
+
+    Every rider row is anchored on its NAT + YOB cells; the name sits on that line or
+    just above it (the line with a lowercase first name), the team (elite pages) below it.
+    """
+    riders = []
+    nat_x, yob_x, wcs_x, uci_x = (columns[name] for name in HEADER_WORDS)
+    name_words = [w for w in words if w["x0"] < nat_x - 5]
+
+    anchors = [
+        w for w in words
+        if abs(w["x0"] - nat_x) < 8 and re.fullmatch(r"[A-Z]{3}", w["text"])
+    ]
+
+    for anchor in anchors:
+        row = [w for w in words if abs(w["top"] - anchor["top"]) <= 2]
+        yob = next((w["text"] for w in row if abs(w["x0"] - yob_x) < 8 and re.fullmatch(r"\d{4}", w["text"])), None)
+        if yob is None:
+            continue
+
+        numbers = {}
+        for w in row:
+            if re.fullmatch(r"\d+", w["text"]) and w["x0"] > yob_x + 15:
+                numbers["wcs_rank" if w["x0"] < (wcs_x + uci_x) / 2 else "uci_rank"] = int(w["text"])
+
+        window = [w for w in name_words if -7 <= w["top"] - anchor["top"] <= 8]
+        candidates = []
+        for top, line_words in _group_lines(window):
+            tokens = [_clean_token(w["text"]) for w in sorted(line_words, key=lambda w: w["x0"])]
+            tokens = [t for t in tokens if t]
+            if top - anchor["top"] <= 1 and any(re.search(r"[a-zà-ÿ]", t) for t in tokens):
+                candidates.append((abs(top - anchor["top"]), top, tokens))
+        if not candidates:
+            continue
+        _, name_top, name_tokens = min(candidates)
+
+        # Bib: leftmost number in the row, on its own or glued to a name/team ("3VAN", "5PAUWELS")
+        bib_words = [w for w in window if w["top"] - anchor["top"] <= 2 and re.match(r"\*?\d+", w["text"])]
+        bib = re.match(r"\*?(\d+)", min(bib_words, key=lambda w: w["x0"])["text"]).group(1) if bib_words else None
+
+        team_tokens = [
+            STATUS_PREFIX_RE.sub("", _clean_token(w["text"]))
+            for w in sorted(window, key=lambda w: (round(w["top"]), w["x0"]))
+            if w["top"] - name_top > 2 and w["text"] not in STATUS_CODES
+        ]
+        team = " ".join(t for t in team_tokens if t)
+
+        riders.append({
+            "rider_name": " ".join(name_tokens),
+            "uci_points": None,
+            "team": team or None,
+            "bib": int(bib) if bib else None,
+            "nat": anchor["text"],
+            "yob": int(yob),
+            "wcs_rank": numbers.get("wcs_rank"),
+            "uci_rank": numbers.get("uci_rank"),
+            "_top": anchor["top"],
+        })
+
+    return riders
+
+
+def parse_combined_startlist(pdf_path):
+    """All riders in a combined startlist PDF, tagged with category_full"""
+    import pandas as pd
+    import pdfplumber
+
+    rows = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_number, page in enumerate(pdf.pages):
+            text = page.extract_text() or ""
+            match = START_TIME_RE.search(text)
+            if not match:
+                continue  # cover page / entries-by-nation summary
+            category_full = to_category_full(match.group("category"))
+
+            words = page.extract_words()
+            headers = [w for w in words if w["text"] in HEADER_WORDS]
+            header_top = min((w["top"] for w in headers), default=None)
+            if header_top is None:
+                continue
+
+            # Two columns per page: the right one starts at the second "NrName" header
+            # (numbers/markers like "*" sit slightly left of it)
+            column_starts = sorted(w["x0"] for w in words if w["text"] == COLUMN_START_WORD)
+            split_x = column_starts[-1] - 5 if len(column_starts) > 1 else page.width
+
+            for lo, hi in [(0, split_x), (split_x, page.width)]:
+                columns = {
+                    name: next((w["x0"] for w in headers if w["text"] == name and lo <= w["x0"] < hi), None)
+                    for name in HEADER_WORDS
+                }
+                if None in columns.values():
+                    continue
+                body = [w for w in words if lo <= w["x0"] < hi and w["top"] > header_top + 5]
+                for rider in _parse_half(body, columns):
+                    rider.update(category_full=category_full, _page=page_number, _half=lo)
+                    rows.append(rider)
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    # Startlist order: page, left column before right column, top to bottom
+    df = df.sort_values(["_page", "_half", "_top"]).drop(columns=["_page", "_half", "_top"])
+    for col in ["bib", "wcs_rank", "uci_rank"]:
+        df[col] = df[col].astype("Int64")
+    return df.reset_index(drop=True)
+
+
+def parse_race_context(pdf_path):
+    """(series, venue) from STARTLIST__Series__Race__YYYY-MM-DD__Location__... names"""
+    parts = Path(pdf_path).stem.split("__")
+    return (parts[1] if len(parts) > 1 else None), (parts[4] if len(parts) > 4 else None)
+
+
+def parse_event_from_filename(pdf_path):
+    """(event slug, race date) from STARTLIST__Series__Race__YYYY-MM-DD__Location__... names"""
+    parts = Path(pdf_path).stem.split("__")
+    date = next((p for p in parts if DATE_RE.fullmatch(p)), None)
+    event = parts[2] if len(parts) > 2 else Path(pdf_path).stem
+    return re.sub(r"[^a-z0-9]+", "_", event.lower()).strip("_"), date
+
+
+def parse_startlist_filename(csv_path):
+    """(category_full, race date) from the {event}_{category}_{YYYY-MM-DD}.csv names written below
+
+    Other names give no category, and the first YYYY-MM-DD in the name as the date.
+    """
+    stem = Path(csv_path).stem
+    match = STARTLIST_CSV_RE.match(stem)
+    if not match:
+        date = DATE_RE.search(stem)
+        return None, date.group(0) if date else None
+    date = match.group("date")
+    return to_category_full(match.group("category").replace("_", " ")), (None if date == "unknown" else date)
+
+
+def startlist_race_date(startlist_path, race_date=None):
+    """race_date, else the date in the startlist's file name (never today's date)"""
+    race_date = race_date or parse_startlist_filename(startlist_path)[1]
+    if race_date is None:
+        raise ValueError(f"No race date for {startlist_path}: pass --race-date or put YYYY-MM-DD in the file name")
+    return race_date
+
+
+def split_startlist(pdf_path, out_dir=None, event=None, race_date=None, force=False):
+    """Write one startlist CSV per category; returns {category_full: csv_path}
+
+    Existing startlists (e.g. hand-split ones in data/startlists) are never overwritten
+    unless force=True: nothing is written when any output file already exists.
+    """
+    out_dir = Path(out_dir or config.DATA_DIR / "startlists")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    parsed_event, parsed_date = parse_event_from_filename(pdf_path)
+    event = event or parsed_event
+    race_date = race_date or parsed_date or "unknown"
+
+    riders = parse_combined_startlist(pdf_path)
+    if riders.empty:
+        print(f"✗ No riders found in {pdf_path}")
+        return {}
+
+    groups = {
+        category_full: (group, out_dir / f"{event}_{category_full.lower().replace(' ', '_')}_{race_date}.csv")
+        for category_full, group in riders.groupby("category_full", sort=False)
+    }
+    existing = [out_path for _, out_path in groups.values() if out_path.exists()]
+    if existing and not force:
+        print(f"✗ Not overwriting {len(existing)} existing startlists (use --force or --out-dir):")
+        for out_path in existing:
+            print(f"    {out_path}")
+        return {}
+
+    paths = {}
+    for category_full, (group, out_path) in groups.items():
+        group.to_csv(out_path, index=False)
+        paths[category_full] = out_path
+        print(f"  ✓ {category_full:14s} {len(group):3d} riders -> {out_path}")
+
+    return paths
+
+
+def predict_categories(startlists, output_dir=None, max_workers=None, race_date=None, venue=None, series=None):
+    """Predict every category concurrently, sharing one set of loaded models + snapshot"""
+    from predict_fast import load_artifacts, load_rankings, predict_fast
+    import affinity
+    import rider_snapshot
+
+    output_dir = Path(output_dir or config.CLEAN_DIR)
+    artifacts = load_artifacts()
+    snapshot = rider_snapshot.load_snapshot()
+    rankings = load_rankings()
+    affinity_lookup = affinity.load_lookup()
+
+    def run(item):
+        category_full, startlist_path = item
+        output_path = output_dir / f"predictions_{Path(startlist_path).stem}.csv"
+        predictions = predict_fast(
+            startlist_path, category_full, output_path,
+            artifacts=artifacts, snapshot=snapshot, verbose=False,
+            race_date=race_date, rankings=rankings,
+            venue=venue, series=series, affinity_lookup=affinity_lookup,
+        )
+        return category_full, output_path, predictions
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(startlists) or 1) as pool:
+        results = list(pool.map(run, startlists.items()))
+
+    for category_full, output_path, predictions in results:
+        top10 = [p for p in predictions if p["Predicted Finish"] == "Top-10"]
+        print(f"\n{category_full}: {len(predictions)} riders, {len(top10)} predicted Top-10 -> {output_path}")
+        for p in predictions[:3]:
+            print(f"  {p['Rider']:30s}  Top-10: {p['Top-10 Probability']:5.1%}  |  Podium: {p['Top-3 Probability']:5.1%}")
+
+    return {category_full: output_path for category_full, output_path, _ in results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a combined startlist PDF by category")
+    parser.add_argument("--pdf", required=True, help="Combined startlist PDF")
+    parser.add_argument("--out-dir", help="Where to write per-category startlists (default: data/startlists)")
+    parser.add_argument("--event", help="Event slug for output names (default: from filename)")
+    parser.add_argument("--date", help="Race date YYYY-MM-DD (default: from filename)")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing per-category startlists")
+    parser.add_argument("--predict", action="store_true", help="Also run predictions for every category")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"SPLITTING STARTLIST: {Path(args.pdf).name}")
+    print("=" * 70)
+
+    startlists = split_startlist(args.pdf, args.out_dir, args.event, args.date, force=args.force)
+
+    if args.predict and startlists:
+        print("\n" + "=" * 70)
+        print(f"PREDICTING {len(startlists)} CATEGORIES")
+        print("=" * 70)
+        race_date = args.date or parse_event_from_filename(args.pdf)[1]
+        series, venue = parse_race_context(args.pdf)
+        predict_categories(startlists, race_date=race_date, venue=venue, series=series)
@@ -0,0 +1,134 @@
+"""
+Team registry: raw team strings -> canonical team IDs, team tier and team strength
+Sponsor renames (ALPECIN-DECEUNINCK -> CRELAN-CORENDON, BALOISE TREK LIONS -> BALOISE
+GLOWI LIONS) map to one ID through config.TEAM_REGISTRY; unregistered teams get an ID
+from their normalized name. Each distinct string is classified once and broadcast back
+to the rows. Team strength is the team's smoothed Top-10 rate over its earlier race
+days, so it updates after every race without looking at the race being predicted.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import config
+
+NO_TEAM = "no_team"
+TOP_TEAM = "top_team"
+OTHER_TEAM = "other_team"
+
+# One pattern per registered team, whole words of the normalized name, in registry order
+ALIAS_PATTERNS = [
+    (team_id, re.compile(r"\b(?:" + "|".join(re.escape(alias) for alias in entry["aliases"]) + r")\b"))
+    for team_id, entry in config.TEAM_REGISTRY.items()
+]
+TOP_TEAM_IDS = [team_id for team_id, entry in config.TEAM_REGISTRY.items() if entry["top"]]
+
+
+def normalize_team(name):
+    """Upper-case ASCII words: "Charles Liégeois Roastery-CX" -> "CHARLES LIEGEOIS ROASTERY CX" """
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^A-Z0-9]+", " ", text.upper()).split())
+
+
+def canonical_team(name):
+    """Canonical team ID for one raw team string (None for a missing or empty team)"""
+    if name is None or pd.isna(name):
+        return None
+    normalized = normalize_team(name)
+    if not normalized:
+        return None
+    for team_id, pattern in ALIAS_PATTERNS:
+        if pattern.search(normalized):
+            return team_id
+    return normalized.lower().replace(" ", "_")
+
+
+def canonical_teams(names):
+    """Canonical team ID per row (None without a team), classifying each distinct string once"""
+    codes, uniques = pd.factorize(pd.Series(names))
+    # Missing names get code -1, which picks the trailing None
+    ids = np.array([canonical_team(name) for name in uniques] + [None], dtype=object)
+    return ids[codes]
+
+
+def team_tiers(team_ids):
+    """team_tier level per row: top_team for registered top teams, other_team, or no_team"""
+    team_ids = np.asarray(team_ids, dtype=object)
+    return np.where(
+        pd.isna(team_ids), NO_TEAM, np.where(np.isin(team_ids, TOP_TEAM_IDS), TOP_TEAM, OTHER_TEAM)
+    )
+
+
+def _team_days(team_ids, race_dates, places):
+    """Top-10 finishes and results per team and race day, in date order within each team"""
+    frame = pd.DataFrame({
+        "team_id": np.asarray(team_ids, dtype=object),
+        # Undated results count as the team's oldest
+        "race_date": pd.to_datetime(pd.Series(np.asarray(race_dates))).fillna(pd.Timestamp.min),
+        "hits": (pd.to_numeric(pd.Series(np.asarray(places)), errors="coerce") <= 10).astype(int).to_numpy(),
+    })
+    frame = frame[frame["team_id"].notna()]
+    days = frame.groupby(["team_id", "race_date"]).agg(hits=("hits", "sum"), results=("hits", "size"))
+    return days.sort_index()
+
+
+def smoothed_strength(hits, results):
+    """Top-10 rate shrunk towards TEAM_STRENGTH_PRIOR with TEAM_STRENGTH_SMOOTHING pseudo-results"""
+    k = config.TEAM_STRENGTH_SMOOTHING
+    return (hits + k * config.TEAM_STRENGTH_PRIOR) / (results + k)
+
+
+def team_strength(team_ids, race_dates, places):
+    """Team strength per row before its race day (NaN without a team)
+
+    The team's Top-10 finishes / results on all earlier race days, shrunk towards
+    TEAM_STRENGTH_PRIOR with TEAM_STRENGTH_SMOOTHING pseudo-results.
+    """
+    days = _team_days(team_ids, race_dates, places)
+    by_team = days.groupby(level="team_id")
+    before = smoothed_strength(by_team["hits"].cumsum() - days["hits"], by_team["results"].cumsum() - days["results"])
+
+    keys = pd.MultiIndex.from_arrays([
+        np.asarray(team_ids, dtype=object),
+        pd.to_datetime(pd.Series(np.asarray(race_dates))).fillna(pd.Timestamp.min),
+    ])
+    return before.reindex(keys).to_numpy(dtype=np.float64)
+
+
+def team_table(team_ids, race_dates, places):
+    """Current strength of every team after all its races, strongest first"""
+    totals = _team_days(team_ids, race_dates, places).groupby(level="team_id").sum()
+    return (
+        totals.assign(strength=smoothed_strength(totals["hits"], totals["results"]), top=totals.index.isin(TOP_TEAM_IDS))
+        .sort_values("strength", ascending=False)
+    )
+
+
+def add_team_columns(results):
+    """team_id, team_tier and team_strength columns for a results table"""
+    team_ids = canonical_teams(results["Team Name"])
+    return results.assign(
+        team_id=team_ids,
+        team_tier=team_tiers(team_ids),
+        team_strength=team_strength(team_ids, results["race_date"], results["Place"]),
+    )
+
+
+if __name__ == "__main__":
+    results = pd.read_csv(config.RESULTS_ALL, low_memory=False)
+    names = results["Team Name"].dropna().unique()
+    ids = canonical_teams(names)
+    print(f"✓ {len(names)} team names -> {len(set(ids))} teams")
+    for team_id in sorted(set(ids)):
+        aliases = sorted(name for name, i in zip(names, ids) if i == team_id)
+        if len(aliases) > 1:
+            print(f"  {team_id}: {' | '.join(aliases)}")
+
+    team_ids = canonical_teams(results["Team Name"])
+    table = team_table(team_ids, results["race_date"], results["Place"])
+    print("\nTeam strength (smoothed Top-10 rate):")
+    for team_id, row in table.iterrows():
+        marker = "★" if row["top"] else " "
+        print(f"  {marker} {team_id:45s} {row['strength']:5.1%}  ({int(row['hits'])}/{int(row['results'])})")
@@ -1,119 +1,100 @@
 """
 Train improved model with real features + calculate business-relevant metrics
 Focus: Top-10 prediction accuracy (who scores points?)
+Usage: python train_model_v2.py [--per-category]   # also fit one model per race category
 """
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import (
     mean_absolute_error,
     accuracy_score,
     classification_report,
     roc_auc_score
 )
-import joblib
-import json
+import sys
+import config
+import drift
+import model_registry
+from category_models import evaluate, fit_parallel, make_tasks
+from preprocessing import FeaturePreprocessor, load_feature_matrix
+from compact_forest import COMPACT_FILENAME, save_compact
 
 DATA_DIR = Path("data")
 CLEAN_DIR = DATA_DIR / "clean"
 MODELS_DIR = Path("models")
 MODELS_DIR.mkdir(exist_ok=True)
 
+parser = argparse.ArgumentParser(description="Train the Top-10 / Top-3 models")
+parser.add_argument("--per-category", action="store_true",
+                    help="Also fit Top-10 / Top-3 models per race category (in parallel with the global ones)")
+args = parser.parse_args()
+
 print("=" * 60)
 print("TRAINING IMPROVED MODEL - TOP-10 PREDICTION")
 print("=" * 60)
 
-# Load enriched data
 results_path = CLEAN_DIR / "results_with_features.csv"
-print(f"\nLoading: {results_path}")
-df = pd.read_csv(results_path, parse_dates=["race_date"])
 
-print(f"Total observations: {len(df)}")
-print(f"Date range: {df['race_date'].min()} to {df['race_date'].max()}")
+# Everything that determines the trained models (besides the data itself)
+numeric_features = config.NUMERIC_FEATURES
+categorical_features = config.CATEGORICAL_FEATURES
+preprocessor = FeaturePreprocessor()
+
+train_params = {
+    "model_params": config.MODEL_PARAMS,
+    "preprocessor": preprocessor.to_dict(),
+    "train_test_split": config.TRAIN_TEST_SPLIT,
+}
+if args.per_category:
+    train_params["per_category"] = {"min_rows": config.CATEGORY_MODEL_MIN_ROWS}
+
+# Skip training entirely if this data + params combination is already registered
+version, data_hash = model_registry.compute_version(results_path, train_params)
+print(f"\nModel version: {version}")
+
+if model_registry.version_exists(version):
+    model_registry.set_current(version)
+    print(f"✓ Identical data + params already trained, using registered version {version}")
+    print(f"  ({model_registry.version_dir(version)})")
+    sys.exit(0)
+
+# Load encoded feature matrix (valid results only, cached by features file hash)
+print(f"\nLoading: {results_path}")
+matrix = load_feature_matrix(results_path, preprocessor, data_hash=data_hash)
 
-# Filter to valid results
-df = df[df["Place"].notna() & (df["Place"] > 0)].copy()
-print(f"Valid results: {len(df)}")
+X = matrix["X"]
+feature_names = matrix["columns"]
+y_top10 = matrix["is_top10"]
+y_top3 = matrix["is_top3"]
+race_dates = matrix["race_date"]
 
-# Create target variables
-df["is_top10"] = (df["Place"] <= 10).astype(int)
-df["is_top3"] = (df["Place"] <= 3).astype(int)
+print(f"Valid results: {len(X)}")
+print(f"Date range: {race_dates.min()} to {race_dates.max()}")
 
 print(f"\nTarget distribution:")
-print(f"  Top-10 finishes: {df['is_top10'].sum()} ({100*df['is_top10'].mean():.1f}%)")
-print(f"  Top-3 finishes: {df['is_top3'].sum()} ({100*df['is_top3'].mean():.1f}%)")
+print(f"  Top-10 finishes: {y_top10.sum()} ({100*y_top10.mean():.1f}%)")
+print(f"  Top-3 finishes: {y_top3.sum()} ({100*y_top3.mean():.1f}%)")
 
 # Define feature set
 print("\n" + "=" * 60)
 print("FEATURE SELECTION")
 print("=" * 60)
 
-numeric_features = [
-    "uci_points_normalized",
-    "races_so_far",
-    "avg_place_last3",
-    "best_place_last5",
-    "last_place",
-    "days_since_last_race",
-    "last_carried_points",
-    "last_scored_points",
-    "top3_rate_career",
-    "top10_rate_career",
-    "series_appearances",
-    "is_elite",
-    "is_women"
-]
-
-categorical_features = [
-    "points_tier",
-    "team_tier"
-]
-
 print(f"\nNumeric features: {len(numeric_features)}")
 for f in numeric_features:
     print(f"  - {f}")
 
 print(f"\nCategorical features: {len(categorical_features)}")
 for f in categorical_features:
-    print(f"  - {f}")
-
-# Prepare features
-X = df[numeric_features + categorical_features].copy()
-y_top10 = df["is_top10"].copy()
-y_top3 = df["is_top3"].copy()
-
-# One-hot encode categoricals
-X = pd.get_dummies(X, columns=categorical_features, drop_first=True)
-
-# Fill NaN with smart defaults
-print("\n" + "=" * 60)
-print("HANDLING MISSING VALUES")
-print("=" * 60)
+    print(f"  - {f}: {preprocessor.categorical_levels[f]}")
 
-# For first-time riders, use UCI points as proxy for historical performance
-median_place = df["Place"].median()
-
-fill_values = {
-    "uci_points_normalized": 0,  # New rider
-    "races_so_far": 0,
-    "avg_place_last3": median_place,
-    "best_place_last5": median_place,
-    "last_place": median_place,
-    "days_since_last_race": 14,  # Typical race frequency
-    "last_carried_points": 0,
-    "last_scored_points": 0,
-    "top3_rate_career": 0,
-    "top10_rate_career": 0,
-    "series_appearances": 0,
-    "is_elite": 0,
-    "is_women": 0
-}
-
-X = X.fillna(fill_values)
-
-print(f"\nMissing values after fill: {X.isna().sum().sum()}")
+# Missing values are filled by the preprocessor (config.FILL_VALUES, same as prediction)
+print(f"\nEncoded columns: {len(feature_names)}")
+print(f"Missing values after fill: {int(np.isnan(X).sum())}")
 
 # Train/test split by DATE (chronological)
 print("\n" + "=" * 60)
@@ -121,40 +102,40 @@ print("TRAIN/TEST SPLIT (CHRONOLOGICAL)")
 print("=" * 60)
 
 # Use early races for train, recent races for test
-df_sorted = df.sort_values("race_date")
-split_idx = int(len(df_sorted) * 0.8)
+order = np.argsort(race_dates, kind="stable")
+split_idx = int(len(order) * config.TRAIN_TEST_SPLIT)
 
-train_indices = df_sorted.index[:split_idx]
-test_indices = df_sorted.index[split_idx:]
+train_indices = np.sort(order[:split_idx])
+test_indices = np.sort(order[split_idx:])
 
-X_train = X.loc[train_indices]
-X_test = X.loc[test_indices]
-y_top10_train = y_top10.loc[train_indices]
-y_top10_test = y_top10.loc[test_indices]
-y_top3_train = y_top3.loc[train_indices]
-y_top3_test = y_top3.loc[test_indices]
+X_train = X[train_indices]
+X_test = X[test_indices]
+y_top10_train = y_top10[train_indices]
+y_top10_test = y_top10[test_indices]
+y_top3_train = y_top3[train_indices]
+y_top3_test = y_top3[test_indices]
 
 print(f"\nTrain set: {len(X_train)} observations")
 print(f"Test set: {len(X_test)} observations")
-print(f"Train date range: {df_sorted.loc[train_indices, 'race_date'].min()} to {df_sorted.loc[train_indices, 'race_date'].max()}")
-print(f"Test date range: {df_sorted.loc[test_indices, 'race_date'].min()} to {df_sorted.loc[test_indices, 'race_date'].max()}")
+print(f"Train date range: {race_dates[train_indices].min()} to {race_dates[train_indices].max()}")
+print(f"Test date range: {race_dates[test_indices].min()} to {race_dates[test_indices].max()}")
 
-# Train Top-10 classifier
+# Fit every (target, category) model at once in a process pool sharing the cached X.npy
 print("\n" + "=" * 60)
-print("TRAINING TOP-10 CLASSIFIER")
+print("TRAINING MODELS (PARALLEL)")
 print("=" * 60)
 
-model_top10 = RandomForestClassifier(
-    n_estimators=300,
-    max_depth=15,
-    min_samples_split=10,
-    random_state=42,
-    n_jobs=-1,
-    class_weight="balanced"  # Handle class imbalance
-)
+tasks = make_tasks(matrix, train_indices, test_indices, per_category=args.per_category)
+models, task_metrics = fit_parallel(matrix["path"] / "X.npy", tasks)  # class_weight="balanced" handles imbalance
+for name, m in task_metrics.items():
+    print(f"✓ {name}: {m['train_size']} rows, {m['fit_seconds']:.1f}s")
 
-model_top10.fit(X_train, y_top10_train)
-print("✓ Model trained")
+model_top10 = models["top10_classifier"]
+model_top3 = models["top3_classifier"]
+
+print("\n" + "=" * 60)
+print("TOP-10 CLASSIFIER")
+print("=" * 60)
 
 # Predict
 y_top10_pred = model_top10.predict(X_test)
@@ -175,7 +156,8 @@ print("\nClassification Report:")
 print(classification_report(y_top10_test, y_top10_pred, target_names=["Outside Top-10", "Top-10"]))
 
 # Calculate baseline (always predict by UCI points)
-baseline_pred = (df.loc[test_indices, "uci_points_normalized"] > df.loc[test_indices, "uci_points_normalized"].median()).astype(int)
+uci_points_test = X_test[:, feature_names.index("uci_points_normalized")]
+baseline_pred = (uci_points_test > np.median(uci_points_test)).astype(int)
 baseline_acc = accuracy_score(y_top10_test, baseline_pred)
 print(f"\nBaseline (UCI points only): {100*baseline_acc:.1f}%")
 print(f"Improvement over baseline: +{100*(accuracy - baseline_acc):.1f}%")
@@ -186,47 +168,74 @@ print("FEATURE IMPORTANCE")
 print("=" * 60)
 
 feature_importance = pd.DataFrame({
-    'feature': X.columns,
+    'feature': feature_names,
     'importance': model_top10.feature_importances_
 }).sort_values('importance', ascending=False)
 
 print("\nTop 10 features:")
 print(feature_importance.head(10).to_string(index=False))
 
-# Train Top-3 classifier (bonus)
+# Top-3 classifier (bonus)
 print("\n" + "=" * 60)
-print("TRAINING TOP-3 CLASSIFIER (PODIUM)")
+print("TOP-3 CLASSIFIER (PODIUM)")
 print("=" * 60)
 
-model_top3 = RandomForestClassifier(
-    n_estimators=300,
-    max_depth=15,
-    min_samples_split=10,
-    random_state=42,
-    n_jobs=-1,
-    class_weight="balanced"
-)
-
-model_top3.fit(X_train, y_top3_train)
 y_top3_pred = model_top3.predict(X_test)
 
 accuracy_top3 = accuracy_score(y_top3_test, y_top3_pred)
 print(f"\n✓ TOP-3 ACCURACY: {100*accuracy_top3:.1f}%")
 
+# Per-category test metrics: the global models vs each category's own models (if trained)
+print("\n" + "=" * 60)
+print("PER-CATEGORY METRICS")
+print("=" * 60)
+
+test_categories = matrix["category"][test_indices]
+category_models = {}
+category_metrics = {}
+for task in tasks:
+    if task["category"]:
+        category_models.setdefault(task["category"], {})[task["target"]] = task["name"]
+
+for category in sorted(set(test_categories) - {""}):
+    in_category = test_categories == category
+    category_metrics[category] = {}
+    for target, y_test in [("top10_classifier", y_top10_test), ("top3_classifier", y_top3_test)]:
+        scores = {"global": evaluate(models[target], X_test[in_category], y_test[in_category])}
+        own_name = category_models.get(category, {}).get(target)
+        if own_name:
+            scores["category"] = task_metrics[own_name]
+        category_metrics[category][target] = scores
+
+        line = f"  {category:13s} {target:17s} n={scores['global']['test_size']:4d}  global {100*scores['global']['accuracy']:5.1f}%"
+        if own_name:
+            line += f"  category model {100*scores['category']['accuracy']:5.1f}%"
+        print(line)
+
 # Save models
 print("\n" + "=" * 60)
 print("SAVING MODELS")
 print("=" * 60)
 
-joblib.dump(model_top10, MODELS_DIR / "top10_classifier.joblib")
-joblib.dump(model_top3, MODELS_DIR / "top3_classifier.joblib")
+# Inference latency on startlist-sized batches (recorded with the model version)
+latency = {
+    "top10_classifier": model_registry.benchmark_latency(model_top10, X_test),
+    "top3_classifier": model_registry.benchmark_latency(model_top3, X_test),
+}
+for name, bench in latency.items():
+    print(f"  {name}: {bench['single_row_ms']:.1f} ms/rider, {bench['batch_ms']:.1f} ms per {bench['batch_size']} riders")
 
 # Save metadata
 meta = {
-    "features": X.columns.tolist(),
+    "data_path": str(results_path),
+    "data_hash": data_hash,
+    "params": train_params,
+    "features": feature_names,
     "numeric_features": numeric_features,
     "categorical_features": categorical_features,
-    "fill_values": fill_values,
+    "fill_values": preprocessor.fill_values,
+    "preprocessor": preprocessor.to_dict(),
+    "feature_matrix": str(matrix["path"]),
     "top10_accuracy": float(accuracy),
     "top10_auc": float(auc) if auc > 0 else None,
     "top3_accuracy": float(accuracy_top3),
@@ -234,16 +243,25 @@ meta = {
     "improvement_vs_baseline": float(accuracy - baseline_acc),
     "train_size": len(X_train),
     "test_size": len(X_test),
+    "train_end_date": str(race_dates[train_indices].max()),
+    "category_models": category_models,
+    "category_metrics": category_metrics,
+    "fit_metrics": task_metrics,
+    "latency_ms": latency,
+    "feature_histograms": drift.training_histograms(X_train, feature_names, matrix["category"][train_indices]),
     "training_date": str(pd.Timestamp.now())
 }
 
-with open(MODELS_DIR / "model_metadata.json", "w") as f:
-    json.dump(meta, f, indent=2)
+out_dir = model_registry.save_version(version, models, meta)
+
+# Plain NumPy node arrays for the lean prediction CLI (no sklearn import needed)
+save_compact(out_dir / COMPACT_FILENAME, models)
 
-print(f"✓ Saved models to {MODELS_DIR}/")
-print(f"  - top10_classifier.joblib")
-print(f"  - top3_classifier.joblib")
-print(f"  - model_metadata.json")
+print(f"✓ Saved model version {version} to {out_dir}/")
+for name in models:
+    print(f"  - {name}.joblib")
+print(f"  - {COMPACT_FILENAME}")
+print(f"  - metadata.json")
 
 # Summary
 print("\n" + "=" * 60)
@@ -257,9 +275,9 @@ print(f"  Baseline (UCI only): {100*baseline_acc:.1f}%")
 print(f"  Improvement: +{100*(accuracy - baseline_acc):.1f}%")
 
 print(f"\n✅ DATA:")
-print(f"  Total races: {df['race_id'].nunique()}")
-print(f"  Total riders: {df['rider_name'].nunique()}")
-print(f"  Total observations: {len(df)}")
+print(f"  Total races: {matrix['schema']['n_races']}")
+print(f"  Total riders: {matrix['schema']['n_riders']}")
+print(f"  Total observations: {len(X)}")
 
 print(f"\n✅ READY FOR USER TESTING:")
 print(f"  Model predicts which riders will finish Top-10")
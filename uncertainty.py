@@ -0,0 +1,57 @@
+"""
+Per-rider uncertainty from the individual trees of a forest
+One vectorized traversal gives every tree's leaf probability for the whole startlist
+(riders x trees). Their spread says how much the trees disagree about a rider; resampling
+the trees (bootstrap over the forest's columns) gives an interval for the forest's
+probability, and a rider whose interval contains the decision threshold is a borderline call.
+"""
+import numpy as np
+
+import config
+from compact_forest import apply_forest
+
+UNCERTAINTY_COLUMNS = ["Top-10 Low", "Top-10 High", "Tree Vote Spread", "Borderline"]
+
+
+def tree_probabilities(forest, X):
+    """Leaf probability of every tree for every row: (n_rows, n_trees)"""
+    return forest["proba"][apply_forest(forest, X)]
+
+
+def bootstrap_interval(tree_probs, n_boot=None, level=None, seed=0):
+    """(low, high) percentile interval of the forest mean over trees resampled with replacement"""
+    n_boot = n_boot or config.UNCERTAINTY_BOOTSTRAPS
+    level = level or config.UNCERTAINTY_LEVEL
+    n_rows, n_trees = tree_probs.shape
+    if n_rows == 0:
+        return np.zeros(0), np.zeros(0)
+
+    # The same resampled tree sets for every rider: (n_rows, n_boot) means from one matrix product
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, n_trees, (n_boot, n_trees)) + n_trees * np.arange(n_boot)[:, None]
+    counts = np.bincount(draws.ravel(), minlength=n_boot * n_trees).reshape(n_boot, n_trees)
+    means = tree_probs @ counts.T / n_trees
+
+    tail = 100 * (1 - level) / 2
+    low, high = np.percentile(means, [tail, 100 - tail], axis=1)
+    return low, high
+
+
+def rider_uncertainty(forest, X, threshold):
+    """{column: array} of UNCERTAINTY_COLUMNS for a startlist"""
+    tree_probs = tree_probabilities(forest, X)
+    low, high = bootstrap_interval(tree_probs)
+    return {
+        "Top-10 Low": low,
+        "Top-10 High": high,
+        "Tree Vote Spread": tree_probs.std(axis=1),
+        "Borderline": (low <= threshold) & (high > threshold),
+    }
+
+
+def rows(uncertainty, i):
+    """Plain-float values of rider i for a predictions row"""
+    return {
+        column: bool(values[i]) if column == "Borderline" else float(values[i])
+        for column, values in uncertainty.items()
+    }
@@ -0,0 +1,200 @@
+"""
+Incremental model update after a race weekend
+Grows the CURRENT forests with new trees fitted only on training rows the version
+has not seen (warm start), optionally retiring the same number of oldest trees so
+the forest keeps its size. Refresh time depends on the new rows, not the history.
+
+Guard: the updated Top-10 model is scored on the chronological test window next to
+the last full retrain (the lineage's base version). It only becomes CURRENT when its
+AUC is within config.UPDATE_MAX_AUC_DROP; --full-check also fits a full retrain on the
+same split for an exact comparison (slow, e.g. once a month).
+
+Usage: python update_model.py [--new-trees 50] [--retire] [--full-check]
+"""
+import argparse
+import time
+
+import numpy as np
+
+import config
+import drift
+import model_registry
+from category_models import TARGETS, evaluate, fit_parallel, make_tasks
+from compact_forest import COMPACT_FILENAME, save_compact
+from preprocessing import FeaturePreprocessor, load_feature_matrix
+
+
+def grow_forest(model, X_new, y_new, new_trees, retire=False, y_all=None):
+    """Add new_trees fitted on (X_new, y_new) to a fitted forest (in place); returns trees retired
+
+    y_all: targets of the whole training window, so "balanced" class weights for the new
+    trees reflect the full class balance rather than one weekend's.
+    """
+    from sklearn.utils.class_weight import compute_class_weight
+
+    n_trees = len(model.estimators_)
+    original_weight = class_weight = model.class_weight
+    if class_weight == "balanced" and y_all is not None:
+        classes = np.unique(y_all)
+        class_weight = dict(zip(classes, compute_class_weight("balanced", classes=classes, y=y_all)))
+
+    # warm_start keeps the fitted trees; the random state is advanced so new trees differ
+    model.set_params(warm_start=True, n_estimators=n_trees + new_trees, class_weight=class_weight)
+    model.fit(X_new, y_new)
+    model.set_params(warm_start=False, class_weight=original_weight)
+
+    retired = 0
+    if retire:
+        retired = new_trees
+        model.estimators_ = model.estimators_[retired:]
+        model.set_params(n_estimators=len(model.estimators_))
+    return retired
+
+
+def format_metric(value, spec):
+    """A guard metric for printing ("n/a" when the window could not score it)"""
+    return "n/a" if value is None else format(value, spec)
+
+
+def model_targets(metadata):
+    """{model name: (target, category)} for every model in a version"""
+    targets = {target: (target, None) for target in model_registry.GLOBAL_MODELS}
+    for category, names in metadata.get("category_models", {}).items():
+        for target, name in names.items():
+            targets[name] = (target, category)
+    return targets
+
+
+def chronological_split(race_dates):
+    """Same train / test split as train_model_v2.py"""
+    order = np.argsort(race_dates, kind="stable")
+    split_idx = int(len(order) * config.TRAIN_TEST_SPLIT)
+    return np.sort(order[:split_idx]), np.sort(order[split_idx:])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add trees fitted on new races to the current models")
+    parser.add_argument("--version", help="Version to update (default: CURRENT)")
+    parser.add_argument("--new-trees", type=int, default=config.UPDATE_NEW_TREES, help="Trees added per model")
+    parser.add_argument("--retire", action="store_true", help="Drop as many of the oldest trees as are added")
+    parser.add_argument("--full-check", action="store_true", help="Also fit a full retrain and compare on the test window")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("INCREMENTAL MODEL UPDATE")
+    print("=" * 60)
+
+    import joblib
+
+    parent_version = model_registry.resolve_version(args.version)
+    parent = model_registry.load_metadata(parent_version)
+    base_version = parent.get("base_version", parent_version)  # last full retrain in this lineage
+    print(f"\nParent version: {parent_version} (base: {base_version}, trained through {parent['train_end_date']})")
+
+    results_path = config.RESULTS_WITH_FEATURES
+    preprocessor = FeaturePreprocessor.from_metadata(parent)
+    update_params = {"new_trees": args.new_trees, "retire": args.retire}
+    version, data_hash = model_registry.compute_version(
+        results_path, {"parent": parent_version, "update": update_params}
+    )
+    if model_registry.version_exists(version):
+        print(f"✓ This update is already registered as {version}")
+        raise SystemExit(0)
+
+    matrix = load_feature_matrix(results_path, preprocessor, data_hash=data_hash)
+    X, race_dates = matrix["X"], matrix["race_date"]
+    train_indices, test_indices = chronological_split(race_dates)
+
+    # Training rows the parent has not seen: everything dated after its training window
+    new_indices = train_indices[race_dates[train_indices] > np.datetime64(parent["train_end_date"][:10])]
+    print(f"New training rows: {len(new_indices)} (of {len(train_indices)}), "
+          f"train window now ends {race_dates[train_indices].max()}")
+    if len(new_indices) == 0:
+        print("✓ No new races since the parent version, nothing to update")
+        raise SystemExit(0)
+
+    # Grow every model of the parent on its share of the new rows
+    start = time.perf_counter()
+    models = {}
+    update_stats = {}
+    for name, (target, category) in model_targets(parent).items():
+        model = joblib.load(model_registry.version_dir(parent_version) / f"{name}.joblib")
+        in_group = np.ones(len(X), dtype=bool) if category is None else matrix["category"] == category
+        rows = new_indices[in_group[new_indices]]
+        y_new = matrix[TARGETS[target]][rows]
+        y_all = matrix[TARGETS[target]][train_indices[in_group[train_indices]]]
+        if len(set(y_new)) < 2:
+            # A forest can only be grown on rows with both classes
+            update_stats[name] = {"new_rows": int(len(rows)), "new_trees": 0, "retired": 0}
+        else:
+            retired = grow_forest(model, X[rows], y_new, args.new_trees, args.retire, y_all)
+            update_stats[name] = {"new_rows": int(len(rows)), "new_trees": args.new_trees, "retired": retired}
+        models[name] = model
+        print(f"  ✓ {name}: +{update_stats[name]['new_trees']} trees on {len(rows)} rows, "
+              f"-{update_stats[name]['retired']} retired -> {len(model.estimators_)} trees")
+    update_seconds = time.perf_counter() - start
+    print(f"✓ Updated {len(models)} models in {update_seconds:.1f}s")
+
+    # Guard: the updated model vs the last full retrain on the chronological test window
+    print("\n" + "=" * 60)
+    print("GUARD: TEST WINDOW METRICS")
+    print("=" * 60)
+
+    X_test = X[test_indices]
+    y_top10_test = matrix["is_top10"][test_indices]
+    y_top3_test = matrix["is_top3"][test_indices]
+    scores = {
+        "updated": evaluate(models["top10_classifier"], X_test, y_top10_test),
+        "base": evaluate(model_registry.load_version(base_version)[0], X_test, y_top10_test),
+    }
+    if args.full_check:
+        tasks = [task for task in make_tasks(matrix, train_indices, test_indices) if task["target"] == "top10_classifier"]
+        _, full_metrics = fit_parallel(matrix["path"] / "X.npy", tasks)
+        scores["full_retrain"] = full_metrics["top10_classifier"]
+
+    for label, s in scores.items():
+        print(f"  {label:13s} Top-10 accuracy {format_metric(s['accuracy'], '.1%'):>6s}  "
+              f"AUC {format_metric(s['auc'], '.3f')}  (n={s['test_size']})")
+
+    # No AUC (a test window with one class only) means the guard cannot be evaluated: never promote
+    reference = scores.get("full_retrain", scores["base"])
+    if reference["auc"] is None or scores["updated"]["auc"] is None:
+        auc_drop, passed = None, False
+    else:
+        auc_drop = reference["auc"] - scores["updated"]["auc"]
+        passed = auc_drop <= config.UPDATE_MAX_AUC_DROP
+    print(f"\nAUC drop vs {'full retrain' if args.full_check else 'base version'}: {format_metric(auc_drop, '+.3f')} "
+          f"(allowed {config.UPDATE_MAX_AUC_DROP:.3f}) -> "
+          f"{'PASS' if passed else 'FAIL' if auc_drop is not None else 'CANNOT EVALUATE'}")
+
+    top3_scores = evaluate(models["top3_classifier"], X_test, y_top3_test)
+    meta = dict(
+        parent,
+        data_path=str(results_path),
+        data_hash=data_hash,
+        params=dict(parent["params"], update=update_params),
+        feature_matrix=str(matrix["path"]),
+        top10_accuracy=scores["updated"]["accuracy"],
+        top10_auc=scores["updated"]["auc"],
+        top3_accuracy=top3_scores["accuracy"],
+        train_size=int(len(train_indices)),
+        test_size=int(len(test_indices)),
+        train_end_date=str(race_dates[train_indices].max()),
+        parent_version=parent_version,
+        base_version=base_version,
+        update={"models": update_stats, "seconds": round(update_seconds, 2), "guard": scores, "passed": passed},
+        latency_ms={name: model_registry.benchmark_latency(models[name], X_test) for name in model_registry.GLOBAL_MODELS},
+        feature_histograms=drift.training_histograms(
+            X[train_indices], matrix["columns"], matrix["category"][train_indices]
+        ),
+        training_date=time.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    out_dir = model_registry.save_version(version, models, meta, make_current=passed)
+    save_compact(out_dir / COMPACT_FILENAME, models)
+
+    print(f"\n✓ Saved model version {version} to {out_dir}/")
+    if passed:
+        print(f"✓ CURRENT -> {version}")
+    else:
+        print(f"⚠️  Guard {'failed' if auc_drop is not None else 'could not be evaluated'}, "
+              f"CURRENT stays {model_registry.current_version()}. Run: python train_model_v2.py")